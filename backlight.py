@@ -0,0 +1,41 @@
+"""
+Minimalist Internet Radio - display backlight
+
+Dims or switches off the backlight through its sysfs file, e.g.
+/sys/class/backlight/10-0045/brightness of the Raspberry Pi touch display.
+Writing it needs permission, e.g. by a udev rule:
+
+    SUBSYSTEM=="backlight", RUN+="/bin/chmod 666 /sys/class/backlight/%k/brightness"
+"""
+
+import logging
+import pathlib
+
+
+class Backlight:
+    """ Brightness of the display, restored to the value found before dimming """
+
+    def __init__(self, brightness_file: str) -> None:
+        self.path = pathlib.Path(brightness_file)
+        self.saved = None
+
+
+    def dim(self, brightness: int) -> None:
+        """ Set the brightness, 0 switches the backlight off. Blocks on file I/O. """
+        try:
+            if self.saved is None:
+                self.saved = int(self.path.read_text().strip())
+            self.path.write_text(str(brightness))
+        except (OSError, ValueError) as e:
+            logging.error("Cannot dim the backlight '%s': %s", self.path, e)
+
+
+    def restore(self) -> None:
+        """ Set the brightness found by dim(). Blocks on file I/O. """
+        if self.saved is None:
+            return
+        try:
+            self.path.write_text(str(self.saved))
+            self.saved = None
+        except OSError as e:
+            logging.error("Cannot restore the backlight '%s': %s", self.path, e)
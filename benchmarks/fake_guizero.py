@@ -0,0 +1,182 @@
+"""
+Minimalist Internet Radio - stub guizero toolkit for headless benchmarks
+
+Implements the part of the guizero API used by mira without Tk. App runs
+its own event loop: after/repeat callbacks are kept in a heap and executed
+by pump(), which is thread-safe to post to like Tk's after.
+"""
+
+from typing import Any, Callable
+
+import heapq
+import itertools
+import threading
+import time
+
+__version__ = "fake"
+
+# number of widgets created and alive, by class name
+created = {}
+alive = {}
+
+
+class Widget:
+    """ Stub widget keeping the properties mira sets """
+
+    def __init__(self, master: Any = None, **kwargs: Any) -> None:
+        self.master = master
+        self.children = []
+        self.visible = kwargs.get("visible", True)
+        self.width = kwargs.get("width")
+        self.height = kwargs.get("height")
+        self.grid = kwargs.get("grid")
+        self.align = kwargs.get("align")
+        self.bg = None
+        self.text_color = kwargs.get("color")
+        self.font = kwargs.get("font")
+        self.text_size = kwargs.get("size")
+        # number of property assignments, i.e. Tk configure calls
+        self.updates = 0
+        if master is not None:
+            master.children.append(self)
+
+        name = type(self).__name__
+        created[name] = created.get(name, 0) + 1
+        alive[name] = alive.get(name, 0) + 1
+
+
+    def __setattr__(self, key: str, value: Any) -> None:
+        if key not in ("updates", "children", "master") and hasattr(self, "updates"):
+            object.__setattr__(self, "updates", self.updates + 1)
+        object.__setattr__(self, key, value)
+
+
+    def show(self) -> None:
+        self.visible = True
+
+    def hide(self) -> None:
+        self.visible = False
+
+    def destroy(self) -> None:
+        for child in list(self.children):
+            child.destroy()
+        if self.master is not None and self in self.master.children:
+            self.master.children.remove(self)
+        alive[type(self).__name__] -= 1
+
+
+
+class Box(Widget):
+    pass
+
+
+class Text(Widget):
+
+    def __init__(self, master: Any = None, text: str = "", **kwargs: Any) -> None:
+        super().__init__(master, **kwargs)
+        self.value = text
+
+
+
+class PushButton(Widget):
+
+    def __init__(self, master: Any = None, text: str = "", command: Callable|None = None,
+                 args: list|None = None, **kwargs: Any) -> None:
+        super().__init__(master, **kwargs)
+        self.text = text
+        self.command = command
+        self.args = args or []
+
+
+    def update_command(self, command: Callable, args: list|None = None) -> None:
+        self.command = command
+        self.args = args or []
+
+
+    def press(self) -> None:
+        """ Simulate a tap. """
+        self.command(*self.args)
+
+
+
+class App(Widget):
+
+    def __init__(self, title: str = "", width: int = 500, height: int = 500, **kwargs: Any) -> None:
+        super().__init__(None, width=width, height=height, **kwargs)
+        self.title = title
+        self._queue = []
+        self._ids = itertools.count()
+        self._repeats = {}
+        self._cond = threading.Condition()
+        self._running = False
+
+
+    def set_full_screen(self) -> None:
+        pass
+
+
+    def after(self, time_ms: int, function: Callable, args: list|None = None) -> None:
+        self._push(time_ms, function, args or [], None)
+
+
+    def repeat(self, time_ms: int, function: Callable, args: list|None = None) -> None:
+        self._repeats[function] = time_ms
+        self._push(time_ms, function, args or [], time_ms)
+
+
+    def cancel(self, function: Callable) -> None:
+        with self._cond:
+            self._repeats.pop(function, None)
+            self._queue = [entry for entry in self._queue if entry[2] != function]
+            heapq.heapify(self._queue)
+
+
+    def pending_callbacks(self) -> int:
+        with self._cond:
+            return len(self._queue)
+
+
+    def pump(self, duration: float = 0.0, until: Callable|None = None) -> None:
+        """ Run due callbacks for the given number of seconds or until until() returns True. """
+        deadline = time.monotonic() + duration
+        while True:
+            if until is not None and until():
+                return
+            with self._cond:
+                now = time.monotonic()
+                if self._queue and self._queue[0][0] <= now:
+                    due, _, function, args, interval = heapq.heappop(self._queue)
+                else:
+                    if now >= deadline:
+                        return
+                    wait = deadline - now
+                    if self._queue:
+                        wait = min(wait, self._queue[0][0] - now)
+                    self._cond.wait(wait)
+                    continue
+
+            function(*args)
+            if interval is not None and self._repeats.get(function) == interval:
+                self._push(interval, function, args, interval)
+
+
+    def display(self) -> None:
+        self._running = True
+        while self._running:
+            self.pump(0.1)
+
+
+    def destroy(self) -> None:
+        self._running = False
+
+
+    def _push(self, time_ms: int, function: Callable, args: list, interval: int|None) -> None:
+        with self._cond:
+            heapq.heappush(self._queue, (time.monotonic() + time_ms / 1000, next(self._ids), function, args, interval))
+            self._cond.notify()
+
+
+
+def count_widgets(root: Widget) -> int:
+    """ Number of widgets below root, including hidden ones. """
+    return sum(1 + count_widgets(child) for child in root.children)
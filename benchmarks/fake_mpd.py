@@ -0,0 +1,210 @@
+"""
+Minimalist Internet Radio - scriptable fake MPD server for benchmarks
+
+Speaks enough of the MPD protocol for mira: queue commands, status,
+currentsong, volume, idle and command lists. Every command is recorded
+with a timestamp, and a per-command latency can be configured to simulate
+a slow or stalled MPD.
+"""
+
+from typing import Any
+
+import shlex
+import socketserver
+import threading
+import time
+
+
+class FakeMpdState:
+    """ Player state shared by all connections """
+
+    def __init__(self) -> None:
+        self.queue = []
+        self.next_id = 1
+        self.current = None
+        self.state = "stop"
+        self.volume = 50
+        self.started = 0.0
+        # elapsed seconds at which a stalled stream froze, None while streaming
+        self.stalled_at = None
+        self.titles = {}
+        # command -> seconds to wait before answering
+        self.latency = {}
+        # (timestamp, command, args) of every command received
+        self.log = []
+        self.changed = set()
+        self.cond = threading.Condition()
+
+
+    def notify(self, *subsystems: str) -> None:
+        with self.cond:
+            self.changed.update(subsystems)
+            self.cond.notify_all()
+
+
+    def stall(self) -> None:
+        """ Freeze elapsed like a dropped stream, until the next play. """
+        with self.cond:
+            self.stalled_at = time.monotonic() - self.started
+
+
+    def find_command(self, name: str, after: float = 0.0) -> float|None:
+        """ Timestamp of the first command with the given name received after the given time. """
+        for timestamp, command, _ in list(self.log):
+            if command == name and timestamp >= after:
+                return timestamp
+        return None
+
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self) -> None:
+        mpd = self.server.mpd
+        self.wfile.write(b"OK MPD 0.23.5\n")
+        batch = None
+        for raw in self.rfile:
+            parts = shlex.split(raw.decode("utf-8"))
+            if not parts:
+                continue
+            name, args = parts[0], parts[1:]
+            mpd.log.append((time.monotonic(), name, args))
+
+            if name == "command_list_ok_begin":
+                batch = []
+                continue
+            if batch is not None and name != "command_list_end":
+                batch.append((name, args))
+                continue
+
+            if name == "command_list_end":
+                output = ""
+                for idx, (cmd, cmd_args) in enumerate(batch):
+                    try:
+                        output += self._run(mpd, cmd, cmd_args) + "list_OK\n"
+                    except KeyError:
+                        output += f"ACK [5@{idx}] {{{cmd}}} unknown command \"{cmd}\"\n"
+                        break
+                else:
+                    output += "OK\n"
+                batch = None
+            else:
+                try:
+                    output = self._run(mpd, name, args) + "OK\n"
+                except KeyError:
+                    output = f"ACK [5@0] {{{name}}} unknown command \"{name}\"\n"
+
+            try:
+                self.wfile.write(output.encode("utf-8"))
+            except OSError:
+                return
+
+
+    def _run(self, mpd: FakeMpdState, name: str, args: list[str]) -> str:
+        delay = mpd.latency.get(name, 0)
+        if delay:
+            time.sleep(delay)
+
+        if name == "idle":
+            with mpd.cond:
+                mpd.cond.wait_for(lambda: mpd.changed)
+                changed = [s for s in mpd.changed if not args or s in args]
+                mpd.changed.clear()
+            return "".join(f"changed: {s}\n" for s in changed)
+
+        with mpd.cond:
+            if name in ("ping", "password", "noidle"):
+                return ""
+            if name == "clear":
+                mpd.queue.clear()
+                mpd.current = None
+                mpd.state = "stop"
+                mpd.changed.update(("playlist", "player"))
+            elif name in ("add", "addid"):
+                song = (mpd.next_id, args[0])
+                mpd.next_id += 1
+                position = int(args[1]) if len(args) > 1 else len(mpd.queue)
+                mpd.queue.insert(position, song)
+                mpd.changed.add("playlist")
+                mpd.cond.notify_all()
+                return f"Id: {song[0]}\n" if name == "addid" else ""
+            elif name in ("play", "playid"):
+                if not mpd.queue:
+                    return ""
+                song_id = int(args[0]) if name == "playid" else mpd.queue[0][0]
+                mpd.current = next(song for song in mpd.queue if song[0] == song_id)
+                mpd.state = "play"
+                mpd.started = time.monotonic()
+                mpd.stalled_at = None
+                mpd.changed.add("player")
+            elif name == "stop":
+                mpd.state = "stop"
+                mpd.changed.add("player")
+            elif name == "pause":
+                if mpd.current is not None:
+                    mpd.state = "pause" if args[0] == "1" else "play"
+                    mpd.changed.add("player")
+            elif name == "delete":
+                start, _, end = args[0].partition(":")
+                del mpd.queue[int(start):int(end) if end else int(start) + 1]
+                mpd.changed.add("playlist")
+            elif name == "setvol":
+                mpd.volume = int(args[0])
+                mpd.changed.add("mixer")
+            elif name == "currentsong":
+                if mpd.current is None:
+                    return ""
+                song_id, url = mpd.current
+                title = mpd.titles.get(url, "Artist - Title")
+                return f"file: {url}\nName: Fake Radio\nTitle: {title}\nId: {song_id}\n"
+            elif name == "status":
+                elapsed = time.monotonic() - mpd.started if mpd.state == "play" else 0
+                if mpd.stalled_at is not None:
+                    elapsed = mpd.stalled_at
+                streaming = mpd.state == "play" and mpd.stalled_at is None
+                return (f"volume: {mpd.volume}\nstate: {mpd.state}\nplaylistlength: {len(mpd.queue)}\n"
+                        f"elapsed: {elapsed:.3f}\nbitrate: {128 if streaming else 0}\n")
+            else:
+                raise KeyError(name)
+            mpd.cond.notify_all()
+        return ""
+
+
+
+class FakeMpdServer(socketserver.ThreadingTCPServer):
+    """ Fake MPD listening on localhost, port 0 picks a free port """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port: int = 0) -> None:
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.mpd = FakeMpdState()
+        self.port = self.server_address[1]
+        self._thread = None
+
+
+    def start(self) -> "FakeMpdServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-mpd", daemon=True)
+        self._thread.start()
+        return self
+
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        # release clients waiting in idle
+        self.mpd.notify("player")
+
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a fake MPD server")
+    parser.add_argument('--port', type=int, default=6600)
+    args = parser.parse_args()
+
+    server = FakeMpdServer(args.port)
+    print(f"Fake MPD listening on 127.0.0.1:{server.port}")
+    server.serve_forever()
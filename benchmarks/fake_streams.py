@@ -0,0 +1,133 @@
+"""
+Minimalist Internet Radio - fake radio streams for benchmarks
+
+HTTP server simulating healthy, slow and failing streams:
+
+    /ok              audio stream with icy-br header
+    /slow/<ms>       first byte after the given delay
+    /fail/<status>   error status, e.g. /fail/503
+    /redirect/<path> 302 to /<path>
+    /empty           200 without data
+    /hang            accepts the request and never answers
+    /live/<kbit/s>   endless stream at the given rate, byte n of it is n % 251
+"""
+
+from typing import Any
+
+import http.server
+import threading
+import time
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self) -> None:
+        self.server.requests.append((time.monotonic(), self.path))
+        path = self.path.split("?", 1)[0]
+        parts = path.strip("/").split("/", 1)
+        kind, arg = parts[0], parts[1] if len(parts) > 1 else ""
+
+        if kind == "ok":
+            self._stream(0)
+        elif kind == "slow":
+            self._stream(int(arg or 1000) / 1000)
+        elif kind == "fail":
+            self.send_error(int(arg or 500))
+        elif kind == "redirect":
+            self.send_response(302)
+            self.send_header("Location", "/" + arg)
+            self.end_headers()
+        elif kind == "empty":
+            self.send_response(200)
+            self.send_header("Content-Type", "audio/mpeg")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif kind == "live":
+            self._live(int(arg or 128))
+        elif kind == "hang":
+            self.server.stopped.wait()
+        else:
+            self.send_error(404)
+
+
+    def _stream(self, delay: float) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("icy-br", "128")
+        self.end_headers()
+        if delay:
+            time.sleep(delay)
+        try:
+            # a few chunks of silence are enough for a check
+            for _ in range(4):
+                self.wfile.write(b"\xff\xfb" + bytes(416))
+                self.wfile.flush()
+        except OSError:
+            pass
+
+
+    def _live(self, kbps: int) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("icy-br", str(kbps))
+        self.end_headers()
+        rate = kbps * 125
+        # 20 ms per chunk
+        size = max(1, rate // 50)
+        pattern = bytes(range(251)) * (size // 251 + 2)
+        start = time.monotonic()
+        sent = 0
+        try:
+            while not self.server.stopped.is_set():
+                self.wfile.write(pattern[sent % 251:sent % 251 + size])
+                sent += size
+                time.sleep(max(0.0, start + sent / rate - time.monotonic()))
+        except OSError:
+            pass
+
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+
+class FakeStreamServer(http.server.ThreadingHTTPServer):
+    """ Fake stream server on localhost, port 0 picks a free port """
+
+    daemon_threads = True
+
+    def __init__(self, port: int = 0) -> None:
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.port = self.server_address[1]
+        # (timestamp, path) of every request
+        self.requests = []
+        self.stopped = threading.Event()
+
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.port}/{path.lstrip('/')}"
+
+
+    def start(self) -> "FakeStreamServer":
+        threading.Thread(target=self.serve_forever, name="fake-streams", daemon=True).start()
+        return self
+
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.shutdown()
+        self.server_close()
+
+
+
+if __name__ == "__main__":
+    import pathlib
+    import sys
+
+    sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+    from health import probe_stream
+
+    server = FakeStreamServer().start()
+    for path in ("ok", "slow/300", "fail/503", "redirect/ok", "empty", "hang", "missing"):
+        print(probe_stream(server.url(path), timeout=1.0))
+    server.stop()
@@ -0,0 +1,343 @@
+"""
+Minimalist Internet Radio - headless benchmarks
+
+Runs MiraAppplication against the stub guizero toolkit and a fake MPD
+server and reports latency percentiles, widget counts and memory usage
+as JSON:
+
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --compare results.json
+    python benchmarks/run_benchmarks.py --rooms 3 --slow-room-latency 1.0
+    python benchmarks/run_benchmarks.py --remote-clients 64
+"""
+
+from typing import Any, Callable
+
+import argparse
+import http.client
+import json
+import pathlib
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+
+BENCH_DIR = pathlib.Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+import fake_guizero
+sys.modules["guizero"] = fake_guizero
+
+from fake_mpd import FakeMpdServer
+from fake_streams import FakeStreamServer
+from health import HealthProber
+from timeshift import CHUNK_SIZE, TimeShiftRelay
+from mira_config import MiraConfig
+import mira
+
+
+WIRELESS_FIXTURE = """Inter-| sta-|   Quality        |   Discarded packets               | Missed | WE
+ face | tus | link level noise |  nwid  crypt   frag  retry   misc | beacon | 22
+ wlan0: 0000   54.  -56.  -256        0      0      0      0     13        0
+"""
+
+
+class BenchStations:
+    """ Generated station list in the shape of MiraStations """
+
+    def __init__(self, count: int) -> None:
+        self.stations = [dict(name=f"Radio {n + 1}", url=f"http://127.0.0.1/stream/{n}") for n in range(count)]
+
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[idx]
+
+
+def summarize(samples: list[float]) -> dict:
+    """ Latency statistics in milliseconds. """
+    return dict(
+        n=len(samples),
+        p50=round(percentile(samples, 50) * 1000, 3),
+        p99=round(percentile(samples, 99) * 1000, 3),
+        mean=round(sum(samples) / len(samples) * 1000, 3),
+        max=round(max(samples) * 1000, 3)
+        )
+
+
+def rss_kb() -> dict:
+    current = 0
+    with open("/proc/self/status") as infile:
+        for line in infile:
+            if line.startswith("VmRSS:"):
+                current = int(line.split()[1])
+    return dict(current=current, peak=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def git_version() -> str:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=BENCH_DIR.parent,
+                              capture_output=True, text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+
+def configure(tmpdir: pathlib.Path, servers: list[FakeMpdServer]) -> None:
+    MiraConfig.General.MPD_BACKEND = "native"
+    MiraConfig.General.MPD_HOST = "127.0.0.1"
+    MiraConfig.General.MPD_PORT = servers[0].port
+    # several servers: one room each, all in one group
+    MiraConfig.Rooms.ENDPOINTS = []
+    if len(servers) > 1:
+        MiraConfig.Rooms.ENDPOINTS = [dict(name=f"Room {idx + 1}", host="127.0.0.1", port=server.port)
+                                      for idx, server in enumerate(servers)]
+    MiraConfig.General.SAVED_STATE_FILE = str(tmpdir / "mira_state.json")
+    MiraConfig.General.STARTUP_TIMINGS_FILE = None
+    MiraConfig.General.CATALOG_FILE = None
+    MiraConfig.Resolver.ENABLED = False
+    MiraConfig.Status.USE_IDLE = False
+    # detect stalls quickly, so the recovery benchmark doesn't take long
+    MiraConfig.Recovery.STALL_TIME = 0.5
+    MiraConfig.Recovery.CHECK_INTERVAL = 100
+    MiraConfig.Recovery.MIN_BACKOFF = 0.2
+    MiraConfig.Remote.ENABLED = True
+    MiraConfig.Remote.PORT = 0
+
+    wireless = tmpdir / "wireless"
+    wireless.write_text(WIRELESS_FIXTURE)
+    MiraConfig.Title.WIFI_STATS_FILE = str(wireless)
+
+
+
+def measure(iterations: int, action: Callable, done: Callable) -> list[float]:
+    samples = []
+    for idx in range(iterations):
+        start = time.monotonic()
+        finished_at = action(idx, start)
+        done(idx)
+        samples.append((finished_at or time.monotonic()) - start)
+    return samples
+
+
+def run(args: argparse.Namespace) -> dict:
+    servers = [FakeMpdServer().start() for _ in range(max(1, args.rooms))]
+    for server in servers:
+        server.mpd.latency = {"clear": args.mpd_latency, "currentsong": args.mpd_latency}
+    if len(servers) > 1:
+        # the last room is the slow one
+        servers[-1].mpd.latency = {"clear": args.slow_room_latency, "currentsong": args.slow_room_latency}
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        configure(pathlib.Path(tmp), servers)
+        # room for the listeners and the measuring client
+        MiraConfig.Remote.MAX_CLIENTS = args.remote_clients + 2
+
+        start = time.monotonic()
+        app = mira.MiraAppplication(MiraConfig, BenchStations(args.stations), False)
+        results["startup_ms"] = round((time.monotonic() - start) * 1000, 3)
+        gui = app.app
+        # results of background operations come back through a periodic job, as after run()
+        app.ticks.start()
+
+        def idle(task_attr: str) -> Callable:
+            return lambda idx: gui.pump(args.timeout, until=lambda: not getattr(app, task_attr).pending())
+
+        # button press -> play command received by MPD (by the fastest room, the slow one is measured apart)
+        fast = servers[:-1] or servers
+        def played(start: float, rooms: list[FakeMpdServer]) -> float|None:
+            times = [server.mpd.find_command("play", start) for server in rooms]
+            return None if None in times else max(times)
+
+        def press(idx: int, start: float) -> float|None:
+            app.preset_buttons[idx % len(app.preset_buttons)].button.press()
+            gui.pump(args.timeout, until=lambda: played(start, fast) is not None)
+            return played(start, fast)
+        results["button_press_to_play"] = summarize(measure(args.iterations, press, idle("play_task")))
+
+        # page switch, synchronous on the GUI thread
+        num_pages = app._get_num_pages()
+        def page(idx: int, start: float) -> None:
+            app.page_buttons[(idx + 1) % num_pages].button.press()
+        results["page_switch"] = summarize(measure(args.iterations, page, lambda idx: None))
+
+        # title bar refresh until the Wi-Fi quality is shown
+        def title(idx: int, start: float) -> None:
+            app._update_title_bar()
+        results["title_bar_refresh"] = summarize(measure(args.iterations, title, idle("wifi_task")))
+
+        # status refresh until the current song is shown
+        def status(idx: int, start: float) -> None:
+            app._update_status()
+        results["status_refresh"] = summarize(measure(args.iterations, status, idle("status_task")))
+
+        # stream stall -> playback recovered, ends with the time to recover measured by the watchdog
+        def stall(idx: int, start: float) -> float|None:
+            gui.pump(args.timeout, until=lambda: app.watchdog.armed)
+            for server in servers:
+                server.mpd.stall()
+            gui.pump(args.timeout, until=lambda: app.watchdog.recovering)
+            gui.pump(args.timeout, until=lambda: not app.watchdog.recovering)
+            return None
+        results["stall_to_recovery"] = summarize(measure(min(args.iterations, 5), stall, lambda idx: None))
+        # runs of the jobs and the wakeups they shared
+        results["periodic_jobs"] = dict(wakeups=app.ticks.wakeups, jobs=app.ticks.stats())
+
+        # remote control: POST /api/play -> play command received by MPD, while clients follow the event stream
+        app.remote.start()
+        app.remote.ready.wait(args.timeout)
+        listeners = []
+        for _ in range(args.remote_clients):
+            listener = socket.create_connection(("127.0.0.1", app.remote.port), timeout=args.timeout)
+            listener.sendall(b"GET /api/events HTTP/1.1\r\nHost: mira\r\n\r\n")
+            listeners.append(listener)
+        def remote_press(idx: int, start: float) -> float|None:
+            connection = http.client.HTTPConnection("127.0.0.1", app.remote.port, timeout=args.timeout)
+            connection.request("POST", f"/api/play/{idx % len(app.presets)}")
+            connection.getresponse().read()
+            connection.close()
+            gui.pump(args.timeout, until=lambda: played(start, fast) is not None)
+            return played(start, fast)
+        results["remote_press_to_play"] = summarize(measure(args.iterations, remote_press, idle("play_task")))
+
+        # reads are answered from the snapshot, MPD sees no commands
+        gui.pump(args.timeout, until=lambda: app.watchdog.armed)
+        commands = sum(len(server.mpd.log) for server in servers)
+        start = time.monotonic()
+        for listener in listeners:
+            connection = http.client.HTTPConnection("127.0.0.1", app.remote.port, timeout=args.timeout)
+            connection.request("GET", "/api/state")
+            connection.getresponse().read()
+            connection.close()
+        results["remote_reads"] = dict(
+            ms=round((time.monotonic() - start) * 1000, 3),
+            requests=len(listeners),
+            mpd_commands=sum(len(server.mpd.log) for server in servers) - commands
+            )
+        for listener in listeners:
+            listener.close()
+        app.remote.stop()
+
+        # one round of station checks, a quarter of the streams fail, a quarter is slow
+        streams = FakeStreamServer().start()
+        urls = [streams.url(("ok", "fail/503", "slow/200", "ok")[idx % 8 // 2] + f"?station={idx}")
+                for idx in range(args.stations)]
+        start = time.monotonic()
+        checked = HealthProber(MiraConfig).probe_all(urls)
+        results["probe_round"] = dict(
+            ms=round((time.monotonic() - start) * 1000, 3),
+            stations=len(checked),
+            dead=sum(1 for result in checked.values() if result.ok is False)
+            )
+
+        # time-shift relay of a synthetic live stream: first byte, reading resumed after a pause, rewind
+        MiraConfig.TimeShift.BUFFER_FILE = str(pathlib.Path(tmp) / "timeshift.buf")
+        MiraConfig.TimeShift.BUFFER_SIZE = 4 * 1024 * 1024
+        MiraConfig.TimeShift.PORT = 0
+        relay = TimeShiftRelay(MiraConfig)
+        relay.start()
+        checked = dict(bytes=0, errors=0)
+        def verify(data: bytes, offset: int, size: int) -> None:
+            # what the station sent, the recording starts at relay.ring.start; a short read is an error too
+            first = (offset - relay.ring.start) % 251
+            expected = (bytes(range(251)) * (size // 251 + 2))[first:first + size]
+            checked["bytes"] += len(data)
+            checked["errors"] += data != expected
+        resumed = []
+        def shifted(idx: int, start: float) -> float|None:
+            url = urllib.parse.urlsplit(relay.tune(streams.url("live/4000")))
+            connection = http.client.HTTPConnection(url.hostname, url.port, timeout=args.timeout)
+            connection.request("GET", f"{url.path}?{url.query}")
+            response = connection.getresponse()
+            offset = relay.ring.start
+            data = response.read1(4096)
+            first_byte = time.monotonic()
+            verify(data, offset, len(data))
+            offset += len(data)
+            # several chunks in a row, the relay has to keep the connection
+            data = response.read(3 * CHUNK_SIZE)
+            verify(data, offset, 3 * CHUNK_SIZE)
+            offset += len(data)
+            # MPD paused: nothing is read for longer than the socket buffers cover
+            time.sleep(0.5)
+            pause_end = time.monotonic()
+            data = response.read1(CHUNK_SIZE)
+            resumed.append(time.monotonic() - pause_end)
+            data += response.read(4 * CHUNK_SIZE - len(data))
+            verify(data, offset, 4 * CHUNK_SIZE)
+            connection.close()
+            # a rewind connects at an earlier offset
+            back = relay.offset_behind_live(0.2)
+            connection = http.client.HTTPConnection(url.hostname, url.port, timeout=args.timeout)
+            connection.request("GET", f"/stream?from={back}")
+            verify(connection.getresponse().read(4 * CHUNK_SIZE), back, 4 * CHUNK_SIZE)
+            connection.close()
+            return first_byte
+        results["timeshift_first_byte"] = summarize(measure(min(args.iterations, 5), shifted, lambda idx: None))
+        results["timeshift_resume"] = summarize(resumed)
+        results["timeshift_verified"] = checked
+        relay.stop()
+        streams.stop()
+
+        results["widgets"] = dict(
+            total=fake_guizero.count_widgets(gui),
+            alive=dict(fake_guizero.alive),
+            created=dict(fake_guizero.created)
+            )
+        results["pending_callbacks"] = gui.pending_callbacks()
+        results["rss_kb"] = rss_kb()
+
+        app.ticks.stop()
+        app.executor.shutdown()
+        app.player.close()
+
+    for server in servers:
+        server.stop()
+    return dict(
+        version=git_version(),
+        python=platform.python_version(),
+        machine=platform.machine(),
+        settings=dict(stations=args.stations, iterations=args.iterations, mpd_latency=args.mpd_latency,
+                      rooms=args.rooms, slow_room_latency=args.slow_room_latency,
+                      remote_clients=args.remote_clients),
+        results=results
+        )
+
+
+def compare(current: dict, baseline: dict) -> None:
+    print(f"{'benchmark':<24}{'baseline p50':>14}{'p50':>10}{'baseline p99':>14}{'p99':>10}")
+    for name, stats in current["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if not isinstance(stats, dict) or "p50" not in stats or not old:
+            continue
+        print(f"{name:<24}{old['p50']:>14.3f}{stats['p50']:>10.3f}{old['p99']:>14.3f}{stats['p99']:>10.3f}")
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the headless mira benchmarks")
+    parser.add_argument('--stations', type=int, default=64, help='number of generated stations')
+    parser.add_argument('--iterations', type=int, default=200, help='samples per benchmark')
+    parser.add_argument('--mpd-latency', type=float, default=0.0, help='seconds the fake MPD delays each reply')
+    parser.add_argument('--rooms', type=int, default=1, help='number of fake MPD servers, one room each')
+    parser.add_argument('--slow-room-latency', type=float, default=0.0, help='reply delay of the last room')
+    parser.add_argument('--remote-clients', type=int, default=32, help='clients following the remote control events')
+    parser.add_argument('--timeout', type=float, default=5.0, help='seconds to wait for each operation')
+    parser.add_argument('--output', type=pathlib.Path, help='write the JSON results to this file')
+    parser.add_argument('--compare', type=pathlib.Path, help='JSON results of a previous run')
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    else:
+        print(json.dumps(report, indent=2))
+    if args.compare:
+        compare(report, json.loads(args.compare.read_text()))
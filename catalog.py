@@ -0,0 +1,287 @@
+"""
+Minimalist Internet Radio - station catalogs
+
+A catalog stores the station dicts, a PresetList pages Presets in from it
+on demand. sqlite3 and csv are only imported when a catalog file is used.
+Besides the stations predefined in MiraStations, a large catalog (e.g. a
+radio-browser export) can be imported into an SQLite file:
+
+    python catalog.py stations.json ~/.mira/catalog.db
+"""
+
+from typing import Any, Iterator
+
+import collections
+import json
+import logging
+import pathlib
+import threading
+
+from mira_config import MiraConfig
+from mira_stations import MiraStations
+from constants import Key
+from helpers import Preset, ensure_dir_exists, get_stations_list
+
+
+COLUMNS = (Key.NAME, Key.URL, Key.BACKGROUND_COLOR, Key.TEXT_COLOR, Key.LOGO, Key.ALT_URLS)
+# columns holding lists, stored as JSON text
+JSON_COLUMNS = (Key.ALT_URLS,)
+# characters of one station in a JSON catalog, a longer one is no station
+MAX_ELEMENT_SIZE = 1024 * 1024
+
+
+class MemoryCatalog:
+    """ Catalog of station dicts held in a list """
+
+    def __init__(self, stations: list[dict]) -> None:
+        self.stations = stations
+
+    def __len__(self) -> int:
+        return len(self.stations)
+
+    def get_range(self, first: int, count: int) -> list[dict]:
+        return self.stations[first:first + count]
+
+
+
+class SqliteCatalog:
+    """ Catalog of station dicts stored in an SQLite file, numbered 0..n-1 """
+
+    def __init__(self, path: pathlib.Path) -> None:
+        import sqlite3
+
+        self.path = path
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.Lock()
+        _create_table(self._db)
+        # the station number is the primary key, so the count is an index lookup
+        self._count = self._db.execute("SELECT COALESCE(MAX(number) + 1, 0) FROM stations").fetchone()[0]
+        logging.info("Opened catalog '%s' with %s stations", path, self._count)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def get_range(self, first: int, count: int) -> list[dict]:
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM stations WHERE number >= ? AND number < ? ORDER BY number",
+                (first, first + count)
+                ).fetchall()
+        return [{key: _decode(key, value) for key, value in zip(COLUMNS, row) if value is not None} for row in rows]
+
+    def close(self) -> None:
+        self._db.close()
+
+
+
+class PresetList:
+    """ Sequence of Presets constructed lazily from a catalog, keeping the most recently used ones """
+
+    def __init__(self, catalog: MemoryCatalog|SqliteCatalog, config: MiraConfig) -> None:
+        self.catalog = catalog
+        self.config = config
+        self.cache_size = config.General.PRESET_CACHE_SIZE
+        self._cache = collections.OrderedDict()
+
+
+    def __len__(self) -> int:
+        return len(self.catalog)
+
+
+    def __getitem__(self, number: int) -> Preset:
+        if number < 0 or number >= len(self):
+            raise IndexError(number)
+        preset = self._cache.get(number)
+        if preset is None:
+            return self.get_range(number, 1)[0]
+        self._cache.move_to_end(number)
+        return preset
+
+
+    def __iter__(self) -> Iterator[Preset]:
+        for number in range(0, len(self)):
+            yield self[number]
+
+
+    def replace_catalog(self, catalog: MemoryCatalog|SqliteCatalog, changed: list[int]|None = None) -> None:
+        """ Switch to another catalog, dropping the given presets (all if None) from the cache. """
+        self.catalog = catalog
+        if changed is None:
+            self._cache.clear()
+            return
+        for number in changed:
+            self._cache.pop(number, None)
+
+
+    def get_range(self, first: int, count: int) -> list[Preset]:
+        """ Return the presets first..first+count-1, loading missing ones with a single query. """
+        count = max(0, min(count, len(self) - first))
+        if any(number not in self._cache for number in range(first, first + count)):
+            for offset, st in enumerate(self.catalog.get_range(first, count)):
+                self._cache[first + offset] = Preset(first + offset, self.config, st)
+
+        presets = []
+        for number in range(first, first + count):
+            self._cache.move_to_end(number)
+            presets.append(self._cache[number])
+
+        while len(self._cache) > max(self.cache_size, count):
+            self._cache.popitem(last=False)
+        return presets
+
+
+
+def create_catalog(config: MiraConfig, stations: MiraStations) -> MemoryCatalog|SqliteCatalog:
+    """ Open the catalog file from the config, or use the predefined stations. """
+    if config.General.CATALOG_FILE:
+        path = pathlib.Path(config.General.CATALOG_FILE).expanduser()
+        if path.exists():
+            catalog = SqliteCatalog(path)
+            if len(catalog) > 0:
+                return catalog
+        logging.warning("Catalog '%s' is missing or empty, using predefined stations", path)
+    return MemoryCatalog(get_stations_list(stations))
+
+
+
+def iter_json_array(infile: Any, chunk_size: int = 64 * 1024, max_element_size: int = MAX_ELEMENT_SIZE) -> Iterator[Any]:
+    """ Yield the elements of a JSON array without reading the whole file.
+        Raises ValueError if it isn't one or an element is longer than max_element_size characters. """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    eof = False
+    # "[" at the start, "first" element or "]", an "element" after a comma, a "separator" after an element
+    expected = "["
+
+    while True:
+        buffer = buffer.lstrip()
+        if not buffer:
+            if eof:
+                raise ValueError("unexpected end of JSON array")
+            chunk = infile.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+
+        if expected == "[":
+            if buffer[0] != "[":
+                raise ValueError("JSON catalog must be an array")
+            buffer = buffer[1:]
+            expected = "first"
+            continue
+        if buffer[0] == "]" and expected != "element":
+            return
+        if expected == "separator":
+            if buffer[0] != ",":
+                raise ValueError(f"expected ',' or ']' in JSON array, got '{buffer[0]}'")
+            buffer = buffer[1:]
+            expected = "element"
+            continue
+        if buffer[0] in ",]":
+            raise ValueError(f"missing element in JSON array before '{buffer[0]}'")
+
+        try:
+            element, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            if len(buffer) > max_element_size:
+                raise ValueError(f"JSON array element longer than {max_element_size} characters") from None
+            chunk = infile.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        yield element
+        buffer = buffer[end:]
+        expected = "separator"
+
+
+def iter_station_file(source: pathlib.Path) -> Iterator[dict]:
+    """ Yield the station dicts of a JSON array, JSON lines or CSV file. """
+    with open(source, "r", encoding="utf-8", newline="") as infile:
+        if source.suffix.lower() == ".csv":
+            import csv
+            yield from csv.DictReader(infile)
+        elif source.suffix.lower() in (".jsonl", ".ndjson"):
+            for line in infile:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from iter_json_array(infile)
+
+
+def import_catalog(source: pathlib.Path, target: pathlib.Path, batch_size: int = 1000) -> int:
+    """ Replace the stations in the catalog file by the ones in the source file. Returns the number of stations. """
+    import sqlite3
+
+    ensure_dir_exists(target)
+    db = sqlite3.connect(str(target))
+    try:
+        with db:
+            _create_table(db)
+            db.execute("DELETE FROM stations")
+            number = 0
+            batch = []
+            for idx, st in enumerate(iter_station_file(source)):
+                if not isinstance(st, dict):
+                    logging.warning("Entry %s of '%s' is no station, skipped: %.80r", idx, source, st)
+                    continue
+                if not st.get(Key.URL) or not st.get(Key.NAME):
+                    continue
+                batch.append((number,) + tuple(_encode(key, st.get(key)) for key in COLUMNS))
+                number += 1
+                if len(batch) >= batch_size:
+                    _insert(db, batch)
+                    batch = []
+            _insert(db, batch)
+    finally:
+        db.close()
+    return number
+
+
+def _create_table(db: Any) -> None:
+    db.execute(f"CREATE TABLE IF NOT EXISTS stations (number INTEGER PRIMARY KEY, {', '.join(COLUMNS)})")
+    # catalogs imported by older versions lack the later columns
+    existing = {row[1] for row in db.execute("PRAGMA table_info(stations)")}
+    for column in COLUMNS:
+        if column not in existing:
+            db.execute(f"ALTER TABLE stations ADD COLUMN {column}")
+
+
+def _encode(key: str, value: Any) -> Any:
+    if not value:
+        return None
+    if key in JSON_COLUMNS:
+        # a CSV cell holds the URLs separated by spaces
+        return json.dumps(value.split() if isinstance(value, str) else list(value))
+    return value
+
+
+def _decode(key: str, value: Any) -> Any:
+    if key in JSON_COLUMNS:
+        return json.loads(value)
+    return value
+
+
+def _insert(db: Any, rows: list[tuple]) -> None:
+    placeholders = ", ".join("?" * (len(COLUMNS) + 1))
+    db.executemany(f"INSERT INTO stations VALUES ({placeholders})", rows)
+
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Import a station catalog (JSON array, JSON lines or CSV)")
+    parser.add_argument('source', type=pathlib.Path, help='file to import')
+    parser.add_argument(
+        'target',
+        type=pathlib.Path,
+        nargs='?',
+        default=MiraConfig.General.CATALOG_FILE or "~/.mira/catalog.db",
+        help='SQLite catalog file'
+        )
+    args = parser.parse_args()
+
+    count = import_catalog(args.source, pathlib.Path(args.target).expanduser())
+    print(f"Imported {count} stations")
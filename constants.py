@@ -8,8 +8,21 @@ class Key:
 
     NAME = 'name'
     URL = 'url'
+    # list of alternate URLs (mirrors) of a station
+    ALT_URLS = 'alt_urls'
     BACKGROUND_COLOR = 'background_color'
     TEXT_COLOR = 'text_color'
+    # file path or http(s) URL of a PNG/JPEG shown on the preset button
+    LOGO = 'logo'
     
     PRESET_NUMBER = 'preset_number'
+    STATION_NAME = 'station_name'
+    PAGE = 'page'
+    HISTORY = 'history'
+    ROOM_GROUP = 'room_group'
+
+    HOST = 'host'
+    PORT = 'port'
+    PASSWORD = 'password'
+    TIMEOUT = 'timeout'
 
@@ -0,0 +1,235 @@
+#
+# MIRa - Minimalist Internet Radio, headless mode
+#
+# For players without display: no guizero, no Tk, no X server.
+#
+#     python headless.py
+#     echo next | nc -U ~/.mira/control.sock
+#
+
+"""
+MIRa - Minimalist Internet Radio, headless mode
+
+Runs MiraCore on a plain event loop. The station is controlled with line
+commands on stdin (e.g. typed on a keyboard), on a UNIX socket
+(Headless.CONTROL_SOCKET) and through the remote control API (Remote):
+
+    <number>, play <number>   play a preset, counted from 1
+    next, prev                play the next or previous preset
+    volume <0..100>           set the volume
+    pause                     pause or resume (TimeShift)
+    back [<seconds>]          rewind, by TimeShift.REWIND_STEP by default
+    live                      back to live after pausing or rewinding
+    rooms                     switch to the next group of rooms
+    status                    the current state as JSON
+    profile                   start or stop profiling (see profiling.py)
+"""
+
+from typing import Callable
+
+# first import: marks the start time for the startup phase timings
+from startup import PhaseTimer
+
+import heapq
+import itertools
+import logging
+import os
+import pathlib
+import socketserver
+import sys
+import threading
+import time
+
+from mira_config import MiraConfig
+from mira_stations import MiraStations
+
+from mira_core import MiraCore, run_app
+from multiroom import PlayerGroup
+
+
+class EventLoop:
+    """ Timers and callbacks on the main thread, the part of guizero.App used by MiraCore """
+
+    def __init__(self) -> None:
+        # (due time, sequence number, function, args)
+        self._queue = []
+        self._ids = itertools.count()
+        self._cond = threading.Condition()
+        self._running = False
+
+
+    def after(self, time_ms: int, function: Callable, args: list|None = None) -> None:
+        """ Run function(*args) once after time_ms milliseconds, callable from any thread. """
+        with self._cond:
+            heapq.heappush(self._queue, (time.monotonic() + time_ms / 1000, next(self._ids), function, args or []))
+            self._cond.notify()
+
+
+    def cancel(self, function: Callable) -> None:
+        with self._cond:
+            self._queue = [entry for entry in self._queue if entry[2] != function]
+            heapq.heapify(self._queue)
+
+
+    def display(self) -> None:
+        """ Run the callbacks until destroy() is called. """
+        self._running = True
+        while True:
+            with self._cond:
+                if not self._running:
+                    return
+                now = time.monotonic()
+                if not self._queue or self._queue[0][0] > now:
+                    self._cond.wait(self._queue[0][0] - now if self._queue else None)
+                    continue
+                _, _, function, args = heapq.heappop(self._queue)
+            try:
+                function(*args)
+            except Exception:
+                logging.exception("Callback %s failed", getattr(function, "__name__", function))
+
+
+    def pending_callbacks(self) -> int:
+        with self._cond:
+            return len(self._queue)
+
+
+    def destroy(self) -> None:
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+
+
+
+class HeadlessMira(MiraCore):
+    """ MiraCore without view, what would be shown is logged """
+
+    def __init__(self, config: MiraConfig, stations: MiraStations, phases: PhaseTimer|None = None) -> None:
+        super().__init__(config, stations, phases)
+        self.attach(EventLoop())
+        self._enter_page(self._get_saved_page_index())
+
+        self.control_server = None
+        self.stdin_reader = None
+
+
+    def _show_station_name(self, text: str) -> None:
+        logging.info("Station: %s", text)
+
+
+    def _show_status_line(self, text: str) -> None:
+        super()._show_status_line(text)
+        if text:
+            logging.info("Now playing: %s", text)
+
+
+    def execute(self, line: str) -> str:
+        """ Run a control command, see the module docstring. Called on input threads. """
+        words = line.split()
+        if not words:
+            return ""
+        command, args = words[0].lower(), words[1:]
+        if command.isdigit():
+            command, args = "play", [command]
+
+        if command == "status":
+            return self.snapshot.encoded()[1].decode("utf-8")
+        if command in ("pause", "back", "live") and self.timeshift is None:
+            return "error: time-shift is disabled"
+        if command in ("next", "prev") and not args:
+            self.app.after(0, self._play_next, args=[1 if command == "next" else -1])
+        elif command == "rooms" and not args and isinstance(self.player, PlayerGroup):
+            self.app.after(0, self._select_next_group)
+        elif command == "play" and len(args) == 1 and args[0].isdigit():
+            # checked again on the loop, the presets may change meanwhile
+            self.app.after(0, self._on_remote_play, args=[int(args[0]) - 1])
+        elif command == "pause" and not args:
+            self.app.after(0, self._toggle_pause)
+        elif command == "back" and len(args) <= 1 and all(arg.isdigit() for arg in args):
+            self.app.after(0, self._rewind, args=[int(args[0]) if args else self.config.TimeShift.REWIND_STEP])
+        elif command == "live" and not args:
+            self.app.after(0, self._shift, args=[0])
+        elif command == "profile" and not args:
+            # cProfile covers the thread it is enabled on
+            self.app.after(0, self.profiler.toggle)
+        elif command == "volume" and len(args) == 1 and args[0].isdigit() and int(args[0]) <= 100:
+            self.app.after(0, self._set_volume, args=[int(args[0])])
+        else:
+            return f"error: unknown command '{line.strip()}'"
+        return "ok"
+
+
+    def _runtime_counts(self) -> dict:
+        counts = super()._runtime_counts()
+        counts.update(timers=self.app.pending_callbacks())
+        return counts
+
+
+    def run(self) -> None:
+        self._start_control_inputs()
+        super().run()
+
+
+    def _start_control_inputs(self) -> None:
+        if self.config.Headless.CONTROL_SOCKET:
+            path = pathlib.Path(self.config.Headless.CONTROL_SOCKET).expanduser()
+            try:
+                self.control_server = ControlServer(path, self.execute)
+                threading.Thread(target=self.control_server.serve_forever, name="mira-control", daemon=True).start()
+                logging.info("Control socket: %s", path)
+            except OSError as e:
+                logging.error("Cannot create the control socket '%s': %s", path, e)
+
+        # under systemd stdin is /dev/null and the reader ends right away
+        if self.config.Headless.READ_STDIN:
+            self.stdin_reader = threading.Thread(target=self._read_stdin, name="mira-stdin", daemon=True)
+            self.stdin_reader.start()
+
+
+    def _read_stdin(self) -> None:
+        for line in sys.stdin:
+            reply = self.execute(line)
+            if reply:
+                print(reply, flush=True)
+
+
+    def _shut_down(self) -> None:
+        if self.control_server is not None:
+            self.control_server.shutdown()
+            self.control_server.server_close()
+            os.unlink(self.control_server.server_address)
+        super()._shut_down()
+
+
+
+class _ControlHandler(socketserver.StreamRequestHandler):
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            reply = self.server.execute(line.decode("utf-8", errors="replace"))
+            self.wfile.write(reply.encode("utf-8") + b"\n")
+
+
+
+class ControlServer(socketserver.ThreadingUnixStreamServer):
+    """ Line commands on a UNIX socket, each answered with a line """
+
+    daemon_threads = True
+
+    def __init__(self, path: pathlib.Path, execute: Callable[[str], str]) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # left over from a previous run that didn't end cleanly
+        if path.is_socket():
+            path.unlink()
+        super().__init__(str(path), _ControlHandler)
+        os.chmod(path, 0o600)
+        self.execute = execute
+
+
+
+def main() -> None:
+    run_app(lambda phases: HeadlessMira(MiraConfig, MiraStations, phases))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Minimalist Internet Radio - background health checks of the station URLs
+
+A prober thread periodically opens every watched stream URL, a few at a
+time, and records connect time, time to the first byte of audio, HTTP
+status and ICY bitrate. Stations whose URLs all fail are shown as dead,
+and of the URLs of a station (see Key.ALT_URLS) the fastest healthy one
+is played.
+"""
+
+from typing import Any, Callable
+
+import concurrent.futures
+import http.client
+import logging
+import threading
+import time
+import urllib.parse
+
+from mira_config import MiraConfig
+from helpers import Preset
+
+
+REDIRECTS = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 3
+# seconds after start before the first round, so probing doesn't slow down the startup
+FIRST_ROUND_DELAY = 20
+
+
+class ProbeResult:
+    """ Outcome of one check of a stream URL """
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.checked = time.time()
+        # True: stream delivers data, False: dead, None: not checkable (e.g. not HTTP)
+        self.ok = None
+        self.status = None
+        # seconds from the start of the check
+        self.connect_time = None
+        self.ttfb = None
+        # kbit/s announced in the icy-br header
+        self.bitrate = None
+        self.error = None
+
+
+    def __str__(self) -> str:
+        if not self.ok:
+            return f"'{self.url}': {self.error}"
+        return f"'{self.url}': HTTP {self.status}, connect {self.connect_time:.3f}s, ttfb {self.ttfb:.3f}s, {self.bitrate} kbit/s"
+
+
+
+def probe_stream(url: str, timeout: float) -> ProbeResult:
+    """ Open the stream, follow redirects and wait for the first byte of data. """
+    result = ProbeResult(url)
+    start = time.monotonic()
+    try:
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urllib.parse.urlsplit(url)
+            if parts.scheme not in ("http", "https"):
+                result.error = f"not checked ({parts.scheme or 'no scheme'})"
+                return result
+
+            connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+            connection = connection_class(parts.hostname, parts.port, timeout=timeout)
+            try:
+                connection.connect()
+                if result.connect_time is None:
+                    result.connect_time = time.monotonic() - start
+                path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+                connection.request("GET", path, headers={"User-Agent": "mira", "Icy-MetaData": "1"})
+                try:
+                    response = connection.getresponse()
+                except http.client.BadStatusLine as e:
+                    # SHOUTcast v1 answers 'ICY 200 OK'
+                    if str(e).startswith("ICY 200"):
+                        result.status = 200
+                        result.ttfb = time.monotonic() - start
+                        result.ok = True
+                        return result
+                    raise
+
+                result.status = response.status
+                location = response.getheader("Location")
+                if response.status in REDIRECTS and location:
+                    url = urllib.parse.urljoin(url, location)
+                    continue
+                if response.status >= 400:
+                    result.ok = False
+                    result.error = f"HTTP {response.status} {response.reason}"
+                    return result
+
+                first = response.read(1)
+                result.ttfb = time.monotonic() - start
+                if not first:
+                    result.ok = False
+                    result.error = "no data"
+                    return result
+                result.bitrate = _parse_bitrate(response.getheader("icy-br"))
+                result.ok = True
+                return result
+            finally:
+                connection.close()
+
+        result.ok = False
+        result.error = "too many redirects"
+    except (OSError, http.client.HTTPException, ValueError) as e:
+        result.ok = False
+        result.error = str(e) or type(e).__name__
+    return result
+
+
+def _parse_bitrate(value: str|None) -> int|None:
+    # e.g. '128' or '128,128'
+    try:
+        return int(value.split(",")[0]) if value else None
+    except ValueError:
+        return None
+
+
+
+class HealthProber(threading.Thread):
+    """ Checks the watched URLs every Health.INTERVAL seconds with at most Health.PARALLEL checks at a time """
+
+    def __init__(self, config: MiraConfig, on_update: Callable|None = None) -> None:
+        super().__init__(name="mira-health", daemon=True)
+        self.interval = config.Health.INTERVAL
+        self.parallel = max(1, config.Health.PARALLEL)
+        self.timeout = config.Health.TIMEOUT
+        # called on the prober thread after every round
+        self.on_update = on_update
+
+        # url -> ProbeResult
+        self.results = {}
+        self.urls = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+
+
+    def watch(self, urls: list[str]) -> None:
+        """ Set the URLs to check, URLs not checked yet are checked soon. """
+        with self._lock:
+            self.urls = list(dict.fromkeys(urls))
+            unchecked = any(url not in self.results for url in self.urls)
+        if unchecked and self.is_alive():
+            self._wake.set()
+
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._wake.set()
+
+
+    def run(self) -> None:
+        delay = min(FIRST_ROUND_DELAY, self.interval)
+        last_round = 0.0
+        while not self._stopped.is_set():
+            self._wake.wait(delay)
+            self._wake.clear()
+            if self._stopped.is_set():
+                return
+
+            with self._lock:
+                urls = list(self.urls)
+            if time.monotonic() - last_round >= self.interval or last_round == 0.0:
+                last_round = time.monotonic()
+            else:
+                # woken up by watch(), only check the new URLs
+                urls = [url for url in urls if url not in self.results]
+
+            self.probe_all(urls)
+            delay = max(0.0, self.interval - (time.monotonic() - last_round))
+
+
+    def probe_all(self, urls: list[str]) -> dict[str, ProbeResult]:
+        """ Check the given URLs concurrently and store the results. """
+        if not urls:
+            return {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.parallel, thread_name_prefix="mira-probe") as pool:
+            results = dict(zip(urls, pool.map(lambda url: probe_stream(url, self.timeout), urls)))
+
+        with self._lock:
+            self.results.update(results)
+        for result in results.values():
+            if result.ok is False:
+                logging.warning("Station check failed, %s", result)
+            else:
+                logging.debug("Station check %s", result)
+        if self.on_update is not None:
+            self.on_update()
+        return results
+
+
+    def is_dead(self, preset: Preset) -> bool:
+        """ True if all URLs of the preset were checked and failed. """
+        with self._lock:
+            results = [self.results.get(url) for url in (preset.url,) + preset.alt_urls]
+        return all(result is not None and result.ok is False for result in results)
+
+
+    def best_url(self, preset: Preset) -> str:
+        """ The healthy URL of the preset with the shortest time to first byte,
+            unchecked URLs come next, in the given order. """
+        urls = (preset.url,) + preset.alt_urls
+        if len(urls) == 1:
+            return preset.url
+        with self._lock:
+            results = {url: self.results.get(url) for url in urls}
+
+        healthy = sorted((result.ttfb, url) for url, result in results.items() if result is not None and result.ok)
+        if healthy:
+            return healthy[0][1]
+        unchecked = [url for url, result in results.items() if result is None or result.ok is None]
+        return unchecked[0] if unchecked else preset.url
@@ -0,0 +1,275 @@
+"""
+Minimalist Internet Radio - stations and config from data files, reloaded on change
+
+Stations and config overrides can be kept in JSON or TOML files
+(General.STATIONS_FILE, General.CONFIG_FILE). A FileWatcher notices
+changes through inotify, or by comparing os.stat results where inotify
+isn't available. Files that don't parse or don't match the config are
+rejected, the previous values stay in effect.
+
+    stations.toml:          config.toml:
+        [[stations]]            [Buttons]
+        name = "Radio 1"        BACKGROUND_COLOR = "grey"
+        url = "https://..."
+"""
+
+from typing import Any, Callable
+
+import json
+import logging
+import os
+import pathlib
+import select
+import struct
+import threading
+
+from mira_config import MiraConfig
+from constants import Key
+
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct("iIII")
+
+# seconds events are collected before a change is reported, editors write in several steps
+SETTLE_TIME = 0.2
+
+# the widgets are laid out for these at startup
+RESTART_SETTINGS = (("Buttons", "NUM_BUTTON_ROWS"), ("Buttons", "NUM_BUTTON_COLUMNS"))
+# computed from other settings, see apply()
+DERIVED_SETTINGS = (("Buttons", "NUM_BUTTONS_PER_PAGE"),)
+
+
+class ReloadError(Exception):
+    """ A stations or config file was rejected """
+
+
+def load_data_file(path: pathlib.Path) -> Any:
+    """ Parse a JSON or TOML file. """
+    try:
+        if path.suffix.lower() == ".toml":
+            # Python 3.11+
+            import tomllib
+            with open(path, "rb") as infile:
+                return tomllib.load(infile)
+        with open(path, "r", encoding="utf-8") as infile:
+            return json.load(infile)
+    except ImportError as e:
+        raise ReloadError(f"TOML files need Python 3.11: {e}") from e
+    except (OSError, ValueError) as e:
+        raise ReloadError(f"Cannot read '{path}': {e}") from e
+
+
+def load_stations(path: pathlib.Path) -> list[dict]:
+    """ Station dicts from a JSON array, or a JSON/TOML table with a 'stations' array. """
+    data = load_data_file(path)
+    if isinstance(data, dict):
+        data = data.get("stations")
+    if not isinstance(data, list):
+        raise ReloadError(f"'{path}' contains no list of stations")
+
+    stations = []
+    for idx, st in enumerate(data):
+        if not isinstance(st, dict) or not isinstance(st.get(Key.NAME), str) or not isinstance(st.get(Key.URL), str):
+            raise ReloadError(f"Station {idx + 1} in '{path}' needs a name and a url")
+        if not isinstance(st.get(Key.ALT_URLS, []), list):
+            raise ReloadError(f"Station {idx + 1} in '{path}': {Key.ALT_URLS} must be a list")
+        stations.append(st)
+    if not stations:
+        raise ReloadError(f"'{path}' contains no stations")
+    return stations
+
+
+def changed_stations(old: list[dict], new: list[dict]) -> list[int]:
+    """ Numbers of the presets that differ, including added and removed ones. """
+    changed = [number for number, (a, b) in enumerate(zip(old, new)) if a != b]
+    changed.extend(range(min(len(old), len(new)), max(len(old), len(new))))
+    return changed
+
+
+
+class ConfigOverrides:
+    """ Applies the values of a config file on top of the defaults in MiraConfig
+
+        Only existing settings can be changed, and only to values of the
+        same type. Values removed from the file go back to their defaults.
+        While the app runs the button grid stays as it was started. """
+
+    def __init__(self, config: MiraConfig) -> None:
+        self.config = config
+        # (section, name) -> default value
+        self.defaults = {}
+        self.applied = {}
+
+
+    def load(self, path: pathlib.Path) -> dict:
+        """ Parse and check the file. Returns (section, name) -> value. """
+        data = load_data_file(path)
+        if not isinstance(data, dict):
+            raise ReloadError(f"'{path}' must contain a table per config section")
+
+        values = {}
+        for section_name, settings in data.items():
+            section = getattr(self.config, section_name, None)
+            if not isinstance(section, type) or not isinstance(settings, dict):
+                raise ReloadError(f"Unknown config section '{section_name}'")
+            for name, value in settings.items():
+                if not name.isupper() or not hasattr(section, name):
+                    raise ReloadError(f"Unknown setting {section_name}.{name}")
+                if (section_name, name) in DERIVED_SETTINGS:
+                    raise ReloadError(f"{section_name}.{name} is computed from other settings")
+                values[(section_name, name)] = _convert(self._default(section_name, name), value, f"{section_name}.{name}")
+        return values
+
+
+    def reload(self, path: pathlib.Path) -> dict:
+        """ load() for the running app, the settings that need a restart must stay as they are. """
+        values = self.load(path)
+        for key in RESTART_SETTINGS:
+            section_name, name = key
+            if values.get(key, self._default(section_name, name)) != getattr(getattr(self.config, section_name), name):
+                raise ReloadError(f"{section_name}.{name} only changes with a restart")
+        return values
+
+
+    def apply(self, values: dict) -> list[tuple[str, str]]:
+        """ Set the given values, reset the ones no longer given. Returns the changed settings. """
+        changed = []
+        for key in set(self.applied) | set(values):
+            section_name, name = key
+            value = values.get(key, self._default(section_name, name))
+            section = getattr(self.config, section_name)
+            if getattr(section, name) != value:
+                setattr(section, name, value)
+                changed.append(key)
+        self.applied = dict(values)
+
+        buttons = self.config.Buttons
+        buttons.NUM_BUTTONS_PER_PAGE = buttons.NUM_BUTTON_ROWS * buttons.NUM_BUTTON_COLUMNS
+        return changed
+
+
+    def _default(self, section_name: str, name: str) -> Any:
+        key = (section_name, name)
+        if key not in self.defaults:
+            self.defaults[key] = getattr(getattr(self.config, section_name), name)
+        return self.defaults[key]
+
+
+
+def _convert(default: Any, value: Any, setting: str) -> Any:
+    if default is None or value is None:
+        return value
+    if isinstance(default, tuple) and isinstance(value, list):
+        value = tuple(value)
+    if isinstance(default, float) and isinstance(value, int) and not isinstance(value, bool):
+        value = float(value)
+    if type(value) is not type(default):
+        raise ReloadError(f"{setting} must be of type {type(default).__name__}, not {type(value).__name__}")
+    return value
+
+
+
+class FileWatcher(threading.Thread):
+    """ Calls on_change(path) when one of the files was written, replaced or removed """
+
+    def __init__(self, paths: list[pathlib.Path], poll_interval: float, on_change: Callable) -> None:
+        super().__init__(name="mira-reload", daemon=True)
+        self.paths = [path.expanduser().resolve() for path in paths]
+        self.poll_interval = poll_interval
+        self.on_change = on_change
+        # inotify watch descriptor -> watched directory
+        self._directories = {}
+        self._stop_read, self._stop_write = os.pipe()
+        self._stopped = threading.Event()
+
+
+    def stop(self) -> None:
+        self._stopped.set()
+        os.write(self._stop_write, b"x")
+
+
+    def run(self) -> None:
+        fd = self._init_inotify()
+        if fd is None:
+            logging.info("inotify not available, checking %s every %ss", self.paths, self.poll_interval)
+            self._poll()
+            return
+        try:
+            self._watch(fd)
+        finally:
+            os.close(fd)
+
+
+    def _init_inotify(self) -> int|None:
+        # imported here, only the watcher thread needs ctypes
+        import ctypes
+        import ctypes.util
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        if fd < 0:
+            return None
+
+        # watch the directories, editors replace files by renaming
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_MODIFY
+        for directory in {path.parent for path in self.paths}:
+            wd = libc.inotify_add_watch(fd, str(directory).encode(), mask)
+            if wd < 0:
+                logging.warning("Cannot watch '%s': %s", directory, os.strerror(ctypes.get_errno()))
+                os.close(fd)
+                return None
+            self._directories[wd] = directory
+        return fd
+
+
+    def _watch(self, fd: int) -> None:
+        # files of the same name in two directories are told apart by the watch descriptor
+        files = {(path.parent, path.name): path for path in self.paths}
+        pending = set()
+        while not self._stopped.is_set():
+            # after an event wait until the writer is done
+            timeout = SETTLE_TIME if pending else None
+            ready, _, _ = select.select([fd, self._stop_read], [], [], timeout)
+            if self._stop_read in ready:
+                return
+            if not ready:
+                for path in pending:
+                    self.on_change(path)
+                pending.clear()
+                continue
+
+            data = os.read(fd, 64 * 1024)
+            offset = 0
+            while offset < len(data):
+                wd, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0").decode(errors="replace")
+                offset += EVENT_HEADER.size + length
+                path = files.get((self._directories.get(wd), name))
+                if path is not None:
+                    pending.add(path)
+
+
+    def _poll(self) -> None:
+        signatures = {path: _signature(path) for path in self.paths}
+        while not self._stopped.wait(self.poll_interval):
+            for path in self.paths:
+                signature = _signature(path)
+                if signature != signatures[path]:
+                    signatures[path] = signature
+                    self.on_change(path)
+
+
+
+def _signature(path: pathlib.Path) -> tuple|None:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
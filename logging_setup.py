@@ -0,0 +1,225 @@
+"""
+Minimalist Internet Radio - logging pipeline
+
+Log records are handed to a queue and written by a background thread.
+The log file is flushed in batches, rotated by size and age and the
+rotated files are gzipped. An optional in-RAM ring buffer keeps the last
+records and is only written to disk on an error or on request.
+"""
+
+from typing import Any
+
+import collections
+import gzip
+import logging
+import logging.handlers
+import os
+import pathlib
+import queue
+import shutil
+import sys
+import threading
+import time
+
+from mira_config import MiraConfig
+
+FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+class BatchedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """ Rotating log file, flushed every flush_interval seconds or on errors, rotated by size or age
+
+        flush() is called after every record and only flushes when due, flush_if_due()
+        is to be called periodically, so records written before a quiet time get out. """
+
+    def __init__(self, filename: str, max_bytes: int, max_age: float, backup_count: int, flush_interval: float) -> None:
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+        self.max_age = max_age
+        self.flush_interval = flush_interval
+        self.last_flush = time.monotonic()
+        # records written since the last flush
+        self.unflushed = False
+        # time.time() the current file was started, kept across restarts
+        self.opened = _get_start_time(self.baseFilename)
+        self.namer = lambda name: name + ".gz"
+        self.rotator = _gzip_rotator
+
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.unflushed = True
+        super().emit(record)
+        if record.levelno >= logging.ERROR:
+            self.force_flush()
+
+
+    def flush(self) -> None:
+        # called by StreamHandler.emit after every record, only flush when due
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            self.force_flush()
+
+
+    def flush_if_due(self) -> None:
+        if self.unflushed:
+            self.acquire()
+            try:
+                self.flush()
+            finally:
+                self.release()
+
+
+    def force_flush(self) -> None:
+        self.last_flush = time.monotonic()
+        self.unflushed = False
+        super().flush()
+
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self.max_age and time.time() - self.opened >= self.max_age and os.path.exists(self.baseFilename):
+            return True
+        return bool(super().shouldRollover(record))
+
+
+    def doRollover(self) -> None:
+        super().doRollover()
+        self.opened = time.time()
+
+
+
+def _get_start_time(filename: str) -> float:
+    """ time.time() of the first record in the log file, now if there is none """
+    try:
+        with open(filename, "r", encoding="utf-8", errors="replace") as infile:
+            first_line = infile.readline()
+        # lines start with asctime, e.g. 2024-05-01 12:00:00,123
+        return time.mktime(time.strptime(first_line[:19], "%Y-%m-%d %H:%M:%S"))
+    except OSError:
+        return time.time()
+    except ValueError:
+        # written with another format, the file's modification time is the best guess left
+        return os.stat(filename).st_mtime
+
+
+
+def _gzip_rotator(source: str, dest: str) -> None:
+    with open(source, "rb") as infile, gzip.open(dest, "wb") as outfile:
+        shutil.copyfileobj(infile, outfile)
+    os.remove(source)
+
+
+
+class RingBufferHandler(logging.Handler):
+    """ Keeps the last records in RAM, writes them to a file on errors or on request
+
+        Only the first error of a burst dumps, errors within dump_interval seconds
+        after it don't. Error dumps leave out the records an earlier dump wrote. """
+
+    def __init__(self, size: int, dump_file: str, dump_interval: float) -> None:
+        super().__init__()
+        self.records = collections.deque(maxlen=size)
+        self.dump_file = pathlib.Path(dump_file).expanduser()
+        self.dump_interval = dump_interval
+        # time.monotonic() of the last error dump, None before the first one
+        self.last_dump = None
+        # records kept since the last dump
+        self.undumped = 0
+        self._dump_lock = threading.Lock()
+
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.records.append(record)
+        self.undumped += 1
+        if record.levelno >= logging.ERROR:
+            now = time.monotonic()
+            if self.last_dump is None or now - self.last_dump >= self.dump_interval:
+                self.last_dump = now
+                self.dump(only_new=True)
+
+
+    def dump(self, only_new: bool = False) -> None:
+        with self._dump_lock:
+            records = list(self.records)
+            if only_new:
+                records = records[len(records) - min(self.undumped, len(records)):]
+            self.undumped = 0
+            lines = [self.format(record) for record in records]
+            try:
+                self.dump_file.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.dump_file, "a", encoding="utf-8") as outfile:
+                    outfile.write("\n".join(lines) + "\n--- end of ring buffer ---\n")
+            except OSError as e:
+                sys.stderr.write(f"Couldn't dump log ring buffer. {e}\n")
+
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """ Enqueues records unformatted, the message is formatted on the writer thread """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+
+class LogPipeline:
+    """ Queue based logging: the calling thread only enqueues records """
+
+    def __init__(self, config: MiraConfig) -> None:
+        general = config.General
+        logfile = pathlib.Path(general.LOGFILE).expanduser()
+        logfile.parent.mkdir(parents=True, exist_ok=True)
+
+        formatter = logging.Formatter(FORMAT)
+        file_level = logging.DEBUG if general.LOGLEVEL_DEBUG else logging.WARNING
+
+        self.file_handler = BatchedRotatingFileHandler(
+                                str(logfile),
+                                general.LOG_MAX_BYTES,
+                                general.LOG_MAX_AGE,
+                                general.LOG_BACKUP_COUNT,
+                                general.LOG_FLUSH_INTERVAL
+                                )
+        self.file_handler.setLevel(file_level)
+        self.file_handler.setFormatter(formatter)
+        handlers = [self.file_handler]
+
+        # records below the file level are only created if the ring buffer wants them
+        root_level = file_level
+        self.ring_handler = None
+        if general.LOG_RING_SIZE > 0:
+            self.ring_handler = RingBufferHandler(general.LOG_RING_SIZE, general.LOG_RING_FILE, general.LOG_RING_DUMP_INTERVAL)
+            self.ring_handler.setLevel(logging.INFO)
+            self.ring_handler.setFormatter(formatter)
+            handlers.append(self.ring_handler)
+            root_level = min(root_level, logging.INFO)
+
+        self._stopped = threading.Event()
+        threading.Thread(target=self._flush_loop, name="mira-log-flush", daemon=True).start()
+
+        self.queue = queue.SimpleQueue()
+        self.listener = logging.handlers.QueueListener(self.queue, *handlers, respect_handler_level=True)
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(LazyQueueHandler(self.queue))
+        root.setLevel(root_level)
+        self.listener.start()
+
+
+    def dump_ring(self, *args: Any) -> None:
+        """ Write the in-RAM ring buffer to its file, usable as a signal handler. """
+        if self.ring_handler is not None:
+            self.ring_handler.dump()
+
+
+    def stop(self) -> None:
+        """ Write all pending records and close the log file. """
+        self._stopped.set()
+        self.listener.stop()
+        self.file_handler.force_flush()
+        self.file_handler.close()
+
+
+    def _flush_loop(self) -> None:
+        # records don't wait in the buffer for the next one when the app is quiet
+        while not self._stopped.wait(self.file_handler.flush_interval):
+            self.file_handler.flush_if_due()
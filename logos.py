@@ -0,0 +1,156 @@
+"""
+Minimalist Internet Radio - station logos on the preset buttons
+
+Logos (see Key.LOGO, a file path or an http(s) URL) are decoded and
+scaled to the button size once, and stored as PNG thumbnails in
+Logos.CACHE_DIR. Thumbnails are created on a worker thread and turned into
+images on the GUI thread, where the most recently used ones are kept
+within a byte budget.
+"""
+
+from typing import Any, Callable
+
+import collections
+import hashlib
+import io
+import logging
+import math
+import os
+import pathlib
+import urllib.parse
+import urllib.request
+
+from mira_config import MiraConfig
+
+try:
+    # optional, only needed to create thumbnails
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+# larger logo files are not loaded
+MAX_SOURCE_SIZE = 2 * 1024 * 1024
+
+
+class LogoCache:
+    """ Thumbnails on disk, images in an LRU with a byte budget """
+
+    def __init__(self, config: MiraConfig, make_image: Callable[[pathlib.Path], Any]) -> None:
+        self.cache_dir = pathlib.Path(config.Logos.CACHE_DIR).expanduser()
+        self.size = (
+            math.floor(config.Display.WIDTH / config.Buttons.NUM_BUTTON_COLUMNS) - 8,
+            min(config.Logos.HEIGHT, config.Buttons.BUTTON_HEIGHT - 8)
+            )
+        self.budget = config.Logos.MEMORY_BUDGET
+        self.timeout = config.Logos.TIMEOUT
+        # creates an image from a thumbnail file, called on the GUI thread
+        self.make_image = make_image
+
+        # source -> (image, bytes), least recently used first
+        self.images = collections.OrderedDict()
+        self.used = 0
+        # sources being loaded or failed, not requested again
+        self.pending = set()
+        self.failed = set()
+
+        if Image is None:
+            logging.info("Pillow is not installed, only logos with a thumbnail in '%s' are shown", self.cache_dir)
+
+
+    def get(self, source: str) -> Any|None:
+        entry = self.images.get(source)
+        if entry is None:
+            return None
+        self.images.move_to_end(source)
+        return entry[0]
+
+
+    def claim(self, source: str) -> bool:
+        """ True if the logo is to be loaded: neither loaded, nor being loaded, nor failed. """
+        if source in self.images or source in self.pending or source in self.failed:
+            return False
+        self.pending.add(source)
+        return True
+
+
+    def load(self, source: str) -> tuple[str, pathlib.Path|None]:
+        """ Create the thumbnail unless it exists. Runs on a worker thread.
+            Returns the source and the thumbnail path, None if it failed. """
+        try:
+            thumbnail = self._thumbnail_path(source)
+            if not thumbnail.exists():
+                self._create_thumbnail(self._read_source(source), thumbnail)
+            return source, thumbnail
+        except Exception as e:
+            # image decoders raise all kinds of errors
+            logging.warning("Cannot load logo '%s': %s", source, e)
+            return source, None
+
+
+    def add(self, source: str, thumbnail: pathlib.Path|None) -> Any|None:
+        """ Turn a loaded thumbnail into an image and keep it. Returns the image. """
+        self.pending.discard(source)
+        if thumbnail is None:
+            self.failed.add(source)
+            return None
+        try:
+            image = self.make_image(thumbnail)
+        except Exception as e:
+            logging.warning("Cannot show logo '%s': %s", thumbnail, e)
+            self.failed.add(source)
+            return None
+
+        # RGBA pixels
+        size = image.width() * image.height() * 4
+        self.images[source] = (image, size)
+        self.used += size
+        # buttons showing an evicted image keep it until they are rebound
+        while self.used > self.budget and len(self.images) > 1:
+            _, (_, old_size) = self.images.popitem(last=False)
+            self.used -= old_size
+        return image
+
+
+    def _thumbnail_path(self, source: str) -> pathlib.Path:
+        # an edited logo file gets a new thumbnail
+        key = source
+        if not _is_url(source):
+            st = os.stat(pathlib.Path(source).expanduser())
+            key = f"{source}|{st.st_size}|{st.st_mtime_ns}"
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{digest}-{self.size[0]}x{self.size[1]}.png"
+
+
+    def _read_source(self, source: str) -> bytes:
+        if _is_url(source):
+            request = urllib.request.Request(source, headers={"User-Agent": "mira"})
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                data = response.read(MAX_SOURCE_SIZE + 1)
+        else:
+            with open(pathlib.Path(source).expanduser(), "rb") as infile:
+                data = infile.read(MAX_SOURCE_SIZE + 1)
+        if len(data) > MAX_SOURCE_SIZE:
+            raise ValueError(f"larger than {MAX_SOURCE_SIZE} bytes")
+        return data
+
+
+    def _create_thumbnail(self, data: bytes, thumbnail: pathlib.Path) -> None:
+        if Image is None:
+            raise ValueError("Pillow is needed to create the thumbnail")
+        with Image.open(io.BytesIO(data)) as img:
+            # JPEGs are decoded at a reduced size right away
+            img.draft("RGB", self.size)
+            scaled = img.convert("RGBA")
+        scaled.thumbnail(self.size, Image.LANCZOS)
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = thumbnail.with_suffix(".tmp")
+        scaled.save(tmp, "PNG")
+        os.replace(tmp, thumbnail)
+        logging.info("Created logo thumbnail '%s' (%sx%s)", thumbnail.name, scaled.width, scaled.height)
+
+
+
+def _is_url(source: str) -> bool:
+    return urllib.parse.urlsplit(source).scheme in ("http", "https")
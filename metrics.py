@@ -0,0 +1,214 @@
+"""
+Minimalist Internet Radio - latency metrics of the hot paths
+
+Latencies go into fixed-bucket histograms, calls, failures and timeouts
+into counters, so memory stays bounded. The data is exported in the
+Prometheus text format, as a file (e.g. for the node_exporter textfile
+collector) and/or served on localhost. When disabled, timing costs a
+single attribute check.
+"""
+
+from typing import Any
+
+import contextlib
+import logging
+import os
+import pathlib
+import threading
+import time
+
+from mira_config import MiraConfig
+
+
+# upper bounds in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+COUNTERS = ("calls", "failures", "timeouts")
+
+# returned by Metrics.time() when disabled, nullcontext can be entered any number of times
+_NO_TIMER = contextlib.nullcontext()
+
+
+class Histogram:
+    """ Latency histogram with fixed buckets """
+
+    def __init__(self) -> None:
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+
+    def observe(self, seconds: float) -> None:
+        for idx, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[idx] += 1
+                break
+        self.count += 1
+        self.sum += seconds
+
+
+    def mean(self) -> float|None:
+        return self.sum / self.count if self.count else None
+
+
+
+class _Timer:
+    """ Context manager recording one call of an operation """
+
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics: "Metrics", name: str) -> None:
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        self.metrics.observe(self.name, time.monotonic() - self.start, failed=exc_type is not None)
+
+
+
+class Metrics:
+    """ Registry of latency histograms and counters per operation """
+
+    def __init__(self, config: MiraConfig) -> None:
+        self.enabled = config.Metrics.ENABLED
+        self.textfile = config.Metrics.TEXTFILE
+        self.export_interval = config.Metrics.EXPORT_INTERVAL
+        self.http_port = config.Metrics.HTTP_PORT
+
+        self.histograms = {}
+        # (operation, counter) -> value
+        self.counters = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._server = None
+
+
+    def time(self, name: str, label: str|None = None) -> Any:
+        """ Context manager measuring the enclosed block as one call of the operation.
+            With a label the operation is name:label, only built when enabled. """
+        if not self.enabled:
+            return _NO_TIMER
+        return _Timer(self, name if label is None else f"{name}:{label}")
+
+
+    def observe(self, name: str, seconds: float, failed: bool = False, label: str|None = None) -> None:
+        if not self.enabled:
+            return
+        if label is not None:
+            name = f"{name}:{label}"
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+            self._add(name, "calls")
+            if failed:
+                self._add(name, "failures")
+
+
+    def inc(self, name: str, counter: str, label: str|None = None) -> None:
+        if not self.enabled:
+            return
+        if label is not None:
+            name = f"{name}:{label}"
+        with self._lock:
+            self._add(name, counter)
+
+
+    def render(self) -> str:
+        """ All metrics in the Prometheus text format. """
+        with self._lock:
+            lines = [
+                "# HELP mira_latency_seconds Latency of mira operations.",
+                "# TYPE mira_latency_seconds histogram"
+                ]
+            for name, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS, histogram.buckets):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'mira_latency_seconds_bucket{{op="{name}",le="{le}"}} {cumulative}')
+                lines.append(f'mira_latency_seconds_sum{{op="{name}"}} {histogram.sum:.6f}')
+                lines.append(f'mira_latency_seconds_count{{op="{name}"}} {histogram.count}')
+
+            for counter in COUNTERS:
+                lines.append(f"# TYPE mira_{counter}_total counter")
+                for (name, kind), value in sorted(self.counters.items()):
+                    if kind == counter:
+                        lines.append(f'mira_{counter}_total{{op="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+    def start_export(self) -> None:
+        """ Start writing the text file and serving HTTP as configured. """
+        if not self.enabled:
+            return
+        if self.textfile:
+            threading.Thread(target=self._export_loop, name="mira-metrics", daemon=True).start()
+        if self.http_port:
+            self._start_server()
+
+
+    def stop_export(self) -> None:
+        self._stopped.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
+        if self.enabled and self.textfile:
+            self.write_textfile()
+
+
+    def write_textfile(self) -> None:
+        filepath = pathlib.Path(self.textfile).expanduser()
+        tmpfile = filepath.with_name(filepath.name + ".tmp")
+        try:
+            filepath.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmpfile, "w") as outfile:
+                outfile.write(self.render())
+            os.replace(tmpfile, filepath)
+        except OSError as e:
+            logging.error("Couldn't write metrics. %s", e)
+
+
+    def _add(self, name: str, counter: str) -> None:
+        key = (name, counter)
+        self.counters[key] = self.counters.get(key, 0) + 1
+
+
+    def _export_loop(self) -> None:
+        while not self._stopped.wait(self.export_interval):
+            self.write_textfile()
+
+
+    def _start_server(self) -> None:
+        # imported on demand, only needed with Metrics.HTTP_PORT
+        import http.server
+        metrics = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        try:
+            self._server = http.server.ThreadingHTTPServer(("127.0.0.1", self.http_port), Handler)
+        except OSError as e:
+            logging.error("Cannot serve metrics on port %s: %s", self.http_port, e)
+            return
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="mira-metrics-http", daemon=True).start()
+        logging.info("Serving metrics on http://127.0.0.1:%s/metrics", self.http_port)
@@ -12,67 +12,90 @@ MIRa - Minimalist Internet Radio
 
 from typing import Any, AnyStr
 
+# first import: marks the start time for the startup phase timings
+from startup import PhaseTimer
+
 import platform
 import argparse
 import guizero
-import subprocess
 import logging
-import json
 import datetime
 import pathlib
-import math
+import time
+import tkinter
 
 from mira_config import MiraConfig
 from mira_stations import MiraStations
-from constants import Key
 
-from helpers import Preset, PresetButton, PageButton, ensure_dir_exists, get_stations_list
+from helpers import Preset
+from widgets import PageButton
+from mira_core import MiraCore, run_app
+from multiroom import PlayerGroup
+from wifi import WifiQualityProvider
+from pages import create_page_pool
+from view_model import ViewModel
+from backlight import Backlight
+
 
 
+class MiraAppplication(MiraCore):
+    """ Top level application, the touchscreen view of MiraCore """
 
-class MiraAppplication:
-    """ Top level application """
 
+    def __init__(self, config: MiraConfig, stations: MiraStations, fullscreen: bool, phases: PhaseTimer|None = None) -> None:
 
-    def __init__(self, config: MiraConfig, stations: MiraStations, fullscreen: bool) -> None:
+        # the last played station is started here already
+        super().__init__(config, stations, phases)
 
-        self.config = config
-        self.timer_running = False
+        # station logos, None if disabled
+        self.logos = None
+        if config.Logos.ENABLED:
+            # imported on demand, pulls in Pillow if installed
+            from logos import LogoCache
+            self.logos = LogoCache(config, self._make_logo_image)
+
+        # signal quality shown in the title bar
+        self.wifi = WifiQualityProvider(
+                                config.Title.WIFI_INTERFACE,
+                                config.Title.WIFI_STATS_FILE,
+                                config.Title.WIFI_MAX_QUALITY,
+                                config.Title.WIFI_SMOOTHING_WINDOW
+                                )
+        self.wifi_task = None
+        self.ticks.add("wifi", config.Title.UPDATE_INTERVAL, self._update_title_bar, enabled=False)
+        # the clock must not change before the minute does
+        self.ticks.add("clock", 60 * 1000, self._on_clock_timer, priority=1, window=0, enabled=False)
+
+        # screen blanked after PowerSave.IDLE_TIME without touch input, see _enter_idle()
+        self.idle = False
+        self.last_touch = time.monotonic()
+        self.idle_overlay = None
+        # jobs paused while idle
+        self.paused_jobs = []
+        self.backlight = None
+        if config.PowerSave.BACKLIGHT_FILE:
+            self.backlight = Backlight(config.PowerSave.BACKLIGHT_FILE)
+        self.ticks.add("power_save", config.PowerSave.IDLE_TIME * 1000, self._on_power_save_timer, enabled=False)
 
         self.preset_buttons = []
         self.page_buttons = []
 
-        # build list of presets from predefined stations list
-        st_list = get_stations_list(stations)
-        self.presets = []
-        n = 0
-        for st in st_list:
-            self.presets.append(Preset(n, config, st))
-            n += 1
-        
-        # if no stations are defined, add a default station
-        if len(self.presets) == 0:
-            dummy_st = dict(
-                name = "Radio 1",
-                url = "https://radio1.de"
-                )
-            dummy_preset = Preset(0, config, dummy_st)
-            self.presets.append(dummy_preset)
-
-        # restore last station or None
-        self.current_preset = self._load_last_played()
-
         # top level window
         self.app = guizero.App(
                             title="MIRa",
                             width=config.Display.WIDTH,
                             height=config.Display.HEIGHT
                             )
-        
+
         if fullscreen:
             self.app.set_full_screen()
 
-        logging.info(f"App window: width={self.app.width}, height={self.app.height}")
+        self.attach(self.app)
+
+        # widget properties are changed through the view model, see _show()
+        self.view = ViewModel(self.app.after, config.Display.FRAME_INTERVAL)
+
+        logging.info("App window: width=%s, height=%s", self.app.width, self.app.height)
 
         # title bar
         self._create_title_bar()
@@ -91,14 +114,18 @@ class MiraAppplication:
                                 height=(self.config.Buttons.BUTTON_HEIGHT * self.config.Buttons.NUM_BUTTON_ROWS),
                                 layout="grid"
                                 )
-        
-        logging.info(f"Preset buttons box: width={self.buttons_box.width}, height={self.buttons_box.height}")
+
+        logging.info("Preset buttons box: width=%s, height=%s", self.buttons_box.width, self.buttons_box.height)
+
+        # pages of preset buttons are reused instead of rebuilt on every page switch
+        self.page_pool = create_page_pool(self.buttons_box, self._on_preset_button, self.config)
 
         # create buttons within the preset buttons box
-        self._create_buttons_page(self._get_current_page_index())
+        self._create_buttons_page(self._get_saved_page_index())
 
         # box that contains the page selector buttons
         self._create_page_selector()
+        self.phases.mark("widgets")
 
 
 
@@ -153,6 +180,8 @@ class MiraAppplication:
                                 height=status_box_height
                                 )
         self.status_box.bg = self.config.Status.BACKGROUND_COLOR
+        if isinstance(self.player, PlayerGroup) and len(self.player.groups) > 1:
+            self.status_box.when_clicked = self._select_next_group
         self.status_box1 = guizero.Box(
                                 self.status_box,
                                 align="top",
@@ -195,36 +224,23 @@ class MiraAppplication:
 
 
     def _create_buttons_page(self, page_idx: int) -> None:
+        with self.metrics.time("create_buttons_page"):
+            presets = self._enter_page(page_idx)
 
-        # reset
-        self.preset_buttons = []
-        logging.info(f"--- preset buttons box cleanup ---")
-        logging.info(f"All button box children before destroy: {self.buttons_box.children}")
-        while len(self.buttons_box.children) > 0:
-            self.buttons_box.children[0].destroy()
-        logging.info(f"All button box children after destroy: {self.buttons_box.children}")
+            # pending changes must not hit buttons of a page dropped from the cache
+            self.view.apply()
+            self.preset_buttons = self.page_pool.show(page_idx, presets)
+            if self.page_pool.rebinds:
+                for btn in self.preset_buttons:
+                    self.view.forget(btn.button)
 
-        # create a button for each preset of the given page
-        bt_x = 0
-        bt_y = 0
-        for idx in range(0, self._get_num_presets_of_page(page_idx)):
+            if self.logos is not None:
+                self._show_logos()
+                self._load_logos(page_idx)
 
-            ps = self.presets[self._get_first_preset_idx_of_page(page_idx) + idx]
-            bt = PresetButton(
-                    containing_box=self.buttons_box, 
-                    position=(bt_x, bt_y),
-                    preset=ps,
-                    callback=self._on_button_pressed,
-                    config=self.config
-                    )
-
-            self.preset_buttons.append(bt)
-            logging.info(f"Placed preset button on grid at: x={bt_x}, y={bt_y}")
-
-            bt_x += 1
-            if bt_x >= self.config.Buttons.NUM_BUTTON_COLUMNS:
-                bt_x = 0
-                bt_y += 1
+            if self.health is not None:
+                self._show_station_health()
+            logging.info("Showing preset page %s, buttons box children: %s", page_idx, len(self.buttons_box.children))
 
 
 
@@ -257,249 +273,320 @@ class MiraAppplication:
             bt_x += 1
 
 
-    def _get_current_page_index(self) -> int:
-        if self.current_preset is not None:
-            return math.floor(self.current_preset.number / self.config.Buttons.NUM_BUTTONS_PER_PAGE)
-        return 0
-    
-    def _get_first_preset_idx_of_page(self, page_idx: int) -> int:
-        return page_idx * self.config.Buttons.NUM_BUTTONS_PER_PAGE
-
-    def _get_num_presets_of_page(self, page_idx: int) -> int:
-        cnt = len(self.presets) - self._get_first_preset_idx_of_page(page_idx)
-        if cnt > self.config.Buttons.NUM_BUTTONS_PER_PAGE:
-            cnt = self.config.Buttons.NUM_BUTTONS_PER_PAGE
-        return cnt
-    
-    def _get_num_pages(self) -> int:
-        return math.ceil(len(self.presets) / self.config.Buttons.NUM_BUTTONS_PER_PAGE)
+    def _rebuild_page_selector(self) -> None:
+        self.view.apply()
+        self.selector_box.destroy()
+        self._create_page_selector()
 
 
+    def _on_preset_button(self, preset: Preset) -> None:
+        # with time-shift the button of the playing station pauses and resumes it
+        if self.timeshift is not None and self.current_preset is not None and preset.number == self.current_preset.number:
+            self._toggle_pause()
+        else:
+            self._on_button_pressed(preset)
 
-    def _on_page_selected(self, page_idx: int) -> None:
-        logging.info(f"Page '{page_idx}' was selected.")
 
+    def _show_page(self, page_idx: int) -> None:
         self._create_buttons_page(page_idx)
         self._update_page_btn_color(page_idx)
-        self._update_btn_color(self.current_preset)
+        if self.current_preset is not None:
+            self._update_btn_color(self.current_preset)
 
 
-    def _on_button_pressed(self, preset: Preset) -> None:
-        logging.info(f"Button '{preset.name}' was pressed. URL: '{preset.url}'")
-        self.current_preset = preset
+    def _show_pressed(self, preset: Preset) -> None:
+        self._update_btn_color(preset)
 
-        self._play(preset)
 
-        # change color of pressed button
-        self._update_btn_color(preset)
+    def _show_station_name(self, text: str) -> None:
+        self._show(self.status_text1, "value", text)
+
 
-        # save state
-        self._save_last_played(preset)
+    def _show_status_line(self, text: str) -> None:
+        super()._show_status_line(text)
+        self._show(self.status_text2, "value", text)
 
 
-    def _update_btn_color(self, preset: Preset) -> None:
+    def _update_btn_color(self, preset: Preset|None) -> None:
+        # None: no button is pressed
         for btn in self.preset_buttons:
-            if btn.preset.number == preset.number:
-                btn.button.bg = self.config.Buttons.PRESSED_BUTTON_COLOR
+            if preset is not None and btn.preset.number == preset.number:
+                self._show(btn.button, "bg", self.config.Buttons.PRESSED_BUTTON_COLOR)
             else:
-                btn.button.bg = self.config.Buttons.BACKGROUND_COLOR
+                self._show(btn.button, "bg", self.config.Buttons.BACKGROUND_COLOR)
 
 
     def _update_page_btn_color(self, page_idx: int) -> None:
         for btn in self.page_buttons:
             if btn.idx == page_idx:
-                btn.button.bg = self.config.PageSelector.PRESSED_BUTTON_COLOR
+                self._show(btn.button, "bg", self.config.PageSelector.PRESSED_BUTTON_COLOR)
             else:
-                btn.button.bg = self.config.PageSelector.BACKGROUND_COLOR
+                self._show(btn.button, "bg", self.config.PageSelector.BACKGROUND_COLOR)
 
 
-    def _play(self, preset: Preset) -> None:
-        # stop refresh timer
-        if self.timer_running:
-            self.app.cancel(self._on_status_timer)
-            self.timer_running = False
+    def _show(self, widget: Any, prop: str, value: Any) -> None:
+        # applied with the next frame, if the value changed
+        self.view.set(widget, prop, value)
 
-        # clear playlist
-        self._execute_mpc(["clear"])
-        # add url
-        self._execute_mpc(["add", preset.url])
-        # play playlist
-        self._execute_mpc(["play"])
 
-        # update status line
-        self.status_text1.value = preset.name
-        self.status_text2.value = ""
+    def _show_station_health(self) -> None:
+        for btn in self.preset_buttons:
+            if self.health.is_dead(btn.preset):
+                self._show(btn.button, "text_color", self.config.Health.DEAD_TEXT_COLOR)
+            else:
+                self._show(btn.button, "text_color", btn.preset.text_color)
 
-        # start refresh timer
-        self.app.after(self.config.Status.INITAL_UPDATE_INTERVAL, self._on_status_timer)
-        self.timer_running = True
 
+    def _show_logos(self) -> None:
+        for btn in self.preset_buttons:
+            btn.show_logo(self.logos.get(btn.preset.logo) if btn.preset.logo else None)
+
+
+    def _load_logos(self, page_idx: int) -> None:
+        # the visible page first, then its neighbours, so they show up with their logos
+        for idx in (page_idx, page_idx + 1, page_idx - 1):
+            if not 0 <= idx < self._get_num_pages():
+                continue
+            for ps in self.presets.get_range(self._get_first_preset_idx_of_page(idx), self._get_num_presets_of_page(idx)):
+                # on a lane of their own, so downloads don't hold up state writes;
+                # no timeout, queued loads would expire, load() reports failures itself
+                if ps.logo and self.logos.claim(ps.logo):
+                    self.executor.submit(
+                            "logos",
+                            self.logos.load,
+                            args=[ps.logo],
+                            on_done=self._on_logo_loaded
+                            )
 
-    def _on_status_timer(self) -> None:
-        self._update_status()
-        self.app.after(self.config.Status.UPDATE_INTERVAL, self._on_status_timer)
 
+    def _on_logo_loaded(self, result: tuple[str, pathlib.Path|None]) -> None:
+        source, thumbnail = result
+        if self.logos.add(source, thumbnail) is not None:
+            self._show_logos()
 
-    def _on_title_timer(self) -> None:
-        self._update_title_bar()
 
+    def _make_logo_image(self, thumbnail: pathlib.Path) -> tkinter.PhotoImage:
+        # Tk decodes PNG by itself
+        return tkinter.PhotoImage(master=self.app.tk, file=str(thumbnail))
 
-    def _update_title_bar(self) -> None:
+
+    def _on_config_changed(self) -> None:
+        # buttons take colors and fonts from the config
+        self.page_pool.invalidate()
+        self._rebuild_page_selector()
+        self._create_buttons_page(self.page_idx)
+        self._update_page_btn_color(self.page_idx)
+        if self.current_preset is not None:
+            self._update_btn_color(self.current_preset)
+        self._show(self.title_bar, "bg", self.config.Title.BACKGROUND_COLOR)
+        self._show(self.status_box, "bg", self.config.Status.BACKGROUND_COLOR)
+
+
+    def _on_stations_changed(self, changed: list[int], num_pages: int) -> None:
+        # only pages with changed presets are rebound
+        if self._get_num_pages() != num_pages:
+            self.page_pool.invalidate()
+            self._rebuild_page_selector()
+        else:
+            self.view.apply()
+            for page_idx in sorted({number // self.config.Buttons.NUM_BUTTONS_PER_PAGE for number in changed}):
+                first = self._get_first_preset_idx_of_page(page_idx)
+                presets = self.presets.get_range(first, self._get_num_presets_of_page(page_idx))
+                for btn in self.page_pool.update(page_idx, presets):
+                    self.view.forget(btn.button)
+
+        self._create_buttons_page(min(self.page_idx, self._get_num_pages() - 1))
+        self._update_page_btn_color(self.page_idx)
+        # also clears the pressed button if the playing station is no longer a preset
+        self._update_btn_color(self.current_preset)
+
+
+    def _on_clock_timer(self) -> None:
+        self._update_clock()
+        # realigned on every run, the scheduler may be late by some milliseconds
+        self.ticks.enable("clock", self._get_clock_delay())
+
+
+    def _get_clock_delay(self) -> int:
+        # next update just after the full minute
+        delay = 60 - time.time() % 60
+        return int(delay * 1000) + 20
+
+
+    def _update_clock(self) -> None:
         dt = datetime.datetime.now()
         date = dt.strftime('%a %d %b %Y')
         if self.config.Title.USE_24h_TIME_FORMAT:
-            time = dt.strftime('%H:%M')
+            clock = dt.strftime('%H:%M')
         else:
-            time = dt.strftime('%I:%M %p')
+            clock = dt.strftime('%I:%M %p')
+
+        self._show(self.title_bar_date, "value", " " + date)
+        self._show(self.title_bar_time, "value", clock)
+
+
+    def _update_title_bar(self) -> None:
+        with self.metrics.time("update_title_bar"):
+            # skip the query while the previous one is still running
+            if self.wifi_task is None or not self.wifi_task.pending():
+                self.wifi_task = self.executor.submit(
+                                    "wifi",
+                                    self._get_wifi_quality,
+                                    on_done=self._show_wifi_quality,
+                                    on_error=self._on_wifi_error,
+                                    timeout=self.config.Background.WIFI_TIMEOUT
+                                    )
+
+
+    def _on_wifi_error(self, error: Exception) -> None:
+        if isinstance(error, TimeoutError):
+            self.metrics.inc("update_title_bar", "timeouts")
+        self.ticks.backoff("wifi")
 
-        self.title_bar_date.value = " " + date
-        self.title_bar_time.value = time
 
-        quality = self._get_wifi_quality()
+    def _show_wifi_quality(self, quality: int) -> None:
         if quality >= 0:
-            self.title_bar_signal.value = f"WiFi: {quality}%" + " "
+            self.ticks.reset_backoff("wifi")
+            self._show(self.title_bar_signal, "value", f"WiFi: {quality}%" + " ")
         else:
-            self.title_bar_signal.value = ""
+            # no wireless interface (yet), look less often
+            self.ticks.backoff("wifi")
+            self._show(self.title_bar_signal, "value", "")
 
 
     def _get_wifi_quality(self) -> int:
-        try:
-            cmd = ["iwconfig", "wlan0"]
-            process = subprocess.run(cmd, capture_output=True, text=True)
-            output = process.stdout
-        except Exception as e:
-            logging.error(f"Failed to execute {cmd} : {e}")
-            return -1
-
-        # Link Quality=50/70  Signal level=-60 dBm
-        search_string = "Link Quality="
-        for line in output.splitlines():
-            pos = line.find(search_string)
-            if pos >= 0:
-                start = pos + len(search_string)
-                end = line.find(" ", start)
-                if end >= 0:
-                    value = line[start:end]
-                    value_list = value.split('/')
-                    if len(value_list) >= 2:
-                        sig_qual = int(value_list[0])
-                        max_qual = int(value_list[1])
-                        quality = int(round((sig_qual * 100) / max_qual, 0))
-                        return quality
-
-        return -1
-
-
-    def _update_status(self) -> None:
-        text = self._get_song_info()
-        parts = text.split(':')
-        if len(parts) > 1:
-            line2 = parts[1]
+        # runs on the wifi worker thread
+        return self.wifi.quality()
+
+
+    def _runtime_counts(self) -> dict:
+        counts = super()._runtime_counts()
+        counts.update(
+            widgets=_count_widgets(self.app),
+            buttons_box_children=len(self.buttons_box.children),
+            preset_buttons=len(self.preset_buttons),
+            page_buttons=len(self.page_buttons),
+            # after and repeat timers pending in Tk
+            timers=len(self.app.tk.tk.splitlist(self.app.tk.tk.call("after", "info"))),
+            view_pending=len(self.view.pending),
+            view_rendered=len(self.view.rendered)
+            )
+        return counts
+
+
+    def _enable_display_job(self, name: str, delay: int|None = None) -> None:
+        if self.idle:
+            # enabled with the other paused jobs when the screen is shown again
+            if name not in self.paused_jobs:
+                self.paused_jobs.append(name)
+            return
+        self.ticks.enable(name, delay)
+
+
+    def _on_touch(self, event: tkinter.Event) -> None:
+        self.last_touch = time.monotonic()
+
+
+    def _on_power_save_timer(self) -> None:
+        idle_time = time.monotonic() - self.last_touch
+        if idle_time >= self.config.PowerSave.IDLE_TIME:
+            self._enter_idle()
         else:
-            line2 = text
-        self.status_text2.value = line2.strip()
-
-
-    def _get_song_info(self) -> str:
-            output = self._execute_mpc(["current"])
-            logging.info(f"mpc returned: '{output}'")
-            return output
-
-
-    def _execute_mpc(self, args: list[str]) -> str:
-        try:
-            mpc = self.config.General.MPC_PATH
-            cmd = [mpc] + args
-            logging.info(f"executing: {cmd}")
-            process = subprocess.run(cmd, capture_output=True, text=True)
-            return process.stdout
-        except Exception as e:
-            logging.error(f"Failed to execute {cmd} : {e}")
-            return str()
-
-
-    def _get_saved_state_file(self) -> pathlib.Path:
-        filepath = pathlib.Path(self.config.General.SAVED_STATE_FILE)
-        filepath = filepath.expanduser()
-        return filepath
-
-
-    def _load_last_played(self) -> Preset|None:
-        filepath = self._get_saved_state_file()
-        try:
-            with open(filepath, "r") as infile:
-                data = json.load(infile)
-        except Exception as e:
-            logging.info(f"State file doesn't exist yet. {e}")
-            return None
-
-        if Key.PRESET_NUMBER in data:
-            number = data[Key.PRESET_NUMBER]
-            if number < len(self.presets):
-                preset = self.presets[number]
-                return preset
-
-        return None
-
-
-    def _save_last_played(self, preset: Preset) -> None:
-        data = {
-            Key.PRESET_NUMBER : preset.number,
-            "station_name" : preset.name
-        }
-        filepath = self._get_saved_state_file()
-        ensure_dir_exists(filepath)
-        try:
-            with open(filepath, "w") as outfile:
-                json.dump(data, outfile)
-        except Exception as e:
-            logging.error(f"Couldn't save state. {e}")
+            self.ticks.enable("power_save", int((self.config.PowerSave.IDLE_TIME - idle_time) * 1000))
+
+
+    def _enter_idle(self) -> None:
+        """ Blank the screen and pause the UI refresh, the station keeps playing. """
+        logging.info("No touch input for %s s, blanking the screen", self.config.PowerSave.IDLE_TIME)
+        self.idle = True
+        self.paused_jobs = [name for name in ("clock", "wifi", "status") if self.ticks.jobs[name].enabled]
+        for name in self.paused_jobs + ["power_save"]:
+            self.ticks.disable(name)
+        self.view.suspend()
+
+        # covers the buttons, so the touch that wakes the screen doesn't play a station
+        if self.idle_overlay is None:
+            self.idle_overlay = tkinter.Frame(self.app.tk, bg="black", cursor="none")
+            self.idle_overlay.bind("<ButtonRelease>", self._leave_idle)
+        self.idle_overlay.place(x=0, y=0, relwidth=1, relheight=1)
+        self.idle_overlay.lift()
+
+        if self.backlight is not None:
+            self.executor.submit(
+                    "io",
+                    self.backlight.dim,
+                    args=[self.config.PowerSave.IDLE_BRIGHTNESS],
+                    timeout=self.config.Background.FILE_TIMEOUT
+                    )
+
+
+    def _leave_idle(self, event: tkinter.Event) -> None:
+        # the first touch ends here, it doesn't reach the widgets below
+        logging.info("Touch input, showing the screen")
+        self.idle = False
+        self.last_touch = time.monotonic()
+        if self.backlight is not None:
+            self.executor.submit(
+                    "io",
+                    self.backlight.restore,
+                    timeout=self.config.Background.FILE_TIMEOUT
+                    )
+
+        # everything changed meanwhile is shown in one batch
+        self._update_clock()
+        self._update_title_bar()
+        if "status" in self.paused_jobs:
+            self._update_status()
+        self.view.resume()
+        self.idle_overlay.place_forget()
+
+        for name in self.paused_jobs:
+            self.ticks.enable(name)
+        self.ticks.enable("clock", self._get_clock_delay())
+        self.ticks.enable("power_save")
+        self.paused_jobs = []
 
 
     def _restore_last_played(self) -> None:
+        super()._restore_last_played()
         if self.current_preset is not None:
-            self._play(self.current_preset)
-            self._update_btn_color(self.current_preset)
-            self._update_page_btn_color(self._get_current_page_index())
-        else:
-            self.status_text1.value = "No preset active."
+            self._update_page_btn_color(self._get_saved_page_index())
 
 
-    def run(self) -> None:
-        logging.info(f"--- restoring last played station ---")
-        self._restore_last_played()
+    def _set_job_intervals(self) -> None:
+        super()._set_job_intervals()
+        self.ticks.set_interval("wifi", self.config.Title.UPDATE_INTERVAL)
+        self.ticks.set_interval("power_save", self.config.PowerSave.IDLE_TIME * 1000)
 
+
+    def run(self) -> None:
+        self._update_clock()
+        self.ticks.enable("clock", self._get_clock_delay())
         self._update_title_bar()
-        self.app.repeat(self.config.Title.UPDATE_INTERVAL, self._on_title_timer)
+        self.ticks.enable("wifi")
+        if self.config.PowerSave.ENABLED:
+            # any touch, on whichever widget, counts as activity
+            self.app.tk.bind_all("<ButtonPress>", self._on_touch, add="+")
+            self.ticks.enable("power_save")
 
-        logging.info(f"App window before display(): width={self.app.width}, height={self.app.height}")
+        logging.info("App window before display(): width=%s, height=%s", self.app.width, self.app.height)
+        super().run()
 
-        self.app.display()
 
 
 
 
 
+def _count_widgets(widget: Any) -> int:
+    # widgets below the given one, including hidden ones
+    return sum(1 + _count_widgets(child) for child in getattr(widget, "children", ()))
+
 
 def main(fullscreen: bool):
-    logfile = pathlib.Path(MiraConfig.General.LOGFILE)
-    logfile = logfile.expanduser()
-    ensure_dir_exists(logfile)
-
-    logging.basicConfig(
-        filename=str(logfile),
-        encoding='utf-8',
-        level=logging.WARNING,
-        format='%(asctime)s - %(levelname)s - %(message)s'
-        )
-    if MiraConfig.General.LOGLEVEL_DEBUG:
-        logging.getLogger().setLevel(logging.DEBUG)
-
-    logging.info(f"--- initializing ---")
-    logging.info(f"--- guizero version {guizero.__version__} ---")
-    app = MiraAppplication(MiraConfig, MiraStations, fullscreen)
-    logging.info(f"--- app startup ---")
-    app.run()
+    def create_app(phases: PhaseTimer) -> MiraAppplication:
+        logging.info("--- guizero version %s ---", guizero.__version__)
+        return MiraAppplication(MiraConfig, MiraStations, fullscreen, phases)
+    run_app(create_app)
 
 
 if __name__ == "__main__":
@@ -7,22 +7,212 @@ class MiraConfig:
 
     class General:
         MPC_PATH = "/usr/bin/mpc"
+
+        # MPD backend: "native" keeps one persistent connection to MPD,
+        # "mpc" forks MPC_PATH for every command (fallback)
+        MPD_BACKEND = "native"
+        # host name, IP address or path of a unix socket
+        MPD_HOST = "localhost"
+        MPD_PORT = 6600
+        MPD_PASSWORD = None
+        # seconds
+        MPD_TIMEOUT = 5.0
+        # switch stations without clearing the queue first (no gap in playback)
+        GAPLESS_SWITCH = False
+        # seconds to wait for audio after a station switch when measuring time to audio
+        TIME_TO_AUDIO_TIMEOUT = 15.0
+
         SAVED_STATE_FILE = "~/.mira/mira_state.json"
+        # seconds state changes are collected before the state file is written
+        STATE_WRITE_DELAY = 2.0
+        # number of recently played presets kept in the state file
+        STATE_HISTORY_SIZE = 10
         LOGFILE = "~/.mira/mira.log"
         LOGLEVEL_DEBUG = False
+        # log file rotation by size (bytes) and age (seconds), rotated files are gzipped
+        LOG_MAX_BYTES = 512 * 1024
+        LOG_MAX_AGE = 7 * 24 * 3600
+        LOG_BACKUP_COUNT = 3
+        # seconds between flushes of the log file, errors are flushed immediately
+        LOG_FLUSH_INTERVAL = 10
+        # number of recent records (INFO and up) kept in RAM and dumped on errors, 0 to disable
+        LOG_RING_SIZE = 0
+        LOG_RING_FILE = "~/.mira/mira-ring.log"
+        # seconds after an error dump in which further errors don't dump, the next dump only has the newer records
+        LOG_RING_DUMP_INTERVAL = 60
+        # startup phase timings (imports, config, widgets, first audio), one JSON line per start
+        STARTUP_TIMINGS_FILE = "~/.mira/startup_timings.jsonl"
+
+        # stations (JSON or TOML) used instead of MiraStations, and overrides of
+        # these settings; both are reloaded on change (see hot_reload.py), None to disable
+        STATIONS_FILE = None
+        CONFIG_FILE = None
+        # seconds between checks of these files if inotify isn't available
+        RELOAD_POLL_INTERVAL = 5.0
+
+        # SQLite station catalog (see catalog.py), None to use MiraStations
+        CATALOG_FILE = None
+        # number of Preset objects kept in memory
+        PRESET_CACHE_SIZE = 256
+
+    class Rooms:
+        """ multi-room: one MPD per room, played alone or in groups (native backend) """
+        # empty: play on the MPD of the General section only
+        # e.g. dict(name="Kitchen", host="kitchen.local", port=6600, password=None, timeout=3.0)
+        ENDPOINTS = []
+        # group name -> room names, the first group is active at start;
+        # empty: all rooms together, then each room on its own.
+        # Tapping the status pane switches to the next group.
+        GROUPS = {}
+        # seconds to wait for the rooms of a group, slower rooms are reported as failed
+        TIMEOUT = 4.0
+
+    class Background:
+        """ timeouts in seconds for operations running on worker threads """
+        MPD_TIMEOUT = 8.0
+        WIFI_TIMEOUT = 3.0
+        FILE_TIMEOUT = 5.0
+        # milliseconds between checks for results while operations run, up to
+        # Scheduler.MAX_BACKOFF times longer while nothing happens
+        POLL_INTERVAL = 25
+
+    class Scheduler:
+        """ periodic jobs (status, watchdog, title bar), all run from one timer """
+        # part of its interval a job may run early to share a wakeup with another job
+        WINDOW = 0.25
+        # jobs that fail back off up to this multiple of their interval
+        MAX_BACKOFF = 8
+
+    class Resolver:
+        """ resolving playlist URLs and redirects to direct stream URLs """
+        ENABLED = True
+        CACHE_FILE = "~/.mira/stream_cache.json"
+        # seconds a resolved stream URL is used without resolving again
+        TTL = 24 * 3600
+        # seconds after which an entry is refreshed in the background
+        REFRESH_AFTER = 12 * 3600
+        # seconds a DNS lookup of the resolver is reused
+        DNS_TTL = 3600
+        # seconds per HTTP request
+        TIMEOUT = 3.0
+        # maximum number of nested playlists
+        MAX_DEPTH = 3
+        # seconds until a URL that failed to resolve is tried again, it is played as is meanwhile
+        RETRY_AFTER = 300
+
+    class TimeShift:
+        """ pausing and rewinding live radio, see timeshift.py """
+        ENABLED = False
+        # the station is recorded into this file, it keeps the last BUFFER_SIZE bytes
+        BUFFER_FILE = "~/.mira/timeshift.buf"
+        # 64 MiB are about 70 minutes at 128 kbit/s
+        BUFFER_SIZE = 64 * 1024 * 1024
+        # relay MPD plays the recording from, must be reachable by MPD (of all rooms)
+        HOST = "127.0.0.1"
+        PORT = 8081
+        # seconds to wait for the station
+        TIMEOUT = 5.0
+        # seconds per rewind step
+        REWIND_STEP = 30
+
+    class Recovery:
+        """ restarting stalled streams """
+        ENABLED = True
+        # MPD status check in milliseconds while a station plays, at most STALL_TIME / 2,
+        # with Status.USE_IDLE every 'player' event checks at once as well
+        CHECK_INTERVAL = 2000
+        # seconds without progress until a stream counts as stalled
+        STALL_TIME = 4.0
+        # seconds between restarts, doubled after every failed one
+        MIN_BACKOFF = 2.0
+        MAX_BACKOFF = 60.0
+
+    class Health:
+        """ background checks of the station URLs """
+        ENABLED = False
+        # seconds between two checks of all stations
+        INTERVAL = 15 * 60
+        # number of URLs checked at the same time
+        PARALLEL = 4
+        # seconds to wait for a stream to deliver data
+        TIMEOUT = 5.0
+        # larger catalogs: only the stations of the current page are checked
+        MAX_STATIONS = 200
+        # text color of stations that cannot be played
+        DEAD_TEXT_COLOR = "gray60"
+
+    class Metrics:
+        """ latency instrumentation of the hot paths """
+        ENABLED = False
+        # Prometheus text file written every EXPORT_INTERVAL seconds, None to disable
+        TEXTFILE = "~/.mira/mira.prom"
+        EXPORT_INTERVAL = 30
+        # serve http://127.0.0.1:<port>/metrics, None to disable
+        HTTP_PORT = None
+
+    class Headless:
+        """ headless mode without display, see headless.py """
+        # UNIX socket for line commands, e.g. 'echo next | nc -U ~/.mira/control.sock', None to disable
+        CONTROL_SOCKET = "~/.mira/control.sock"
+        # read line commands from stdin, e.g. typed on a keyboard
+        READ_STDIN = True
+
+    class Remote:
+        """ HTTP/JSON remote control, see remote.py """
+        ENABLED = False
+        # "127.0.0.1": this device only, "0.0.0.0": the whole LAN
+        HOST = "127.0.0.1"
+        PORT = 8080
+        # required as 'Authorization: Bearer <token>' or ?token=<token>, None: no token
+        TOKEN = None
+        # clients connected at the same time, further clients are turned away
+        MAX_CLIENTS = 64
+        # seconds a long-poll request (GET /api/state?after=<version>) waits for a change
+        LONG_POLL_TIMEOUT = 30
+
+    class Profiling:
+        """ profiling the running app, toggled with 'kill -USR2 <pid>' """
+        # pstats files and memory reports are written here
+        DIR = "~/.mira"
+        # allocation sites listed in the memory report
+        TOP_ALLOCATIONS = 25
+        # stack frames recorded per allocation, more frames cost more memory
+        TRACEMALLOC_FRAMES = 1
 
     class Display:
         """ display properties """
         WIDTH = 800
         # bugfix, otherwise page selector buttons cannot be clicked
         HEIGHT = 480 + 1
+        # widget changes are collected and applied once per frame (milliseconds)
+        FRAME_INTERVAL = 16
+
+    class PowerSave:
+        """ blanking the screen while nobody touches it, playback goes on """
+        ENABLED = False
+        # seconds without touch input until the screen is blanked
+        IDLE_TIME = 300
+        # brightness file of the display, None to only cover the window in black
+        #BACKLIGHT_FILE = "/sys/class/backlight/10-0045/brightness"
+        BACKLIGHT_FILE = None
+        # brightness while idle, 0 switches the backlight off
+        IDLE_BRIGHTNESS = 0
 
     class Title:
         HEIGHT = 30
         USE_24h_TIME_FORMAT = True
         BACKGROUND_COLOR = "green yellow"
+        # Wi-Fi quality update in milliseconds, the clock is updated on every full minute
         UPDATE_INTERVAL = 5000
 
+        # wireless interface shown in the title bar, None for the first one found
+        WIFI_INTERFACE = "wlan0"
+        WIFI_STATS_FILE = "/proc/net/wireless"
+        # link quality reported for a perfect signal (70 for most drivers)
+        WIFI_MAX_QUALITY = 70
+        # number of readings averaged to avoid flicker
+        WIFI_SMOOTHING_WINDOW = 3
+
     class Status:
         """ status pane """
         HEIGHT = 100
@@ -38,6 +228,10 @@ class MiraConfig:
         # Specify text color in a similar way.
         TEXT_COLOR = "black"
 
+        # Push status updates via MPD 'idle' events (native backend only),
+        # otherwise poll with the intervals below
+        USE_IDLE = True
+
         # Status update in milliseconds
         INITAL_UPDATE_INTERVAL = 4000
         UPDATE_INTERVAL = 2000
@@ -66,7 +260,25 @@ class MiraConfig:
         
         PRESSED_BUTTON_COLOR = "#6db36d"
 
-        
+        # "cache": each page is built once and kept as a hidden container,
+        # "rebind": a single grid of buttons is relabelled on every page switch
+        PAGE_MODE = "cache"
+        # maximum number of pages kept built in "cache" mode
+        PAGE_CACHE_SIZE = 4
+
+
+    class Logos:
+        """ station logos on the preset buttons, see Key.LOGO """
+        ENABLED = True
+        # thumbnails scaled to the button size (creating them needs Pillow)
+        CACHE_DIR = "~/.mira/logos"
+        # maximum logo height in pixels, the station name is shown below
+        HEIGHT = 36
+        # bytes of decoded logos kept in memory
+        MEMORY_BUDGET = 4 * 1024 * 1024
+        # seconds to download a logo
+        TIMEOUT = 5.0
+
 
     class PageSelector:
         """ buttons for selecting the radio button pages"""
@@ -0,0 +1,885 @@
+"""
+MIRa - Minimalist Internet Radio - core of the app
+
+Playback, presets, state and timers, independent of the user interface.
+The touchscreen view (mira.py) and the headless mode (headless.py) derive
+from MiraCore and show what happens by overriding its _show_* and
+_on_*_changed methods. Nothing here imports guizero or tkinter.
+"""
+
+from typing import Any, Callable
+
+import gc
+import logging
+import math
+import pathlib
+import time
+import signal
+import sys
+import threading
+
+from startup import PhaseTimer
+from mira_config import MiraConfig
+from mira_stations import MiraStations
+from constants import Key
+
+from helpers import Preset
+from mpd_client import MpdClient, MpdError, MpdIdleWatcher, SwitchResult, create_player, wait_for_audio
+from multiroom import PlayerGroup
+from workers import BackgroundExecutor
+from catalog import MemoryCatalog, PresetList, create_catalog
+from metrics import Metrics
+from recovery import StallWatchdog, RESTART, RECOVERED
+from hot_reload import ConfigOverrides, FileWatcher, ReloadError, changed_stations, load_stations
+from logging_setup import LogPipeline
+from profiling import RuntimeProfiler
+from scheduler import TickScheduler
+from state import Snapshot, StateStore
+
+
+
+class MiraCore:
+    """ Playback, presets, state and timers of the app
+
+        Derived classes create self.app, an event loop offering after(),
+        cancel() and display() like guizero.App, and pass it to attach().
+        Periodic work runs as jobs of self.ticks (see scheduler.py). """
+
+
+    def __init__(self, config: MiraConfig, stations: MiraStations, phases: PhaseTimer|None = None) -> None:
+
+        self.config = config
+        self.phases = phases or PhaseTimer(None)
+        self.app = None
+
+        # config overrides from General.CONFIG_FILE, applied before anything reads the config
+        self.config_overrides = ConfigOverrides(config)
+        self.file_watcher = None
+        if config.General.CONFIG_FILE:
+            try:
+                self.config_overrides.apply(self.config_overrides.load(self._get_data_file(config.General.CONFIG_FILE)))
+            except ReloadError as e:
+                logging.error("Config file rejected, using the defaults. %s", e)
+
+        # latency histograms and counters of the hot paths
+        self.metrics = Metrics(config)
+
+        # connection to MPD (native client or mpc fallback), or to the MPDs of several rooms
+        self.player = create_player(config)
+
+        # playlist and redirect resolution of station URLs, None if disabled
+        self.resolver = None
+        if config.Resolver.ENABLED:
+            # imported on demand, pulls in urllib and ssl
+            from resolver import StreamResolver
+            self.resolver = StreamResolver(config)
+
+        # recording of the current station that MPD plays from, None if disabled
+        self.timeshift = None
+        self.paused = False
+        if config.TimeShift.ENABLED:
+            # imported on demand, pulls in http.server and mmap
+            from timeshift import TimeShiftRelay
+            try:
+                self.timeshift = TimeShiftRelay(config)
+                self.timeshift.start()
+            except OSError as e:
+                logging.error("Time-shift disabled, the relay cannot be started: %s", e)
+                self.timeshift = None
+
+        # checks of the station URLs in the background, None if disabled
+        self.health = None
+        if config.Health.ENABLED:
+            # imported on demand, pulls in http.client and ssl
+            from health import HealthProber
+            self.health = HealthProber(config, on_update=self._on_health_update)
+
+        # restarts the station when playback stalls, None if disabled
+        self.watchdog = None
+        self.watchdog_task = None
+        if config.Recovery.ENABLED:
+            self.watchdog = StallWatchdog(
+                                config.Recovery.STALL_TIME,
+                                config.Recovery.MIN_BACKOFF,
+                                config.Recovery.MAX_BACKOFF
+                                )
+
+        # now playing updates pushed by MPD idle events, None if polling
+        self.idle_watcher = None
+
+        # station switches so far, a switch is outdated once a newer one started
+        self.switch_count = 0
+
+        # pending background operations (see BackgroundExecutor)
+        self.play_task = None
+        self.status_task = None
+
+        # presets are constructed on demand from the station catalog
+        catalog = create_catalog(config, stations)
+        if config.General.STATIONS_FILE and isinstance(catalog, MemoryCatalog):
+            try:
+                catalog = MemoryCatalog(load_stations(self._get_data_file(config.General.STATIONS_FILE)))
+            except ReloadError as e:
+                logging.error("Stations file rejected, using the predefined stations. %s", e)
+
+        # if no stations are defined, add a default station
+        if len(catalog) == 0:
+            dummy_st = dict(
+                name = "Radio 1",
+                url = "https://radio1.de"
+                )
+            catalog = MemoryCatalog([dummy_st])
+        self.presets = PresetList(catalog, config)
+        self.page_idx = 0
+
+        # app state as seen by remote control clients, kept current on the GUI thread
+        self.snapshot = Snapshot()
+        self.snapshot.catalog = catalog
+        self.remote = None
+        if config.Remote.ENABLED:
+            commands = dict(
+                play=lambda number: self.executor.post(self._on_remote_play, [number]),
+                page=lambda page_idx: self.executor.post(self._on_remote_page, [page_idx]),
+                volume=lambda volume: self.executor.post(self._set_volume, [volume])
+                )
+            if self.timeshift is not None:
+                commands.update(
+                    pause=lambda paused: self.executor.post(self._set_paused, [bool(paused)]),
+                    delay=lambda seconds: self.executor.post(self._shift, [seconds])
+                    )
+            # imported on demand, pulls in asyncio
+            from remote import RemoteServer
+            self.remote = RemoteServer(config, self.snapshot, commands)
+
+        # last played station, page and history, written to disk in the background
+        self.state = StateStore(config.General.SAVED_STATE_FILE, config.General.STATE_WRITE_DELAY)
+        self.state.load()
+
+        # rooms played together when several rooms are configured
+        if isinstance(self.player, PlayerGroup) and self.state.get(Key.ROOM_GROUP) in self.player.groups:
+            self.player.group = self.state.get(Key.ROOM_GROUP)
+        if isinstance(self.player, PlayerGroup):
+            self.snapshot.update(rooms=self.player.group)
+
+        # restore last station or None
+        self.current_preset = self._load_last_played()
+        self.phases.mark("config")
+
+        # blocking operations run on worker threads, their results are handed over
+        # by the "callbacks" job once the event loop runs
+        self.executor = BackgroundExecutor(on_submit=lambda: self.ticks.reset_backoff("callbacks"))
+
+        # periodic work, run from one timer of the event loop once it exists
+        self.ticks = TickScheduler(config, self.metrics)
+        # results of background operations and callbacks of other threads, see _on_callbacks_timer()
+        self.ticks.add("callbacks", config.Background.POLL_INTERVAL, self._on_callbacks_timer, priority=3)
+        # status polling while no idle watcher pushes updates, see _show_station()
+        self.ticks.add("status", config.Status.UPDATE_INTERVAL, self._update_status, priority=1, enabled=False)
+        # stall checks while a station is expected to play, see _on_audio_started()
+        self.ticks.add("watchdog", self._get_watchdog_interval(), self._on_watchdog_timer, priority=2, enabled=False)
+
+        # cProfile and tracemalloc on demand, see run_app()
+        self.profiler = RuntimeProfiler(config, self._runtime_counts)
+
+        # start the last played station first, the view is built meanwhile
+        if self.current_preset is not None:
+            self._start_station_switch(self.current_preset)
+            self.phases.mark("station switch sent")
+
+
+    def attach(self, app: Any) -> None:
+        """ Deliver callbacks through the event loop of the view from now on. """
+        self.app = app
+        self.ticks.attach(app.after, app.cancel)
+
+
+
+    # Shown by the view:
+    def _show_page(self, page_idx: int) -> None:
+        self._enter_page(page_idx)
+
+    def _show_pressed(self, preset: Preset) -> None:
+        pass
+
+    def _show_station_name(self, text: str) -> None:
+        pass
+
+    def _show_status_line(self, text: str) -> None:
+        # second line of the status pane: song, errors and notices
+        self.snapshot.update(status=text)
+
+    def _show_station_health(self) -> None:
+        pass
+
+    def _on_config_changed(self) -> None:
+        pass
+
+    def _on_stations_changed(self, changed: list[int], num_pages: int) -> None:
+        pass
+
+    def _enable_display_job(self, name: str, delay: int|None = None) -> None:
+        # a job that only refreshes what is shown, the GUI holds it back while the screen is blanked
+        self.ticks.enable(name, delay)
+
+
+
+    # Functions:
+    def _enter_page(self, page_idx: int) -> list[Preset]:
+        """ Make the page the current one. Returns its presets. """
+        self.page_idx = page_idx
+        first = self._get_first_preset_idx_of_page(page_idx)
+        presets = self.presets.get_range(first, self._get_num_presets_of_page(page_idx))
+        self.snapshot.update(page=page_idx, pages=self._get_num_pages(), presets=len(self.presets))
+
+        if self.health is not None and len(self.presets) > self.config.Health.MAX_STATIONS:
+            self._watch_stations(presets)
+
+        # have direct stream URLs ready before a button is tapped
+        if self.resolver is not None:
+            self.resolver.refresh_in_background([ps.url for ps in presets])
+        return presets
+
+
+    def _get_current_page_index(self) -> int:
+        if self.current_preset is not None:
+            return math.floor(self.current_preset.number / self.config.Buttons.NUM_BUTTONS_PER_PAGE)
+        return 0
+
+    def _get_saved_page_index(self) -> int:
+        page_idx = self.state.get(Key.PAGE)
+        if isinstance(page_idx, int) and 0 <= page_idx < self._get_num_pages():
+            return page_idx
+        return self._get_current_page_index()
+
+    def _get_first_preset_idx_of_page(self, page_idx: int) -> int:
+        return page_idx * self.config.Buttons.NUM_BUTTONS_PER_PAGE
+
+    def _get_num_presets_of_page(self, page_idx: int) -> int:
+        cnt = len(self.presets) - self._get_first_preset_idx_of_page(page_idx)
+        if cnt > self.config.Buttons.NUM_BUTTONS_PER_PAGE:
+            cnt = self.config.Buttons.NUM_BUTTONS_PER_PAGE
+        return cnt
+
+    def _get_num_pages(self) -> int:
+        return math.ceil(len(self.presets) / self.config.Buttons.NUM_BUTTONS_PER_PAGE)
+
+
+
+    def _on_page_selected(self, page_idx: int) -> None:
+        logging.info("Page '%s' was selected.", page_idx)
+
+        self._show_page(page_idx)
+        self.state.update({Key.PAGE: page_idx})
+
+
+    def _on_button_pressed(self, preset: Preset) -> None:
+        logging.info("Button '%s' was pressed. URL: '%s'", preset.name, preset.url)
+        self.current_preset = preset
+
+        self._play(preset)
+
+        # change color of pressed button
+        self._show_pressed(preset)
+
+        # save state
+        self._save_last_played(preset)
+
+
+    def _play_next(self, step: int) -> None:
+        # the preset after (step 1) or before (step -1) the current one
+        number = self.current_preset.number + step if self.current_preset is not None else 0
+        self._on_button_pressed(self.presets[number % len(self.presets)])
+
+
+    def _select_next_group(self) -> None:
+        # switch to the next group of rooms
+        # the state has the group already selected while the switch is pending
+        groups = list(self.player.groups)
+        current = self.state.get(Key.ROOM_GROUP, self.player.group)
+        group = groups[(groups.index(current) + 1) % len(groups)] if current in groups else groups[0]
+        logging.info("Room group '%s' was selected.", group)
+
+        self._show_status_line("Rooms: " + ", ".join(self.player.groups[group]))
+        self.state.update({Key.ROOM_GROUP: group})
+        self.snapshot.update(rooms=group)
+        self._disarm_watchdog()
+
+        # runs before the station switch on the same lane
+        self.executor.submit(
+                "mpd",
+                self._execute_mpc,
+                args=["select_group", group],
+                timeout=self.config.Background.MPD_TIMEOUT
+                )
+        if self.current_preset is not None:
+            self._start_station_switch(self.current_preset)
+
+
+    def _on_remote_play(self, number: int) -> None:
+        # the catalog may have changed since the server checked the number
+        if 0 <= number < len(self.presets):
+            self._on_button_pressed(self.presets[number])
+
+
+    def _on_remote_page(self, page_idx: int) -> None:
+        if 0 <= page_idx < self._get_num_pages():
+            self._on_page_selected(page_idx)
+
+
+    def _set_volume(self, volume: int|None) -> None:
+        # None reads the volume only
+        self.executor.submit(
+                "mpd",
+                self._execute_mpc,
+                args=["volume", volume],
+                on_done=self._on_volume,
+                timeout=self.config.Background.MPD_TIMEOUT
+                )
+
+
+    def _on_volume(self, volume: int|None) -> None:
+        if volume is not None and volume >= 0:
+            self.snapshot.update(volume=volume)
+
+
+    def _play(self, preset: Preset) -> None:
+        with self.metrics.time("play"):
+            self._disarm_watchdog()
+            self._start_station_switch(preset)
+            self._show_station(preset)
+
+
+    def _start_station_switch(self, preset: Preset, relay_url: str|None = None) -> None:
+        # a newer station switch supersedes pending ones and their status
+        for task in (self.play_task, self.status_task):
+            if task is not None:
+                task.cancel()
+        self.switch_count += 1
+        if self.paused:
+            self.paused = False
+            self.snapshot.update(paused=False)
+        if self.timeshift is not None and relay_url is None:
+            # a new recording starts
+            self.snapshot.update(delay=0)
+        self.play_task = self.executor.submit(
+                                "mpd",
+                                self._switch_station,
+                                args=[relay_url or self._get_station_url(preset), relay_url is not None],
+                                on_done=self._on_station_switched,
+                                on_error=self._on_mpd_error,
+                                timeout=self.config.Background.MPD_TIMEOUT
+                                )
+
+
+    def _get_station_url(self, preset: Preset) -> str:
+        # the fastest healthy one of the station's URLs
+        if self.health is not None:
+            return self.health.best_url(preset)
+        return preset.url
+
+
+    def _show_station(self, preset: Preset) -> None:
+        # update status line
+        self._show_station_name(preset.name)
+        self._show_status_line("")
+        self.snapshot.update(station=dict(number=preset.number, name=preset.name))
+
+        # restart status polling (the idle watcher pushes updates by itself)
+        if self.idle_watcher is None:
+            self._enable_display_job("status", self.config.Status.INITAL_UPDATE_INTERVAL)
+
+
+    def _switch_station(self, url: str, recorded: bool = False) -> SwitchResult|None:
+        # runs on the mpd worker thread
+        # recorded: url is a relay URL of the time-shift recording, played as is
+        if recorded:
+            result = self._execute_mpc("switch_station", url, self.config.General.GAPLESS_SWITCH)
+            logging.info("%s", result)
+            return result
+
+        stream_url = url
+        if self.resolver is not None:
+            stream_url = self.resolver.resolve(url)
+
+        # clear playlist, add url and play as one batch
+        result = self._execute_mpc("switch_station", self._get_play_url(stream_url), self.config.General.GAPLESS_SWITCH)
+        logging.info("%s", result)
+
+        # a cached stream URL may be outdated, resolve again and retry once
+        if (result is None or not result.ok) and stream_url != url:
+            self.resolver.invalidate(url)
+            stream_url = self.resolver.resolve(url)
+            result = self._execute_mpc("switch_station", self._get_play_url(stream_url), self.config.General.GAPLESS_SWITCH)
+            logging.info("%s", result)
+        return result
+
+
+    def _get_play_url(self, stream_url: str) -> str:
+        # with time-shift MPD plays the recording of the stream
+        if self.timeshift is not None:
+            return self.timeshift.tune(stream_url)
+        return stream_url
+
+
+    def _on_station_switched(self, result: SwitchResult|None) -> None:
+        if result is None or not result.ok:
+            self._show_status_line("Station could not be started")
+            self._save_startup_timings()
+            return
+
+        # measure on a lane of its own, so it doesn't hold up further MPD commands
+        switch_number = self.switch_count
+        self.executor.submit(
+                "audio",
+                wait_for_audio,
+                args=[
+                    self.player,
+                    result,
+                    self.config.General.TIME_TO_AUDIO_TIMEOUT,
+                    0.05,
+                    lambda: switch_number == self.switch_count
+                    ],
+                on_done=lambda time_to_audio: self._on_audio_started(result, switch_number == self.switch_count)
+                )
+
+
+    def _on_audio_started(self, result: SwitchResult, is_current: bool) -> None:
+        if result.time_to_audio is not None:
+            logging.info("Time to audio: %.3fs", result.time_to_audio)
+            self.metrics.observe("time_to_audio", result.time_to_audio)
+            self.phases.mark("first audio", result.started + result.time_to_audio)
+        self._save_startup_timings()
+
+        # from now on the station is expected to play, also if no audio came yet
+        if is_current and not self.paused:
+            self._arm_watchdog()
+
+
+    def _save_startup_timings(self) -> None:
+        if not self.phases.saved:
+            self.executor.submit(
+                    "io",
+                    self.phases.save,
+                    timeout=self.config.Background.FILE_TIMEOUT
+                    )
+
+
+    def _on_mpd_error(self, error: Exception) -> None:
+        if isinstance(error, TimeoutError):
+            self.metrics.inc("execute_mpc", "timeouts")
+            self._show_status_line("MPD is not responding")
+
+
+    def _arm_watchdog(self) -> None:
+        if self.watchdog is not None:
+            self.watchdog.arm(time.monotonic())
+            if not self.ticks.jobs["watchdog"].enabled:
+                self.ticks.enable("watchdog")
+
+
+    def _disarm_watchdog(self) -> None:
+        if self.watchdog is not None:
+            self.watchdog.disarm()
+            self.ticks.disable("watchdog")
+            if self.watchdog_task is not None:
+                self.watchdog_task.cancel()
+
+
+    def _get_watchdog_interval(self) -> int:
+        # a frozen stream sends no idle events, only polling finds it within STALL_TIME and a half
+        return min(self.config.Recovery.CHECK_INTERVAL, int(self.config.Recovery.STALL_TIME * 500))
+
+
+    def _toggle_pause(self) -> None:
+        self._set_paused(not self.paused)
+
+
+    def _set_paused(self, paused: bool) -> None:
+        """ Pause or resume the time-shifted station, the recording goes on meanwhile. """
+        if self.timeshift is None or self.current_preset is None or paused == self.paused:
+            return
+        self.paused = paused
+        self.snapshot.update(paused=paused)
+        if paused:
+            # a paused stream doesn't progress, that's no stall
+            self._disarm_watchdog()
+            self._show_status_line("Paused")
+        else:
+            logging.info("Resuming %.0fs behind live", self.timeshift.delay())
+            self._show_status_line("")
+            self._arm_watchdog()
+            self._update_status()
+        self.executor.submit(
+                "mpd",
+                self._execute_mpc,
+                args=["pause", paused],
+                on_error=self._on_mpd_error,
+                timeout=self.config.Background.MPD_TIMEOUT
+                )
+
+
+    def _shift(self, seconds: int) -> None:
+        """ Play the current station the given number of seconds behind live, 0 is live. """
+        if self.timeshift is None or self.current_preset is None:
+            return
+        logging.info("Playing %s s behind live", seconds)
+        self._disarm_watchdog()
+        self.snapshot.update(delay=seconds)
+        self._start_station_switch(self.current_preset, self.timeshift.url(self.timeshift.offset_behind_live(seconds)))
+
+
+    def _rewind(self, seconds: int) -> None:
+        """ Go back the given number of seconds from what is playing now. """
+        if self.timeshift is not None:
+            self._shift(round(self.timeshift.delay()) + seconds)
+
+
+    def _on_watchdog_timer(self) -> None:
+        # skip the check while the previous one is still running
+        if self.watchdog.armed and (self.watchdog_task is None or not self.watchdog_task.pending()):
+            self.watchdog_task = self.executor.submit(
+                                    "watchdog",
+                                    self._execute_mpc,
+                                    args=["status"],
+                                    on_done=self._on_watchdog_status,
+                                    on_error=lambda error: self._on_watchdog_status(None),
+                                    timeout=self.config.Background.MPD_TIMEOUT
+                                    )
+
+
+    def _on_watchdog_status(self, status: dict|None) -> None:
+        action = self.watchdog.update(status, time.monotonic())
+        if action == RESTART or status is not None and status.get("error"):
+            self._forget_stream_urls()
+        if action == RESTART and self.current_preset is not None:
+            logging.warning("Stream stalled (%s), restart %s", self.watchdog.reason, self.watchdog.attempts)
+            self._show_status_line(f"Reconnecting ({self.watchdog.attempts}) ...")
+            self._start_station_switch(self.current_preset)
+        elif action == RECOVERED:
+            logging.info("Stream recovered after %.1fs", self.watchdog.last_recovery)
+            self.metrics.observe("time_to_recover", self.watchdog.last_recovery)
+            self._update_status()
+
+
+    def _forget_stream_urls(self) -> None:
+        # MPD accepts an outdated cached stream URL and fails later, the next switch resolves again
+        if self.resolver is not None and self.current_preset is not None:
+            for url in (self.current_preset.url,) + self.current_preset.alt_urls:
+                self.resolver.invalidate(url)
+
+
+    def _on_callbacks_timer(self) -> None:
+        # often while operations run, less often while nothing happens
+        if self.executor.drain() or self.executor.busy():
+            self.ticks.reset_backoff("callbacks")
+        else:
+            self.ticks.backoff("callbacks")
+
+
+    def _start_idle_watcher(self) -> None:
+        if not self.config.Status.USE_IDLE or not isinstance(self.player, MpdClient):
+            logging.info("Polling status every %s ms", self.config.Status.UPDATE_INTERVAL)
+            return
+        self.idle_watcher = MpdIdleWatcher(
+                                self.config,
+                                on_change=self._on_idle_change,
+                                on_unavailable=self._on_idle_unavailable,
+                                on_player=self._on_idle_player
+                                )
+        self.idle_watcher.start()
+
+
+    def _on_idle_change(self, text: str) -> None:
+        # called from the watcher thread, hand over to the GUI thread
+        self.executor.post(self._show_song_info, [text])
+
+
+    def _on_idle_player(self) -> None:
+        # called from the watcher thread, hand over to the GUI thread
+        self.executor.post(self._on_player_event)
+
+
+    def _on_player_event(self) -> None:
+        # MPD stopping with an error is a player event, check at once instead of waiting for the next check
+        if self.watchdog is not None and self.watchdog.armed:
+            self._on_watchdog_timer()
+
+
+    def _on_idle_unavailable(self) -> None:
+        # called from the watcher thread, hand over to the GUI thread
+        self.executor.post(self._start_status_polling)
+
+
+    def _start_status_polling(self) -> None:
+        self.idle_watcher = None
+        if self.current_preset is not None and not self.ticks.jobs["status"].enabled:
+            self._enable_display_job("status")
+
+
+    def _watch_stations(self, presets: list[Preset]) -> None:
+        self.health.watch([url for ps in presets for url in (ps.url,) + ps.alt_urls])
+
+
+    def _on_health_update(self) -> None:
+        # called from the prober thread, hand over to the GUI thread
+        self.executor.post(self._show_station_health)
+
+
+    def _get_data_file(self, filename: str) -> pathlib.Path:
+        return pathlib.Path(filename).expanduser()
+
+
+    def _start_file_watcher(self) -> None:
+        paths = [self._get_data_file(filename)
+                 for filename in (self.config.General.STATIONS_FILE, self.config.General.CONFIG_FILE) if filename]
+        if not paths:
+            return
+        self.file_watcher = FileWatcher(paths, self.config.General.RELOAD_POLL_INTERVAL, self._on_file_changed)
+        self.file_watcher.start()
+
+
+    def _on_file_changed(self, path: pathlib.Path) -> None:
+        # called from the watcher thread, hand over to the GUI thread
+        self.executor.post(self._reload_file, [path])
+
+
+    def _reload_file(self, path: pathlib.Path) -> None:
+        # parsed on the io lane, applied on the GUI thread
+        if path == self._get_data_file(self.config.General.CONFIG_FILE or "").resolve():
+            load, apply = self.config_overrides.reload, self._apply_config
+        else:
+            load, apply = load_stations, self._apply_stations
+        self.executor.submit(
+                "io",
+                load,
+                args=[path],
+                on_done=apply,
+                on_error=lambda error: logging.warning("Keeping the previous settings, '%s' was rejected", path),
+                timeout=self.config.Background.FILE_TIMEOUT
+                )
+
+
+    def _apply_config(self, values: dict) -> None:
+        changed = self.config_overrides.apply(values)
+        if not changed:
+            return
+        logging.info("Config changed: %s", changed)
+
+        # presets take colors from the config
+        self.presets.replace_catalog(self.presets.catalog)
+        if self.current_preset is not None:
+            self.current_preset = self.presets[self.current_preset.number]
+        self._set_job_intervals()
+        self._on_config_changed()
+
+
+    def _set_job_intervals(self) -> None:
+        """ Take the intervals of the periodic jobs from the reloaded config. """
+        self.ticks.set_interval("status", self.config.Status.UPDATE_INTERVAL)
+        self.ticks.set_interval("watchdog", self._get_watchdog_interval())
+
+
+    def _apply_stations(self, stations: list[dict]) -> None:
+        if not isinstance(self.presets.catalog, MemoryCatalog):
+            logging.warning("Stations file ignored, the catalog file is used")
+            return
+        changed = changed_stations(self.presets.catalog.stations, stations)
+        if not changed:
+            return
+        logging.info("Stations changed: %s", changed)
+
+        num_pages = self._get_num_pages()
+        self.presets.replace_catalog(MemoryCatalog(stations), changed)
+        self.snapshot.catalog = self.presets.catalog
+        self._find_current_preset()
+        self._on_stations_changed(changed, num_pages)
+
+        if self.health is not None and len(self.presets) <= self.config.Health.MAX_STATIONS:
+            self._watch_stations(list(self.presets))
+
+
+    def _find_current_preset(self) -> None:
+        # the playing station keeps playing, it is looked up by its URL in the new list
+        if self.current_preset is None:
+            return
+        stations = self.presets.catalog.stations
+        numbers = [number for number, st in enumerate(stations) if st[Key.URL] == self.current_preset.url]
+        if not numbers:
+            # no longer a preset, its number belongs to another station now
+            logging.info("Playing station '%s' is no longer in the station list", self.current_preset.name)
+            self.current_preset = None
+            self.state.update({Key.PRESET_NUMBER: None, Key.STATION_NAME: None})
+            self.snapshot.update(station=None)
+            return
+        number = min(numbers, key=lambda n: abs(n - self.current_preset.number))
+        self.current_preset = self.presets[number]
+        self.state.update({Key.PRESET_NUMBER: number, Key.STATION_NAME: self.current_preset.name})
+        self.snapshot.update(station=dict(number=number, name=self.current_preset.name))
+
+
+    def _update_status(self) -> None:
+        with self.metrics.time("update_status"):
+            # skip the query while the previous one is still running
+            # on a lane of its own, so a slow answer (e.g. of one room) doesn't hold up station switches
+            if self.status_task is None or not self.status_task.pending():
+                self.status_task = self.executor.submit(
+                                    "status",
+                                    self._get_song_info,
+                                    on_done=self._on_song_info,
+                                    on_error=self._on_status_error,
+                                    timeout=self.config.Background.MPD_TIMEOUT
+                                    )
+
+
+    def _on_song_info(self, text: str) -> None:
+        self.ticks.reset_backoff("status")
+        self._show_song_info(text)
+
+
+    def _on_status_error(self, error: Exception) -> None:
+        # MPD doesn't answer, poll less often until it does again
+        self.ticks.backoff("status")
+        self._on_mpd_error(error)
+
+
+    def _show_song_info(self, text: str) -> None:
+        # the recovery state stays visible until the stream plays again, so does the pause
+        if self.paused or self.watchdog is not None and self.watchdog.recovering:
+            return
+        parts = text.split(':')
+        if len(parts) > 1:
+            line2 = parts[1]
+        else:
+            line2 = text
+        self._show_status_line(line2.strip())
+
+
+    def _get_song_info(self) -> str:
+            output = self._execute_mpc("current")
+            logging.info("mpc returned: '%s'", output)
+            return output or str()
+
+
+    def _execute_mpc(self, command: str, *args: Any) -> Any:
+        with self.metrics.time("execute_mpc", command):
+            try:
+                logging.info("executing: %s %s", command, args)
+                return getattr(self.player, command)(*args)
+            except MpdError as e:
+                logging.error("Failed to execute %s %s : %s", command, args, e)
+                self.metrics.inc("execute_mpc", "failures", command)
+                return None
+
+
+    def _load_last_played(self) -> Preset|None:
+        number = self.state.get(Key.PRESET_NUMBER)
+        if isinstance(number, int) and 0 <= number < len(self.presets):
+            return self.presets[number]
+        return None
+
+
+    def _save_last_played(self, preset: Preset) -> None:
+        # only kept in memory here, the state store writes it out later
+        self.state.update({
+            Key.PRESET_NUMBER : preset.number,
+            Key.STATION_NAME : preset.name,
+            Key.PAGE : self._get_current_page_index()
+            })
+        self.state.append(Key.HISTORY, preset.number, self.config.General.STATE_HISTORY_SIZE)
+
+
+    def _restore_last_played(self) -> None:
+        if self.current_preset is not None:
+            # the station switch was already sent before the view was built
+            self._show_station(self.current_preset)
+            self._show_pressed(self.current_preset)
+        else:
+            self._show_station_name("No preset active.")
+            self._save_startup_timings()
+
+
+    def run(self) -> None:
+        self.metrics.start_export()
+        self._start_idle_watcher()
+        if self.health is not None:
+            if len(self.presets) <= self.config.Health.MAX_STATIONS:
+                self._watch_stations(list(self.presets))
+            self.health.start()
+        self._start_file_watcher()
+        if self.remote is not None:
+            self.remote.start()
+            self._set_volume(None)
+
+        logging.info("--- restoring last played station ---")
+        self._restore_last_played()
+        self.ticks.start()
+
+        self.phases.mark("display")
+        try:
+            self.app.display()
+        finally:
+            self._shut_down()
+
+
+    def _runtime_counts(self) -> dict:
+        """ Numbers that grow when something leaks, reported by the profiler. """
+        return dict(
+            threads=threading.active_count(),
+            gc_objects=len(gc.get_objects()),
+            station_switches=self.switch_count,
+            tick_wakeups=self.ticks.wakeups,
+            state_history=len(self.state.get(Key.HISTORY, []))
+            )
+
+
+    def _shut_down(self) -> None:
+        if self.profiler.active:
+            self.profiler.stop()
+        self.ticks.stop()
+        logging.info("Periodic jobs: %s", self.ticks.stats())
+        if self.idle_watcher is not None:
+            self.idle_watcher.stop()
+        if self.health is not None:
+            self.health.stop()
+        if self.file_watcher is not None:
+            self.file_watcher.stop()
+        if self.remote is not None:
+            self.remote.stop()
+        if self.timeshift is not None:
+            self.timeshift.stop()
+        # pending state changes still have to hit the disk
+        self.state.flush()
+        self.executor.shutdown(drain=("io",))
+        self.metrics.stop_export()
+        self.player.close()
+
+
+
+
+
+
+def _exit_on_signal(signum: int, frame: Any) -> None:
+    logging.info("--- terminated by signal %s ---", signum)
+    sys.exit(0)
+
+
+def run_app(create_app: Callable[[PhaseTimer], MiraCore]) -> None:
+    """ Set up logging and signals, then create and run the app. """
+    phases = PhaseTimer(MiraConfig.General.STARTUP_TIMINGS_FILE)
+    phases.mark("imports")
+
+    log_pipeline = LogPipeline(MiraConfig)
+    # kill -USR1 <pid> writes the in-RAM log ring buffer to disk
+    signal.signal(signal.SIGUSR1, log_pipeline.dump_ring)
+    # leave the main loop on termination, so the state is flushed on the way out
+    signal.signal(signal.SIGTERM, _exit_on_signal)
+    signal.signal(signal.SIGHUP, _exit_on_signal)
+    try:
+        logging.info("--- initializing ---")
+        app = create_app(phases)
+        # kill -USR2 <pid> starts profiling, the next one writes the results
+        signal.signal(signal.SIGUSR2, app.profiler.toggle)
+        logging.info("--- app startup ---")
+        app.run()
+    finally:
+        log_pipeline.stop()
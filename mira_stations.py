@@ -12,6 +12,10 @@ class MiraStations:
         dict(
             name = "Radio 1",
             url = "https://radio1.de",
+            # mirrors, the fastest healthy URL is played (see MiraConfig.Health)
+            #alt_urls = ["https://mirror.radio1.de"],
+            # file path or URL of a PNG/JPEG, scaled to the button (see MiraConfig.Logos)
+            #logo = "~/.mira/radio1.png",
             #background_color = "green",
             #text_color = "blue",
         ),
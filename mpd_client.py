@@ -0,0 +1,486 @@
+"""
+Minimalist Internet Radio - MPD player backends
+
+Two interchangeable backends offering the same operations:
+    MpdClient  - speaks the MPD protocol over one persistent socket
+    MpcBackend - forks the mpc command line client for every command (fallback)
+"""
+
+from typing import Any
+
+import socket
+import subprocess
+import threading
+import logging
+import time
+
+from mira_config import MiraConfig
+
+
+class MpdError(Exception):
+    """ MPD answered with an error or could not be reached """
+
+
+class MpdCommandError(MpdError):
+    """ MPD rejected a command (ACK response) """
+
+    def __init__(self, message: str, responses: list|None = None) -> None:
+        super().__init__(message)
+        # responses of the commands of a command list preceding the failed one
+        self.responses = responses or []
+
+
+
+class SwitchResult:
+    """ Outcome of a station switch """
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.started = time.monotonic()
+        # (command, ok, response or error message) per step
+        self.steps = []
+        # seconds from start of the switch until MPD reported audio, None if unknown
+        self.time_to_audio = None
+
+
+    @property
+    def ok(self) -> bool:
+        return len(self.steps) > 0 and all(ok for _, ok, _ in self.steps)
+
+
+    def add_step(self, command: str, ok: bool, detail: Any) -> None:
+        self.steps.append((command, ok, detail))
+
+
+    def __str__(self) -> str:
+        steps = ", ".join(f"{cmd}={'ok' if ok else detail}" for cmd, ok, detail in self.steps)
+        return f"switch to '{self.url}': {steps}"
+
+
+def format_song(song: dict) -> str:
+    """ Format a 'currentsong' dict the same way 'mpc current' does. """
+    title = song.get("Title", "")
+    if title and song.get("Artist"):
+        title = f"{song['Artist']} - {title}"
+
+    name = song.get("Name", "")
+    if name and title:
+        return f"{name}: {title}"
+    if name:
+        return name
+    if title:
+        return title
+    return song.get("file", "")
+
+
+def wait_for_audio(player: Any, result: SwitchResult, timeout: float, interval: float, is_current: Any) -> float|None:
+    """ Poll the player status until audio is playing and store the time to audio in the result.
+        Gives up after timeout seconds or as soon as is_current() returns False. """
+    deadline = result.started + timeout
+    while time.monotonic() < deadline and is_current():
+        try:
+            status = player.status()
+        except MpdError as e:
+            logging.warning("Cannot measure time to audio: %s", e)
+            return None
+        if status.get("state") == "play" and (float(status.get("elapsed", 0)) > 0 or int(status.get("bitrate", 0)) > 0):
+            result.time_to_audio = time.monotonic() - result.started
+            return result.time_to_audio
+        time.sleep(interval)
+    return None
+
+
+def _quote(arg: Any) -> str:
+    value = str(arg).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{value}"'
+
+
+
+class MpdClient:
+    """ MPD protocol client keeping one persistent connection """
+
+    def __init__(self, host: str, port: int, timeout: float, password: str|None = None) -> None:
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.password = password
+        self.mpd_version = None
+
+        self._sock = None
+        self._reader = None
+        self._lock = threading.RLock()
+
+
+    def connect(self) -> None:
+        with self._lock:
+            self.close()
+            try:
+                if self.host.startswith("/"):
+                    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    sock.settimeout(self.timeout)
+                    sock.connect(self.host)
+                else:
+                    sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            except OSError as e:
+                raise MpdError(f"Cannot connect to MPD at {self._address()}: {e}") from e
+
+            self._sock = sock
+            self._reader = sock.makefile("r", encoding="utf-8", newline="\n")
+
+            greeting = self._readline()
+            if not greeting.startswith("OK MPD "):
+                self.close()
+                raise MpdError(f"Unexpected MPD greeting: '{greeting}'")
+            self.mpd_version = greeting[len("OK MPD "):]
+            logging.info("Connected to MPD %s at %s", self.mpd_version, self._address())
+
+            if self.password:
+                self._send("password", self.password)
+                self._read_pairs()
+
+
+    def close(self) -> None:
+        with self._lock:
+            if self._reader is not None:
+                try:
+                    self._reader.close()
+                except OSError:
+                    pass
+            if self._sock is not None:
+                try:
+                    self._sock.close()
+                except OSError:
+                    pass
+            self._sock = None
+            self._reader = None
+
+
+    def abort(self) -> None:
+        """ Interrupt a blocking call (e.g. idle) from another thread. """
+        sock = self._sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+    def is_connected(self) -> bool:
+        return self._sock is not None
+
+
+    def command(self, name: str, *args: Any) -> list[tuple[str, str]]:
+        """ Execute a command and return the response as list of (key, value) pairs.
+            A broken connection is re-established once before giving up. """
+        with self._lock:
+            for attempt in (1, 2):
+                try:
+                    if self._sock is None:
+                        self.connect()
+                    self._send(name, *args)
+                    return self._read_pairs()
+                except (OSError, EOFError) as e:
+                    self.close()
+                    if attempt == 2:
+                        raise MpdError(f"MPD command '{name}' failed: {e}") from e
+                    logging.warning("MPD connection lost (%s), reconnecting", e)
+        return []
+
+
+    def command_list(self, commands: list[tuple]) -> list[list[tuple[str, str]]]:
+        """ Execute several commands as one batch and return the response of each command.
+            If a command fails, MpdCommandError carries the responses of the preceding ones. """
+        with self._lock:
+            for attempt in (1, 2):
+                try:
+                    if self._sock is None:
+                        self.connect()
+                    lines = ["command_list_ok_begin"] + [self._format(*cmd) for cmd in commands] + ["command_list_end"]
+                    self._sock.sendall(("\n".join(lines) + "\n").encode("utf-8"))
+                    return self._read_list_responses()
+                except (OSError, EOFError) as e:
+                    self.close()
+                    if attempt == 2:
+                        raise MpdError(f"MPD command list failed: {e}") from e
+                    logging.warning("MPD connection lost (%s), reconnecting", e)
+        return []
+
+
+    def idle(self, *subsystems: str) -> list[str]:
+        """ Block until one of the given subsystems changes and return the changed ones. """
+        with self._lock:
+            if self._sock is None:
+                self.connect()
+            try:
+                self._sock.settimeout(None)
+                self._send("idle", *subsystems)
+                pairs = self._read_pairs()
+                self._sock.settimeout(self.timeout)
+            except (OSError, EOFError) as e:
+                self.close()
+                raise MpdError(f"MPD idle failed: {e}") from e
+        return [value for key, value in pairs if key == "changed"]
+
+
+    # Operations:
+    def clear(self) -> None:
+        self.command("clear")
+
+    def add(self, url: str) -> None:
+        self.command("add", url)
+
+    def play(self) -> None:
+        self.command("play")
+
+    def stop(self) -> None:
+        self.command("stop")
+
+    def pause(self, paused: bool) -> None:
+        self.command("pause", 1 if paused else 0)
+
+    def current(self) -> str:
+        return format_song(self.currentsong())
+
+    def currentsong(self) -> dict:
+        return dict(self.command("currentsong"))
+
+    def status(self) -> dict:
+        return dict(self.command("status"))
+
+    def volume(self, value: int|None = None) -> int:
+        if value is not None:
+            self.command("setvol", max(0, min(100, int(value))))
+        return int(self.status().get("volume", -1))
+
+    def switch_station(self, url: str, gapless: bool) -> SwitchResult:
+        """ Replace the queue by the given stream and start playing it.
+            Not gapless: clear, add and play are sent as one command list.
+            Gapless: the stream is inserted in front of the queue and started
+            before the old entries are deleted, so playback never stops. """
+        result = SwitchResult(url)
+        try:
+            if gapless:
+                song_id = dict(self.command("addid", url, 0))["Id"]
+                result.add_step("addid", True, song_id)
+                responses = self.command_list([("playid", song_id), ("status",)])
+                result.add_step("playid", True, responses[0])
+                length = int(dict(responses[1]).get("playlistlength", 1))
+                if length > 1:
+                    self.command("delete", f"1:{length}")
+                result.add_step("delete", True, length - 1)
+            else:
+                commands = [("clear",), ("add", url), ("play",)]
+                try:
+                    responses = self.command_list(commands)
+                except MpdCommandError as e:
+                    for cmd, response in zip(commands, e.responses):
+                        result.add_step(cmd[0], True, response)
+                    raise
+                for cmd, response in zip(commands, responses):
+                    result.add_step(cmd[0], True, response)
+        except MpdError as e:
+            result.add_step("error", False, str(e))
+        return result
+
+
+    # Protocol helpers:
+    def _address(self) -> str:
+        if self.host.startswith("/"):
+            return self.host
+        return f"{self.host}:{self.port}"
+
+    def _format(self, name: str, *args: Any) -> str:
+        return " ".join([name] + [_quote(a) for a in args])
+
+    def _send(self, name: str, *args: Any) -> None:
+        line = self._format(name, *args) + "\n"
+        self._sock.sendall(line.encode("utf-8"))
+
+    def _readline(self) -> str:
+        line = self._reader.readline()
+        if not line.endswith("\n"):
+            raise EOFError("connection closed by MPD")
+        return line[:-1]
+
+    def _read_pairs(self) -> list[tuple[str, str]]:
+        pairs = []
+        while True:
+            line = self._readline()
+            if line == "OK":
+                return pairs
+            if line.startswith("ACK "):
+                raise MpdCommandError(line)
+            key, sep, value = line.partition(": ")
+            if sep:
+                pairs.append((key, value))
+
+    def _read_list_responses(self) -> list[list[tuple[str, str]]]:
+        responses = []
+        pairs = []
+        while True:
+            line = self._readline()
+            if line == "OK":
+                return responses
+            if line == "list_OK":
+                responses.append(pairs)
+                pairs = []
+            elif line.startswith("ACK "):
+                raise MpdCommandError(line, responses)
+            else:
+                key, sep, value = line.partition(": ")
+                if sep:
+                    pairs.append((key, value))
+
+
+
+class MpdIdleWatcher(threading.Thread):
+    """ Waits for MPD 'idle' events on a background connection and reports the current song """
+
+    SUBSYSTEMS = ("player", "playlist", "mixer")
+    MAX_RETRY_DELAY = 30
+
+    def __init__(self, config: MiraConfig, on_change: Any, on_unavailable: Any, on_player: Any = None) -> None:
+        super().__init__(name="mpd-idle", daemon=True)
+        general = config.General
+        self.client = MpdClient(general.MPD_HOST, general.MPD_PORT, general.MPD_TIMEOUT, general.MPD_PASSWORD)
+        # all callbacks are called from the watcher thread
+        self.on_change = on_change
+        self.on_unavailable = on_unavailable
+        # called when the player state changed, before on_change
+        self.on_player = on_player
+        self._stopped = threading.Event()
+
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.client.abort()
+
+
+    def run(self) -> None:
+        retry_delay = 1
+        while not self._stopped.is_set():
+            try:
+                self.on_change(self.client.current())
+                while not self._stopped.is_set():
+                    changed = self.client.idle(*self.SUBSYSTEMS)
+                    logging.info("MPD idle: changed=%s", changed)
+                    if self.on_player is not None and "player" in changed:
+                        self.on_player()
+                    self.on_change(self.client.current())
+                    retry_delay = 1
+            except MpdCommandError as e:
+                logging.warning("MPD idle not available, falling back to polling: %s", e)
+                self.on_unavailable()
+                break
+            except MpdError as e:
+                if self._stopped.is_set():
+                    break
+                logging.warning("MPD idle connection lost, retrying in %ss: %s", retry_delay, e)
+                self._stopped.wait(retry_delay)
+                retry_delay = min(retry_delay * 2, self.MAX_RETRY_DELAY)
+
+        self.client.close()
+
+
+
+class MpcBackend:
+    """ Fallback backend forking the mpc command line client for every command """
+
+    def __init__(self, mpc_path: str, timeout: float) -> None:
+        self.mpc_path = mpc_path
+        self.timeout = timeout
+
+
+    def close(self) -> None:
+        pass
+
+
+    def execute(self, args: list[str]) -> str:
+        cmd = [self.mpc_path] + args
+        logging.info("executing: %s", cmd)
+        try:
+            process = subprocess.run(cmd, capture_output=True, text=True, timeout=self.timeout)
+        except (OSError, subprocess.SubprocessError) as e:
+            raise MpdError(f"Failed to execute {cmd} : {e}") from e
+        if process.returncode != 0:
+            raise MpdError(f"{cmd} failed: {process.stderr.strip()}")
+        return process.stdout
+
+
+    # Operations:
+    def clear(self) -> None:
+        self.execute(["clear"])
+
+    def add(self, url: str) -> None:
+        self.execute(["add", url])
+
+    def play(self) -> None:
+        self.execute(["play"])
+
+    def stop(self) -> None:
+        self.execute(["stop"])
+
+    def pause(self, paused: bool) -> None:
+        self.execute(["pause" if paused else "play"])
+
+    def current(self) -> str:
+        return self.execute(["current"]).strip()
+
+    def switch_station(self, url: str, gapless: bool) -> SwitchResult:
+        """ Replace the queue by the given stream and start playing it.
+            mpc cannot batch commands, so the steps are sent one by one. """
+        result = SwitchResult(url)
+        for args in (["clear"], ["add", url], ["play"]):
+            try:
+                result.add_step(args[0], True, self.execute(args))
+            except MpdError as e:
+                result.add_step(args[0], False, str(e))
+                break
+        return result
+
+    def status(self) -> dict:
+        # [playing] #1/1   0:12/0:00 (0%)
+        # volume: 80%   repeat: off   random: off   single: off   consume: off
+        output = self.execute(["status"])
+        status = dict(state="stop")
+        for line in output.splitlines():
+            if line.startswith("[playing]") or line.startswith("[paused]"):
+                status["state"] = "play" if line.startswith("[playing]") else "pause"
+                elapsed = line.split()[2].split("/")[0] if len(line.split()) > 2 else ""
+                # m:ss, or h:mm:ss after an hour
+                parts = elapsed.split(":")
+                if len(parts) > 1 and all(part.isdigit() for part in parts):
+                    seconds = 0
+                    for part in parts:
+                        seconds = seconds * 60 + int(part)
+                    status["elapsed"] = str(seconds)
+            elif line.startswith("ERROR: "):
+                status["error"] = line[len("ERROR: "):]
+            elif line.startswith("volume:"):
+                for field in line.split("   "):
+                    key, sep, value = field.partition(":")
+                    if sep:
+                        status[key.strip()] = value.strip().rstrip("%")
+        return status
+
+    def volume(self, value: int|None = None) -> int:
+        if value is not None:
+            self.execute(["volume", str(max(0, min(100, int(value))))])
+        try:
+            return int(self.status().get("volume", -1))
+        except ValueError:
+            return -1
+
+
+
+def create_player(config: MiraConfig) -> Any:
+    """ Create the MPD backend selected in the config, a group of players if several rooms are configured. """
+    if config.Rooms.ENDPOINTS:
+        from multiroom import create_player_group
+        return create_player_group(config)
+
+    general = config.General
+    if general.MPD_BACKEND == "mpc":
+        return MpcBackend(general.MPC_PATH, general.MPD_TIMEOUT)
+    return MpdClient(general.MPD_HOST, general.MPD_PORT, general.MPD_TIMEOUT, general.MPD_PASSWORD)
@@ -0,0 +1,169 @@
+"""
+Minimalist Internet Radio - several MPD instances driven as one player
+
+Every room has its own MPD and its own worker thread. Commands for a group
+of rooms are sent to all of them at once, and the group waits for the
+answers at most a given time, so a slow or unreachable room never holds
+up the others.
+"""
+
+from typing import Any
+
+import collections
+import concurrent.futures
+import logging
+
+from mira_config import MiraConfig
+from constants import Key
+from mpd_client import MpdClient, MpdError, SwitchResult
+
+
+class GroupSwitchResult(SwitchResult):
+    """ Outcome of a station switch in a group of rooms, one step per room """
+
+    @property
+    def ok(self) -> bool:
+        # the station plays, even if some rooms could not follow
+        return any(ok for _, ok, _ in self.steps)
+
+
+    @property
+    def failed_rooms(self) -> list[str]:
+        return [room for room, ok, _ in self.steps if not ok]
+
+
+
+class PlayerGroup:
+    """ Offers the operations of a single player for the active group of rooms """
+
+    def __init__(self, rooms: dict[str, Any], groups: dict[str, list[str]], timeout: float) -> None:
+        # room name -> player
+        self.rooms = rooms
+        # group name -> room names
+        self.groups = groups
+        self.timeout = timeout
+        self.group = next(iter(groups))
+        # one worker per room, commands of a room are never sent concurrently
+        self._workers = {
+            name: concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"mira-room-{name}")
+            for name in rooms
+            }
+
+
+    def members(self) -> list[str]:
+        return self.groups[self.group]
+
+
+    def select_group(self, group: str) -> None:
+        """ Make another group active, rooms leaving the group are stopped. """
+        if group not in self.groups:
+            raise MpdError(f"Unknown group of rooms: '{group}'")
+        leaving = [room for room in self.members() if room not in self.groups[group]]
+        self.group = group
+        if leaving:
+            self._fan_out(leaving, "stop")
+
+
+    def close(self) -> None:
+        for worker in self._workers.values():
+            worker.shutdown(wait=False, cancel_futures=True)
+        for player in self.rooms.values():
+            player.close()
+
+
+    # Operations:
+    def stop(self) -> None:
+        self._require_any(self._fan_out(self.members(), "stop"))
+
+    def pause(self, paused: bool) -> None:
+        self._require_any(self._fan_out(self.members(), "pause", paused))
+
+    def switch_station(self, url: str, gapless: bool) -> GroupSwitchResult:
+        result = GroupSwitchResult(url)
+        for room, (ok, value) in self._fan_out(self.members(), "switch_station", url, gapless).items():
+            if ok:
+                result.add_step(room, value.ok, value)
+            else:
+                result.add_step(room, False, value)
+        if result.failed_rooms:
+            logging.warning("Station switch failed in: %s", ", ".join(result.failed_rooms))
+        return result
+
+    def current(self) -> str:
+        """ The song shown by most rooms, with the number of rooms playing it if not all do. """
+        answers = self._require_any(self._fan_out(self.members(), "current"))
+        text, count = collections.Counter(answers.values()).most_common(1)[0]
+        if count < len(self.members()):
+            return f"{text} ({count}/{len(self.members())} rooms)"
+        return text
+
+    def status(self) -> dict:
+        """ Status of the first room playing, otherwise of the first room answering. """
+        answers = self._require_any(self._fan_out(self.members(), "status"))
+        for status in answers.values():
+            if status.get("state") == "play":
+                return status
+        return next(iter(answers.values()))
+
+    def volume(self, value: int|None = None) -> int:
+        answers = self._require_any(self._fan_out(self.members(), "volume", value))
+        volumes = [volume for volume in answers.values() if volume >= 0]
+        return round(sum(volumes) / len(volumes)) if volumes else -1
+
+
+    def _fan_out(self, rooms: list[str], operation: str, *args: Any) -> dict[str, tuple[bool, Any]]:
+        """ Run the operation in all given rooms at once.
+            Returns room -> (True, return value) or (False, error message). """
+        futures = {room: self._workers[room].submit(getattr(self.rooms[room], operation), *args) for room in rooms}
+        concurrent.futures.wait(futures.values(), timeout=self.timeout)
+
+        results = {}
+        for room, future in futures.items():
+            if not future.done():
+                # still running, the room's next command waits for it
+                results[room] = (False, f"no answer within {self.timeout}s")
+                continue
+            error = future.exception()
+            if error is not None:
+                results[room] = (False, str(error))
+            else:
+                results[room] = (True, future.result())
+        return results
+
+
+    def _require_any(self, results: dict[str, tuple[bool, Any]]) -> dict[str, Any]:
+        answers = {room: value for room, (ok, value) in results.items() if ok}
+        if not answers:
+            errors = "; ".join(f"{room}: {value}" for room, (ok, value) in results.items())
+            raise MpdError(f"No room answered: {errors}")
+        return answers
+
+
+
+def create_player_group(config: MiraConfig) -> PlayerGroup:
+    """ Create a player for every configured room, see MiraConfig.Rooms. """
+    rooms = {}
+    for endpoint in config.Rooms.ENDPOINTS:
+        rooms[endpoint[Key.NAME]] = MpdClient(
+                                        endpoint.get(Key.HOST, "localhost"),
+                                        endpoint.get(Key.PORT, 6600),
+                                        endpoint.get(Key.TIMEOUT, config.General.MPD_TIMEOUT),
+                                        endpoint.get(Key.PASSWORD)
+                                        )
+
+    # unknown rooms are left out
+    groups = {}
+    for group, members in config.Rooms.GROUPS.items():
+        known = [room for room in members if room in rooms]
+        if len(known) < len(members):
+            logging.warning("Group '%s' contains unknown rooms: %s", group, [room for room in members if room not in rooms])
+        if known:
+            groups[group] = known
+
+    if not groups:
+        # all rooms together, then each room on its own
+        groups["All rooms"] = list(rooms)
+        if len(rooms) > 1:
+            groups.update({room: [room] for room in rooms})
+
+    return PlayerGroup(rooms, groups, config.Rooms.TIMEOUT)
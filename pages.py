@@ -0,0 +1,156 @@
+"""
+Minimalist Internet Radio - pages of preset buttons
+"""
+
+from typing import Any
+
+import collections
+import guizero
+import logging
+
+from mira_config import MiraConfig
+from helpers import Preset
+from widgets import PresetButton
+
+
+class PresetPage:
+    """ A grid of preset buttons in its own container, which can be shown or hidden """
+
+    def __init__(self, containing_box: guizero.Box, callback: Any, config: MiraConfig) -> None:
+        self.config = config
+        self.callback = callback
+        self.buttons = []
+        self.box = guizero.Box(
+                        containing_box,
+                        grid=[0, 0],
+                        layout="grid"
+                        )
+
+
+    def bind(self, presets: list[Preset]) -> list[PresetButton]:
+        """ Show the given presets, reusing existing buttons and hiding unused ones. """
+        for idx, ps in enumerate(presets):
+            if idx < len(self.buttons):
+                self.buttons[idx].bind(ps)
+                self.buttons[idx].box.show()
+            else:
+                position = (idx % self.config.Buttons.NUM_BUTTON_COLUMNS, idx // self.config.Buttons.NUM_BUTTON_COLUMNS)
+                bt = PresetButton(
+                        containing_box=self.box,
+                        position=position,
+                        preset=ps,
+                        callback=self.callback,
+                        config=self.config
+                        )
+                self.buttons.append(bt)
+                logging.info("Placed preset button on grid at: x=%s, y=%s", position[0], position[1])
+
+        for bt in self.buttons[len(presets):]:
+            bt.box.hide()
+
+        return self.buttons[:len(presets)]
+
+
+    def show(self) -> None:
+        self.box.show()
+
+    def hide(self) -> None:
+        self.box.hide()
+
+    def destroy(self) -> None:
+        self.box.destroy()
+        self.buttons = []
+
+
+
+class CachedPagePool:
+    """ Builds each page on its first visit and keeps the most recently used pages as hidden containers """
+
+    # shown buttons keep their text and colors
+    rebinds = False
+
+    def __init__(self, containing_box: guizero.Box, callback: Any, config: MiraConfig) -> None:
+        self.containing_box = containing_box
+        self.callback = callback
+        self.config = config
+        self.max_pages = max(1, config.Buttons.PAGE_CACHE_SIZE)
+        self.pages = collections.OrderedDict()
+        self.visible_idx = None
+
+
+    def show(self, page_idx: int, presets: list[Preset]) -> list[PresetButton]:
+        page = self.pages.get(page_idx)
+        if page is None:
+            logging.info("Building preset page %s", page_idx)
+            page = PresetPage(self.containing_box, self.callback, self.config)
+            buttons = page.bind(presets)
+            self.pages[page_idx] = page
+        else:
+            buttons = page.buttons[:len(presets)]
+        self.pages.move_to_end(page_idx)
+
+        if self.visible_idx is not None and self.visible_idx != page_idx and self.visible_idx in self.pages:
+            self.pages[self.visible_idx].hide()
+        page.show()
+        self.visible_idx = page_idx
+
+        # evict the least recently used pages
+        while len(self.pages) > self.max_pages:
+            old_idx, old_page = self.pages.popitem(last=False)
+            logging.info("Dropping cached preset page %s", old_idx)
+            old_page.destroy()
+
+        return buttons
+
+
+    def update(self, page_idx: int, presets: list[Preset]) -> list[PresetButton]:
+        """ Rebind a cached page to changed presets. Returns the rebound buttons. """
+        page = self.pages.get(page_idx)
+        if page is None:
+            return []
+        return page.bind(presets)
+
+
+    def invalidate(self) -> None:
+        """ Drop all cached pages, e.g. after the presets changed. """
+        for page in self.pages.values():
+            page.destroy()
+        self.pages.clear()
+        self.visible_idx = None
+
+
+
+class ReusablePagePool:
+    """ Keeps a single grid of preset buttons and rebinds text, colors and callback args on page switch """
+
+    # shown buttons get the text and colors of their new presets
+    rebinds = True
+
+    def __init__(self, containing_box: guizero.Box, callback: Any, config: MiraConfig) -> None:
+        self.containing_box = containing_box
+        self.callback = callback
+        self.config = config
+        self.page = PresetPage(containing_box, callback, config)
+
+
+    def show(self, page_idx: int, presets: list[Preset]) -> list[PresetButton]:
+        return self.page.bind(presets)
+
+
+    def update(self, page_idx: int, presets: list[Preset]) -> list[PresetButton]:
+        # the next show() rebinds anyway
+        return []
+
+
+    def invalidate(self) -> None:
+        """ Rebuild the buttons, e.g. after the fonts changed. """
+        self.page.destroy()
+        self.page = PresetPage(self.containing_box, self.callback, self.config)
+
+
+
+def create_page_pool(containing_box: guizero.Box, callback: Any, config: MiraConfig) -> CachedPagePool|ReusablePagePool:
+    """ Create the page pool selected in the config. """
+    if config.Buttons.PAGE_MODE == "rebind":
+        return ReusablePagePool(containing_box, callback, config)
+    return CachedPagePool(containing_box, callback, config)
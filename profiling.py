@@ -0,0 +1,112 @@
+"""
+Minimalist Internet Radio - profiling the running app
+
+Toggled with 'kill -USR2 <pid>' (or the 'profile' command of the headless
+mode). The first toggle starts cProfile on the main thread, where the GUI
+and all timers run, and takes a tracemalloc snapshot. The second one stops
+both and writes to Profiling.DIR:
+
+    profile-<time>.pstats   python -m pstats <file>
+    memory-<time>.txt       counts of widgets, timers, threads etc. at start
+                            and stop, and the allocations that grew most
+"""
+
+from typing import Any, Callable
+
+import datetime
+import linecache
+import logging
+import pathlib
+import time
+
+from mira_config import MiraConfig
+
+
+class RuntimeProfiler:
+    """ Profiles the main thread and traces allocations between two toggles """
+
+    def __init__(self, config: MiraConfig, counts: Callable[[], dict]|None = None) -> None:
+        self.directory = pathlib.Path(config.Profiling.DIR).expanduser()
+        self.top_allocations = config.Profiling.TOP_ALLOCATIONS
+        self.frames = config.Profiling.TRACEMALLOC_FRAMES
+        # numbers that grow when something leaks, e.g. widgets and timers
+        self.counts = counts
+
+        self.profile = None
+        self.snapshot = None
+        self.started = None
+        self.start_counts = {}
+
+
+    @property
+    def active(self) -> bool:
+        return self.profile is not None
+
+
+    def toggle(self, *args: Any) -> None:
+        """ Start or stop profiling, usable as a signal handler. """
+        if self.active:
+            self.stop()
+        else:
+            self.start()
+
+
+    def start(self) -> None:
+        # imported on demand, profiling is rare and both are large
+        import cProfile
+        import tracemalloc
+        self.start_counts = self._get_counts()
+        self.started = time.monotonic()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        self.snapshot = tracemalloc.take_snapshot()
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+        logging.info("Profiling started, stop with 'kill -USR2 <pid>'")
+
+
+    def stop(self) -> list[pathlib.Path]:
+        """ Stop profiling and write the results. Returns the written files. """
+        import tracemalloc
+        self.profile.disable()
+        profile, self.profile = self.profile, None
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        duration = time.monotonic() - self.started
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        profile_file = self.directory / f"profile-{stamp}.pstats"
+        memory_file = self.directory / f"memory-{stamp}.txt"
+        profile.dump_stats(profile_file)
+
+        ignored = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap>"))
+        diff = snapshot.filter_traces(ignored).compare_to(self.snapshot.filter_traces(ignored), "lineno")
+        self.snapshot = None
+
+        lines = [f"Profiled for {duration:.1f}s", "", f"{'count':<24}{'start':>12}{'stop':>12}"]
+        stop_counts = self._get_counts()
+        for name in dict.fromkeys(list(self.start_counts) + list(stop_counts)):
+            lines.append(f"{name:<24}{self.start_counts.get(name, '-'):>12}{stop_counts.get(name, '-'):>12}")
+        lines += ["", f"Top {self.top_allocations} allocation sites by growth:"]
+        for stat in diff[:self.top_allocations]:
+            frame = stat.traceback[0]
+            lines.append(f"{stat.size_diff / 1024:+10.1f} KiB {stat.count_diff:+8} blocks  {frame.filename}:{frame.lineno}")
+            code = linecache.getline(frame.filename, frame.lineno).strip()
+            if code:
+                lines.append(f"{'':>30}{code}")
+        memory_file.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+        logging.info("Profiling stopped, results in '%s' and '%s'", profile_file, memory_file)
+        return [profile_file, memory_file]
+
+
+    def _get_counts(self) -> dict:
+        if self.counts is None:
+            return {}
+        try:
+            return self.counts()
+        except Exception as e:
+            # the report is still useful without them
+            logging.warning("Cannot collect the counts: %s", e)
+            return {}
@@ -0,0 +1,126 @@
+"""
+Minimalist Internet Radio - detection of stalled streams
+
+When a stream drops, MPD often stays in 'play' with 'elapsed' frozen.
+The StallWatchdog is fed with MPD status samples while a station is
+supposed to play. It reports a stall when playback makes no progress for
+a few seconds, asks for restarts with bounded exponential backoff and
+measures the time until playback recovered.
+"""
+
+# states
+IDLE = "idle"
+PLAYING = "playing"
+STALLED = "stalled"
+
+# actions returned by update()
+RESTART = "restart"
+RECOVERED = "recovered"
+
+
+class StallWatchdog:
+    """ State machine deciding from MPD status samples when to restart the stream """
+
+    def __init__(self, stall_time: float, min_backoff: float, max_backoff: float) -> None:
+        self.stall_time = stall_time
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+
+        self.state = IDLE
+        self.last_elapsed = None
+        self.last_progress = 0.0
+        self.stalled_since = None
+        self.next_restart = 0.0
+        # restarts since the stall was detected
+        self.attempts = 0
+        # seconds from the last progress before the stall until playback recovered
+        self.last_recovery = None
+        self.reason = None
+
+
+    def arm(self, now: float) -> None:
+        """ A station was started and is expected to play. Ignored while recovering. """
+        if self.state == IDLE:
+            self.state = PLAYING
+            self.last_elapsed = None
+            self.last_progress = now
+
+
+    def disarm(self) -> None:
+        """ Playback is not expected, e.g. the user is switching stations. """
+        self.state = IDLE
+        self.stalled_since = None
+        self.attempts = 0
+
+
+    @property
+    def armed(self) -> bool:
+        return self.state != IDLE
+
+
+    @property
+    def recovering(self) -> bool:
+        return self.state == STALLED
+
+
+    def update(self, status: dict|None, now: float) -> str|None:
+        """ Feed a status sample (None if MPD didn't answer). Returns RESTART, RECOVERED or None. """
+        if self.state == IDLE:
+            return None
+        if status is not None and status.get("state") == "pause":
+            # paused on purpose
+            self.disarm()
+            return None
+
+        if self._progressed(status):
+            self.last_progress = now
+            if self.state == STALLED:
+                self.last_recovery = now - self.stalled_since
+                self.state = PLAYING
+                self.stalled_since = None
+                self.attempts = 0
+                return RECOVERED
+            return None
+
+        if self.state == PLAYING:
+            reason = self._stall_reason(status, now)
+            if reason is None:
+                return None
+            self.state = STALLED
+            self.reason = reason
+            # the silence started with the last progress
+            self.stalled_since = self.last_progress
+            self.next_restart = now
+
+        if now >= self.next_restart:
+            self.next_restart = now + min(self.max_backoff, self.min_backoff * 2 ** self.attempts)
+            self.attempts += 1
+            return RESTART
+        return None
+
+
+    def _progressed(self, status: dict|None) -> bool:
+        # playing and elapsed grew since the last sample; a restart resets elapsed,
+        # so the restarted stream counts from its second sample on
+        if status is None or status.get("state") != "play" or status.get("error"):
+            self.last_elapsed = None
+            return False
+        try:
+            elapsed = float(status.get("elapsed", 0))
+        except ValueError:
+            return False
+        progressed = self.last_elapsed is not None and elapsed > self.last_elapsed
+        self.last_elapsed = elapsed
+        return progressed
+
+
+    def _stall_reason(self, status: dict|None, now: float) -> str|None:
+        if status is not None and status.get("error"):
+            return status["error"]
+        if now - self.last_progress < self.stall_time:
+            return None
+        if status is None:
+            return "MPD is not responding"
+        if status.get("state") != "play":
+            return "playback stopped"
+        return "no data"
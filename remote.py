@@ -0,0 +1,279 @@
+"""
+Minimalist Internet Radio - HTTP/JSON remote control
+
+An asyncio HTTP server on a thread of its own. Reads are answered from a
+snapshot of the app state that the app keeps current, so clients never
+cause MPD traffic. Changes are pushed with server-sent events or long
+polling. Commands are handed to the app, which runs them on the GUI
+thread like a tap on the screen.
+
+    GET  /api/state                 snapshot (?after=<version> waits for a newer one)
+    GET  /api/events                snapshots as server-sent events
+    GET  /api/presets               presets (?first=0&count=100)
+    POST /api/play/<number>         play a preset
+    POST /api/page/<number>         show a page of presets
+    POST /api/volume/<0..100>       set the volume
+    POST /api/pause/<0|1>           resume or pause (time-shift only)
+    POST /api/delay/<seconds>       play the station seconds behind live, 0 is live (time-shift only)
+"""
+
+from typing import Any, Callable
+
+import asyncio
+import hmac
+import json
+import logging
+import threading
+import urllib.parse
+
+from mira_config import MiraConfig
+from constants import Key
+from state import Snapshot
+
+
+MAX_HEADER_SIZE = 8 * 1024
+# seconds between keep-alive comments on event streams
+KEEPALIVE_INTERVAL = 15
+REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+           405: "Method Not Allowed", 503: "Service Unavailable"}
+
+
+class HttpError(Exception):
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+
+class RemoteServer(threading.Thread):
+    """ Serves the remote control API, see the module docstring """
+
+    def __init__(self, config: MiraConfig, snapshot: Snapshot, commands: dict[str, Callable]) -> None:
+        super().__init__(name="mira-remote", daemon=True)
+        self.host = config.Remote.HOST
+        self.port = config.Remote.PORT
+        self.token = config.Remote.TOKEN
+        self.max_clients = config.Remote.MAX_CLIENTS
+        self.long_poll_timeout = config.Remote.LONG_POLL_TIMEOUT
+        self.snapshot = snapshot
+        # name -> function(int), called on the server thread
+        self.commands = commands
+
+        self.clients = 0
+        self.loop = None
+        self._stopped = None
+        self._changed = None
+        self.ready = threading.Event()
+
+
+    def stop(self) -> None:
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._stopped.set)
+
+
+    def run(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        try:
+            self.loop.run_until_complete(self._serve())
+        except OSError as e:
+            logging.error("Cannot serve the remote control on %s:%s: %s", self.host, self.port, e)
+        finally:
+            self.snapshot.on_change = None
+            self.ready.set()
+            self.loop.close()
+
+
+    async def _serve(self) -> None:
+        self._stopped = asyncio.Event()
+        self._changed = asyncio.Event()
+
+        server = await asyncio.start_server(self._handle, self.host, self.port, limit=MAX_HEADER_SIZE)
+        # only once the server runs, a loop that failed to start doesn't take notifications
+        self.snapshot.on_change = lambda: self.loop.call_soon_threadsafe(self._notify)
+        # port 0 picks a free port
+        self.port = server.sockets[0].getsockname()[1]
+        logging.info("Remote control on http://%s:%s/api/state", self.host, self.port)
+        self.ready.set()
+        async with server:
+            await self._stopped.wait()
+            self.snapshot.on_change = None
+            server.close()
+            # end the connections still open, e.g. event streams
+            clients = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in clients:
+                task.cancel()
+            await asyncio.gather(*clients, return_exceptions=True)
+
+
+    def _notify(self) -> None:
+        # wake up all waiting clients, later waiters wait for the next change
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+
+    async def _wait_for_change(self, version: int, timeout: float) -> bool:
+        """ Wait until the snapshot is newer than the given version. """
+        while self.snapshot.version <= version:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.clients += 1
+        try:
+            if self.clients > self.max_clients:
+                await self._respond(writer, 503, {"error": "too many clients"}, keep_alive=False)
+                return
+            keep_alive = True
+            while keep_alive:
+                try:
+                    request = await self._read_request(reader)
+                except HttpError as e:
+                    await self._respond(writer, e.status, {"error": str(e)}, keep_alive=False)
+                    return
+                if request is None:
+                    return
+                method, target, headers = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                try:
+                    keep_alive = await self._dispatch(writer, method, target, headers, keep_alive)
+                except HttpError as e:
+                    await self._respond(writer, e.status, {"error": str(e)}, keep_alive)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            # server stopped, ending normally keeps asyncio from logging the connection
+            pass
+        finally:
+            self.clients -= 1
+            writer.close()
+
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> tuple[str, str, dict]|None:
+        line = await reader.readline()
+        if not line:
+            return None
+        parts = line.decode("latin-1").split()
+        if len(parts) != 3 or not parts[2].startswith("HTTP/1."):
+            raise HttpError(400, "malformed request line")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, sep, value = line.decode("latin-1").partition(":")
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+
+        # commands carry their argument in the path, a body is read and ignored
+        length = int(headers.get("content-length", 0) or 0)
+        if length > MAX_HEADER_SIZE:
+            raise HttpError(400, "request body too large")
+        if length:
+            await reader.readexactly(length)
+        return parts[0], parts[1], headers
+
+
+    async def _dispatch(self, writer: asyncio.StreamWriter, method: str, target: str, headers: dict, keep_alive: bool) -> bool:
+        url = urllib.parse.urlsplit(target)
+        query = {key: values[-1] for key, values in urllib.parse.parse_qs(url.query).items()}
+        if self.token and not (_token_matches(headers.get("authorization", ""), f"Bearer {self.token}")
+                                or _token_matches(query.get("token", ""), self.token)):
+            raise HttpError(401, "missing or wrong token")
+        path = url.path.rstrip("/").split("/")[1:]
+        if path[:1] != ["api"] or len(path) < 2:
+            raise HttpError(404, "not found")
+
+        if method == "GET":
+            if path[1:] == ["state"]:
+                if "after" in query:
+                    await self._wait_for_change(_int(query["after"]), self.long_poll_timeout)
+                _, body = self.snapshot.encoded()
+                await self._respond(writer, 200, body, keep_alive)
+            elif path[1:] == ["events"]:
+                await self._stream_events(writer)
+                return False
+            elif path[1:] == ["presets"]:
+                await self._respond(writer, 200, self._list_presets(query), keep_alive)
+            else:
+                raise HttpError(404, "not found")
+            return keep_alive
+
+        if method == "POST":
+            if len(path) != 3 or path[1] not in self.commands:
+                raise HttpError(404, "not found")
+            value = _int(path[2])
+            self._check_argument(path[1], value)
+            self.commands[path[1]](value)
+            await self._respond(writer, 202, {"accepted": path[1], "value": value}, keep_alive)
+            return keep_alive
+
+        raise HttpError(405, "method not allowed")
+
+
+    def _check_argument(self, command: str, value: int) -> None:
+        limits = dict(
+            play=self.snapshot.get("presets", 0),
+            page=self.snapshot.get("pages", 0),
+            volume=101,
+            pause=2,
+            # the relay plays the oldest recorded byte at most
+            delay=24 * 3600
+            )
+        if not 0 <= value < limits.get(command, 0):
+            raise HttpError(400, f"{command} out of range: {value}")
+
+
+    def _list_presets(self, query: dict) -> dict:
+        first = max(0, _int(query.get("first", "0")))
+        count = max(0, min(_int(query.get("count", "100")), 1000))
+        catalog = self.snapshot.catalog
+        stations = catalog.get_range(first, count) if catalog is not None else []
+        return dict(
+            total=len(catalog) if catalog is not None else 0,
+            first=first,
+            presets=[dict(number=first + idx, name=st[Key.NAME]) for idx, st in enumerate(stations)]
+            )
+
+
+    async def _stream_events(self, writer: asyncio.StreamWriter) -> None:
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                     b"Connection: close\r\n\r\nretry: 3000\n\n")
+        version = -1
+        while not self._stopped.is_set():
+            if self.snapshot.version > version:
+                version, body = self.snapshot.encoded()
+                writer.write(b"id: %d\ndata: %s\n\n" % (version, body))
+            elif not await self._wait_for_change(version, KEEPALIVE_INTERVAL):
+                writer.write(b": keep-alive\n\n")
+            await writer.drain()
+
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, body: Any, keep_alive: bool) -> None:
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8")
+        head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+
+
+def _int(value: str) -> int:
+    try:
+        return int(value)
+    except ValueError:
+        raise HttpError(400, f"not a number: '{value}'") from None
+
+
+
+def _token_matches(given: str, expected: str) -> bool:
+    # in constant time, the time taken doesn't tell how much of the token was right
+    return hmac.compare_digest(given.encode(), expected.encode())
@@ -0,0 +1,287 @@
+"""
+Minimalist Internet Radio - resolving station URLs to direct stream URLs
+
+Station URLs often point to .pls/.m3u playlists or redirectors. The
+StreamResolver follows them once and caches the final stream URL on disk,
+so MPD gets a direct stream URL when a preset is tapped.
+"""
+
+from typing import Any
+
+import http.client
+import json
+import logging
+import os
+import pathlib
+import queue
+import socket
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+from mira_config import MiraConfig
+from helpers import ensure_dir_exists
+
+
+PLS_TYPES = ("audio/x-scpls", "application/pls+xml")
+M3U_TYPES = ("audio/x-mpegurl", "audio/mpegurl", "application/x-mpegurl", "application/vnd.apple.mpegurl")
+STREAM_TYPES = ("audio/", "application/ogg", "video/")
+
+MAX_PLAYLIST_SIZE = 64 * 1024
+SNIFF_SIZE = 512
+
+
+class ResolveError(Exception):
+    """ A station URL could not be resolved """
+
+
+def parse_playlist(text: str, base_url: str) -> list[str]:
+    """ Return the stream URLs listed in a .pls or .m3u playlist.
+        An HLS playlist is a stream by itself and resolves to its own URL. """
+    lines = [line.strip() for line in text.splitlines()]
+    if any(line.startswith("#EXT-X-") for line in lines):
+        return [base_url]
+
+    urls = []
+    if any(line.lower() == "[playlist]" for line in lines):
+        for line in lines:
+            key, sep, value = line.partition("=")
+            if sep and key.lower().startswith("file") and value:
+                urls.append(urllib.parse.urljoin(base_url, value.strip()))
+    else:
+        for line in lines:
+            if line and not line.startswith("#"):
+                urls.append(urllib.parse.urljoin(base_url, line))
+    return urls
+
+
+
+class DnsCache:
+    """ Caches host name lookups for the resolver's own HTTP requests """
+
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+        # host -> (timestamp, [addresses])
+        self.entries = {}
+        self._lock = threading.Lock()
+
+
+    def lookup(self, host: str, port: int) -> list[str]:
+        with self._lock:
+            entry = self.entries.get(host)
+        if entry is not None and time.time() - entry[0] < self.ttl:
+            return entry[1]
+
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        with self._lock:
+            self.entries[host] = (time.time(), addresses)
+        return addresses
+
+
+    def create_connection(self, address: tuple, timeout: Any = socket._GLOBAL_DEFAULT_TIMEOUT,
+                          source_address: Any = None) -> socket.socket:
+        """ Drop-in replacement for socket.create_connection using cached lookups. """
+        host, port = address
+        error = None
+        for ip in self.lookup(host, port):
+            try:
+                return socket.create_connection((ip, port), timeout, source_address)
+            except OSError as e:
+                error = e
+        with self._lock:
+            self.entries.pop(host, None)
+        raise error or OSError(f"No address for {host}")
+
+
+
+class _CachedDnsHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args: Any, dns: DnsCache, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._create_connection = dns.create_connection
+
+
+class _CachedDnsHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, *args: Any, dns: DnsCache, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._create_connection = dns.create_connection
+
+
+class _CachedDnsHTTPHandler(urllib.request.HTTPHandler):
+    def __init__(self, dns: DnsCache) -> None:
+        super().__init__()
+        self.dns = dns
+
+    def http_open(self, req: urllib.request.Request) -> Any:
+        return self.do_open(lambda *args, **kwargs: _CachedDnsHTTPConnection(*args, dns=self.dns, **kwargs), req)
+
+
+class _CachedDnsHTTPSHandler(urllib.request.HTTPSHandler):
+    def __init__(self, dns: DnsCache) -> None:
+        super().__init__()
+        self.dns = dns
+
+    def https_open(self, req: urllib.request.Request) -> Any:
+        return self.do_open(lambda *args, **kwargs: _CachedDnsHTTPSConnection(*args, dns=self.dns, **kwargs), req,
+                            context=self._context)
+
+
+
+class StreamResolver:
+    """ Resolves station URLs to direct stream URLs with an on-disk cache
+
+        Entries older than Resolver.REFRESH_AFTER are refreshed in the
+        background, entries older than Resolver.TTL are resolved again
+        before use. If resolving fails, the original URL is used and the
+        URL isn't tried again for Resolver.RETRY_AFTER seconds. """
+
+    def __init__(self, config: MiraConfig) -> None:
+        self.ttl = config.Resolver.TTL
+        self.refresh_after = config.Resolver.REFRESH_AFTER
+        self.timeout = config.Resolver.TIMEOUT
+        self.max_depth = config.Resolver.MAX_DEPTH
+        self.retry_after = config.Resolver.RETRY_AFTER
+        self.cache_file = pathlib.Path(config.Resolver.CACHE_FILE).expanduser()
+
+        self.dns = DnsCache(config.Resolver.DNS_TTL)
+        self._opener = urllib.request.build_opener(_CachedDnsHTTPHandler(self.dns), _CachedDnsHTTPSHandler(self.dns))
+        # station url -> dict(stream=..., resolved=timestamp)
+        self.entries = {}
+        # station url -> time.time() of the last failure, kept in memory only
+        self.failures = {}
+        self._refreshing = set()
+        # background refreshes run one after the other on one worker thread
+        self._queue = queue.SimpleQueue()
+        self._worker = None
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._load()
+
+
+    def resolve(self, url: str) -> str:
+        """ Return the direct stream URL for a station URL. Blocks only if there's no fresh entry. """
+        with self._lock:
+            entry = self.entries.get(url)
+        age = time.time() - entry["resolved"] if entry is not None else None
+
+        if age is not None and age < self.ttl:
+            if age >= self.refresh_after:
+                self.refresh_in_background([url])
+            return entry["stream"]
+        if self._failed_recently(url):
+            return url
+
+        try:
+            return self._resolve_and_store(url)
+        except ResolveError as e:
+            logging.warning("Cannot resolve '%s': %s", url, e)
+            return url
+
+
+    def invalidate(self, url: str) -> None:
+        """ Forget the stream URL and a failure, the next resolve() resolves again. """
+        with self._lock:
+            self.entries.pop(url, None)
+            self.failures.pop(url, None)
+
+
+    def refresh_in_background(self, urls: list[str]) -> None:
+        """ Resolve the given URLs on a background thread unless they are fresh already. """
+        with self._lock:
+            now = time.time()
+            todo = [url for url in urls
+                    if url not in self._refreshing
+                    and now - self.failures.get(url, 0) >= self.retry_after
+                    and (url not in self.entries or now - self.entries[url]["resolved"] >= self.refresh_after)]
+            self._refreshing.update(todo)
+            for url in todo:
+                self._queue.put(url)
+            if todo and self._worker is None:
+                self._worker = threading.Thread(target=self._refresh, name="mira-resolver", daemon=True)
+                self._worker.start()
+
+
+    def _refresh(self) -> None:
+        while True:
+            url = self._queue.get()
+            try:
+                self._resolve_and_store(url)
+            except ResolveError as e:
+                logging.warning("Background refresh of '%s' failed: %s", url, e)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(url)
+
+
+    def _failed_recently(self, url: str) -> bool:
+        with self._lock:
+            return time.time() - self.failures.get(url, 0) < self.retry_after
+
+
+    def _resolve_and_store(self, url: str) -> str:
+        try:
+            stream = self._resolve(url, self.max_depth)
+        except ResolveError:
+            with self._lock:
+                self.failures[url] = time.time()
+            raise
+        logging.info("Resolved '%s' to '%s'", url, stream)
+        with self._lock:
+            self.entries[url] = dict(stream=stream, resolved=time.time())
+            self.failures.pop(url, None)
+        self._save()
+        return stream
+
+
+    def _resolve(self, url: str, depth: int) -> str:
+        if urllib.parse.urlsplit(url).scheme not in ("http", "https"):
+            return url
+
+        request = urllib.request.Request(url, headers={"User-Agent": "mira", "Icy-MetaData": "0"})
+        try:
+            with self._opener.open(request, timeout=self.timeout) as response:
+                final_url = response.geturl()
+                content_type = response.headers.get_content_type().lower()
+                path = urllib.parse.urlsplit(final_url).path.lower()
+
+                if content_type in PLS_TYPES + M3U_TYPES or path.endswith((".pls", ".m3u", ".m3u8")):
+                    text = response.read(MAX_PLAYLIST_SIZE).decode("utf-8", errors="replace")
+                elif content_type.startswith(STREAM_TYPES):
+                    return final_url
+                else:
+                    text = response.read(SNIFF_SIZE).decode("utf-8", errors="replace")
+                    if not text.lstrip().startswith(("[playlist]", "#EXTM3U")):
+                        return final_url
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            raise ResolveError(str(e)) from e
+
+        entries = parse_playlist(text, final_url)
+        if not entries:
+            raise ResolveError(f"empty playlist at '{final_url}'")
+        if entries[0] == final_url or depth <= 1:
+            return entries[0]
+        return self._resolve(entries[0], depth - 1)
+
+
+    def _load(self) -> None:
+        try:
+            with open(self.cache_file, "r") as infile:
+                self.entries = json.load(infile)
+        except Exception as e:
+            logging.info("Stream cache not loaded. %s", e)
+            self.entries = {}
+
+
+    def _save(self) -> None:
+        with self._lock:
+            data = json.dumps(self.entries)
+        ensure_dir_exists(self.cache_file)
+        tmpfile = self.cache_file.with_name(self.cache_file.name + ".tmp")
+        with self._save_lock:
+            try:
+                with open(tmpfile, "w") as outfile:
+                    outfile.write(data)
+                os.replace(tmpfile, self.cache_file)
+            except OSError as e:
+                logging.error("Couldn't save stream cache. %s", e)
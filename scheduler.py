@@ -0,0 +1,203 @@
+"""
+Minimalist Internet Radio - one timer for all periodic work
+
+Periodic jobs don't get timers of their own. The scheduler keeps a single
+timer for the next due job, and when it fires it runs every job that is
+due within its window, so jobs due close together share one wakeup. Jobs
+can be disabled, rescheduled and backed off, and the scheduler counts how
+often each one ran and how long it took.
+"""
+
+from typing import Callable
+
+import logging
+import time
+
+from mira_config import MiraConfig
+from metrics import Metrics
+
+
+class Job:
+    """ A periodic job of the TickScheduler """
+
+    __slots__ = ("name", "function", "interval", "priority", "window", "max_backoff",
+                 "enabled", "due", "factor", "runs", "total_time", "max_time")
+
+    def __init__(self, name: str, function: Callable, interval: int, priority: int, window: float, max_backoff: int) -> None:
+        self.name = name
+        self.function = function
+        # milliseconds between two runs
+        self.interval = interval
+        # higher runs first within one wakeup
+        self.priority = priority
+        # part of the interval the job may run early, to share a wakeup with other jobs
+        self.window = window
+        # limit of the backoff, in multiples of the interval
+        self.max_backoff = max_backoff
+
+        self.enabled = False
+        # time.monotonic() of the next run
+        self.due = 0.0
+        # backoff multiplier of the interval
+        self.factor = 1
+        self.runs = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+
+    def current_interval(self) -> int:
+        return self.interval * self.factor
+
+
+    def earliest(self) -> float:
+        """ time.monotonic() from which the job may run """
+        return self.due - self.current_interval() * self.window / 1000
+
+
+
+class TickScheduler:
+    """ Runs the periodic jobs of the app from one timer on the GUI thread """
+
+    def __init__(self, config: MiraConfig, metrics: Metrics|None = None) -> None:
+        self.window = config.Scheduler.WINDOW
+        self.max_backoff = config.Scheduler.MAX_BACKOFF
+        # after(time_ms, function, args) and cancel(function) of the GUI, see attach()
+        self.after = None
+        self.cancel = None
+        self.metrics = metrics
+        self.jobs = {}
+        self.running = False
+        # time.monotonic() of the pending wakeup, None if there is none
+        self.wakeup_at = None
+        # wakeups superseded by an earlier one are ignored
+        self.generation = 0
+        self.wakeups = 0
+
+
+    def attach(self, after: Callable, cancel: Callable) -> None:
+        """ Set the timer functions of the GUI, e.g. of guizero's App. Jobs run after start(). """
+        self.after = after
+        self.cancel = cancel
+
+
+    def add(self, name: str, interval: int, function: Callable, priority: int = 0, window: float|None = None,
+            enabled: bool = True, delay: int|None = None) -> Job:
+        """ Run function() every interval milliseconds, the first time after delay (default: interval).
+            window is the part of the interval the job may run early (default: Scheduler.WINDOW). """
+        job = Job(name, function, interval, priority, self.window if window is None else window, self.max_backoff)
+        self.jobs[name] = job
+        if enabled:
+            self.enable(name, delay)
+        return job
+
+
+    def enable(self, name: str, delay: int|None = None) -> None:
+        """ Run the job after delay milliseconds (default: its interval) and periodically from then on. """
+        job = self.jobs[name]
+        job.enabled = True
+        job.due = time.monotonic() + (job.current_interval() if delay is None else delay) / 1000
+        self._wake_up()
+
+
+    def disable(self, name: str) -> None:
+        self.jobs[name].enabled = False
+
+
+    def set_interval(self, name: str, interval: int) -> None:
+        """ Change the interval, e.g. after a config reload. Takes effect after the next run. """
+        self.jobs[name].interval = interval
+
+
+    def backoff(self, name: str) -> None:
+        """ Double the interval of the job, up to Scheduler.MAX_BACKOFF times the interval. """
+        job = self.jobs[name]
+        if job.factor * 2 <= job.max_backoff:
+            job.factor *= 2
+            logging.debug("Job '%s' backs off to %s ms", name, job.current_interval())
+        if job.enabled:
+            job.due = max(job.due, time.monotonic() + job.current_interval() / 1000)
+
+
+    def reset_backoff(self, name: str) -> None:
+        job = self.jobs[name]
+        if job.factor != 1:
+            job.factor = 1
+            if job.enabled:
+                self.enable(name)
+
+
+    def start(self) -> None:
+        """ Start running jobs, attach() must have been called. """
+        self.running = True
+        self._wake_up()
+
+
+    def stop(self) -> None:
+        self.running = False
+        if self.wakeup_at is not None:
+            self.cancel(self._on_tick)
+            self.wakeup_at = None
+
+
+    def stats(self) -> dict:
+        """ Runs and run times (ms) per job. """
+        return {
+            job.name: dict(
+                enabled=job.enabled,
+                interval=job.current_interval(),
+                runs=job.runs,
+                mean_ms=round(job.total_time / job.runs * 1000, 3) if job.runs else None,
+                max_ms=round(job.max_time * 1000, 3)
+                )
+            for job in self.jobs.values()
+            }
+
+
+    def _wake_up(self) -> None:
+        # the timer is set for the earliest due job, unless it fires earlier already
+        if not self.running:
+            return
+        due = [job.due for job in self.jobs.values() if job.enabled]
+        if not due:
+            return
+        wakeup_at = min(due)
+        if self.wakeup_at is not None and self.wakeup_at <= wakeup_at:
+            return
+        if self.wakeup_at is not None:
+            self.cancel(self._on_tick)
+        self.wakeup_at = wakeup_at
+        self.generation += 1
+        delay = max(0, int((wakeup_at - time.monotonic()) * 1000 + 0.999))
+        self.after(delay, self._on_tick, args=[self.generation])
+
+
+    def _on_tick(self, generation: int) -> None:
+        if generation != self.generation or not self.running:
+            return
+        self.wakeup_at = None
+        self.wakeups += 1
+
+        # everything due within its window runs now, the most important job first
+        now = time.monotonic()
+        due = [job for job in self.jobs.values() if job.enabled and job.earliest() <= now]
+        for job in sorted(due, key=lambda job: (-job.priority, job.due)):
+            # a job may have been disabled or rescheduled by one that ran before
+            if not job.enabled or job.earliest() > now:
+                continue
+            job.due = now + job.current_interval() / 1000
+            self._run(job)
+        self._wake_up()
+
+
+    def _run(self, job: Job) -> None:
+        start = time.monotonic()
+        try:
+            job.function()
+        except Exception:
+            logging.exception("Periodic job '%s' failed", job.name)
+        duration = time.monotonic() - start
+        job.runs += 1
+        job.total_time += duration
+        job.max_time = max(job.max_time, duration)
+        if self.metrics is not None:
+            self.metrics.observe("tick", duration, label=job.name)
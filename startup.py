@@ -0,0 +1,56 @@
+"""
+Minimalist Internet Radio - startup phase timings
+
+Import this module first, its import time is taken as the start of mira.
+"""
+
+import datetime
+import json
+import logging
+import pathlib
+import time
+
+PROCESS_START = time.monotonic()
+
+
+class PhaseTimer:
+    """ Records the time of startup phases relative to the start of mira """
+
+    def __init__(self, timings_file: str|None) -> None:
+        self.timings_file = timings_file
+        # phase -> seconds since PROCESS_START
+        self.phases = {}
+        self.saved = False
+
+
+    def mark(self, phase: str, timestamp: float|None = None) -> None:
+        """ Record a phase as reached now, or at the given time.monotonic() timestamp. """
+        if phase in self.phases:
+            return
+        if timestamp is None:
+            timestamp = time.monotonic()
+        self.phases[phase] = timestamp - PROCESS_START
+        logging.info("Startup phase '%s' reached after %.3fs", phase, self.phases[phase])
+
+
+    def has(self, phase: str) -> bool:
+        return phase in self.phases
+
+
+    def save(self) -> None:
+        """ Append the timings of this start as one JSON line to the timings file. """
+        if self.saved or not self.timings_file:
+            return
+        self.saved = True
+
+        filepath = pathlib.Path(self.timings_file).expanduser()
+        record = dict(
+            date=datetime.datetime.now().isoformat(timespec="seconds"),
+            phases={phase: round(seconds, 3) for phase, seconds in self.phases.items()}
+            )
+        try:
+            filepath.parent.mkdir(parents=True, exist_ok=True)
+            with open(filepath, "a") as outfile:
+                outfile.write(json.dumps(record) + "\n")
+        except OSError as e:
+            logging.error("Couldn't save startup timings. %s", e)
@@ -0,0 +1,162 @@
+"""
+Minimalist Internet Radio - persistent application state
+
+The state is kept in memory. Changes are written to disk at most once per
+write delay by a timer thread, atomically via a temporary file, fsync and
+rename, so a power cut leaves either the old or the new file behind.
+The Snapshot is what remote control clients see of it.
+"""
+
+from typing import Any
+
+import json
+import logging
+import os
+import pathlib
+import threading
+
+
+class StateStore:
+    """ In-memory key/value state with debounced, atomic write-behind to a JSON file """
+
+    def __init__(self, state_file: str, write_delay: float) -> None:
+        self.filepath = pathlib.Path(state_file).expanduser()
+        self.write_delay = write_delay
+        self.data = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._timer = None
+        self._dirty = False
+
+
+    def load(self) -> dict:
+        """ Read the state file, an unreadable file leaves the state empty. """
+        try:
+            with open(self.filepath, "r") as infile:
+                data = json.load(infile)
+        except Exception as e:
+            logging.info("State file doesn't exist yet. %s", e)
+            data = {}
+        with self._lock:
+            self.data = data if isinstance(data, dict) else {}
+        return self.data
+
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            return self.data.get(key, default)
+
+
+    def update(self, values: dict) -> None:
+        """ Change values in memory and schedule a write, unchanged values are not written. """
+        with self._lock:
+            changed = {key: value for key, value in values.items() if self.data.get(key) != value}
+            if not changed:
+                return
+            self.data.update(changed)
+            self._schedule()
+
+
+    def append(self, key: str, value: Any, max_len: int) -> None:
+        """ Add a value to the front of a list, e.g. a history, dropping older duplicates. """
+        with self._lock:
+            items = [item for item in self.data.get(key, []) if item != value]
+            self.data[key] = ([value] + items)[:max_len]
+            self._schedule()
+
+
+    def flush(self) -> None:
+        """ Write pending changes now, e.g. on shutdown. """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        self._write()
+
+
+    def _schedule(self) -> None:
+        # called with the lock held, changes within the write delay are coalesced
+        self._dirty = True
+        if self._timer is None:
+            self._timer = threading.Timer(self.write_delay, self._on_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+
+    def _on_timer(self) -> None:
+        with self._lock:
+            self._timer = None
+        self._write()
+
+
+    def _write(self) -> None:
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                self._dirty = False
+                text = json.dumps(self.data)
+
+            tmpfile = self.filepath.with_name(self.filepath.name + ".tmp")
+            try:
+                self.filepath.parent.mkdir(parents=True, exist_ok=True)
+                with open(tmpfile, "w") as outfile:
+                    outfile.write(text)
+                    outfile.flush()
+                    os.fsync(outfile.fileno())
+                os.replace(tmpfile, self.filepath)
+                _fsync_dir(self.filepath.parent)
+            except OSError as e:
+                logging.error("Couldn't save state. %s", e)
+                with self._lock:
+                    self._dirty = True
+
+
+
+class Snapshot:
+    """ Versioned copy of the app state, updated on the GUI thread and read by the server """
+
+    def __init__(self) -> None:
+        self.data = {}
+        self.version = 0
+        # catalog the presets are listed from, thread-safe for reading
+        self.catalog = None
+        # called on the updating thread after every change
+        self.on_change = None
+        self._json = None
+        self._lock = threading.Lock()
+
+
+    def update(self, **fields: Any) -> None:
+        with self._lock:
+            changed = {key: value for key, value in fields.items() if self.data.get(key) != value}
+            if not changed:
+                return
+            self.data.update(changed)
+            self.version += 1
+            self._json = None
+        if self.on_change is not None:
+            self.on_change()
+
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            return self.data.get(key, default)
+
+
+    def encoded(self) -> tuple[int, bytes]:
+        """ The version and its JSON, serialized once per version. """
+        with self._lock:
+            if self._json is None:
+                self._json = json.dumps(dict(self.data, version=self.version)).encode("utf-8")
+            return self.version, self._json
+
+
+
+def _fsync_dir(path: pathlib.Path) -> None:
+    # makes the rename durable
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,77 @@
+"""
+Minimalist Internet Radio - shared pytest fixtures
+
+The modules live in the repository root, which is put on the import path
+here. The station tests run against a local HTTP server that serves fixed
+responses, so they don't need network access.
+"""
+
+from typing import Any, Iterator
+
+import http.server
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeStationServer(http.server.ThreadingHTTPServer):
+    """ Serves the responses in routes, path -> (status, headers, body),
+        status None sends the body as it is, e.g. a SHOUTcast 'ICY 200 OK' """
+
+    daemon_threads = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), _FakeStationHandler)
+        self.routes = {}
+        # paths in the order they were requested
+        self.requests = []
+
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}{path}"
+
+
+    def add(self, path: str, body: bytes|str = b"", content_type: str = "text/plain", status: int = 200,
+            headers: dict|None = None) -> str:
+        """ Serve the body at path and return its URL. """
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.routes[path] = (status, dict(headers or {}, **{"Content-Type": content_type}), body)
+        return self.url(path)
+
+
+
+class _FakeStationHandler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self) -> None:
+        self.server.requests.append(self.path)
+        status, headers, body = self.server.routes.get(self.path, (404, {}, b""))
+        if status is None:
+            self.wfile.write(body)
+            self.close_connection = True
+            return
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+
+@pytest.fixture
+def station_server() -> Iterator[FakeStationServer]:
+    server = FakeStationServer()
+    thread = threading.Thread(target=server.serve_forever, args=[0.05], daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
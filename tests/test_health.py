@@ -0,0 +1,144 @@
+"""
+Minimalist Internet Radio - tests of the station health checks
+"""
+
+import socket
+import threading
+
+import pytest
+
+from constants import Key
+from health import HealthProber, ProbeResult, probe_stream
+from helpers import Preset
+from mira_config import MiraConfig
+
+
+TIMEOUT = 2.0
+
+
+@pytest.fixture
+def prober(monkeypatch) -> HealthProber:
+    monkeypatch.setattr(MiraConfig.Health, "TIMEOUT", TIMEOUT)
+    monkeypatch.setattr(MiraConfig.Health, "PARALLEL", 2)
+    return HealthProber(MiraConfig)
+
+
+def preset(url: str, *alt_urls: str) -> Preset:
+    return Preset(0, MiraConfig, {Key.NAME: "Station", Key.URL: url, Key.ALT_URLS: list(alt_urls)})
+
+
+def result(url: str, ok: bool|None, ttfb: float|None = None) -> ProbeResult:
+    probe = ProbeResult(url)
+    probe.ok = ok
+    probe.ttfb = ttfb
+    return probe
+
+
+def unused_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_stream(station_server):
+    url = station_server.add("/live", b"\xff\xfb", content_type="audio/mpeg", headers={"icy-br": "128,128"})
+    probe = probe_stream(url, TIMEOUT)
+    assert probe.ok is True
+    assert probe.status == 200
+    assert probe.bitrate == 128
+    assert 0 <= probe.connect_time <= probe.ttfb
+
+
+def test_shoutcast_v1(station_server):
+    url = station_server.add("/", b"ICY 200 OK\r\nicy-br: 64\r\n\r\n\xff\xfb", status=None)
+    probe = probe_stream(url, TIMEOUT)
+    assert probe.ok is True
+    assert probe.status == 200
+
+
+def test_redirect(station_server):
+    station_server.add("/live", b"\xff\xfb", content_type="audio/mpeg")
+    url = station_server.add("/go", status=302, headers={"Location": "/live"})
+    probe = probe_stream(url, TIMEOUT)
+    assert probe.ok is True
+    assert station_server.requests == ["/go", "/live"]
+
+
+def test_too_many_redirects(station_server):
+    url = station_server.add("/loop", status=302, headers={"Location": "/loop"})
+    probe = probe_stream(url, TIMEOUT)
+    assert probe.ok is False
+    assert probe.error == "too many redirects"
+
+
+def test_http_error(station_server):
+    probe = probe_stream(station_server.url("/missing"), TIMEOUT)
+    assert probe.ok is False
+    assert probe.status == 404
+    assert probe.error.startswith("HTTP 404")
+
+
+def test_no_data(station_server):
+    url = station_server.add("/empty", b"", content_type="audio/mpeg")
+    probe = probe_stream(url, TIMEOUT)
+    assert probe.ok is False
+    assert probe.error == "no data"
+
+
+def test_connection_refused():
+    probe = probe_stream(f"http://127.0.0.1:{unused_port()}/live", TIMEOUT)
+    assert probe.ok is False
+    assert probe.error
+
+
+def test_not_http():
+    probe = probe_stream("file:///music/radio.mp3", TIMEOUT)
+    assert probe.ok is None
+    assert probe.error == "not checked (file)"
+
+
+def test_probe_all(prober, station_server):
+    live = station_server.add("/live", b"\xff\xfb", content_type="audio/mpeg")
+    dead = station_server.url("/dead")
+    updates = []
+    prober.on_update = lambda: updates.append(True)
+
+    results = prober.probe_all([live, dead])
+    assert results[live].ok is True
+    assert results[dead].ok is False
+    assert prober.results == results
+    assert updates == [True]
+    assert prober.probe_all([]) == {}
+
+
+def test_is_dead(prober):
+    prober.results = {"http://a/": result("http://a/", False), "http://b/": result("http://b/", False),
+                      "http://c/": result("http://c/", True, 0.1)}
+    assert prober.is_dead(preset("http://a/", "http://b/"))
+    assert not prober.is_dead(preset("http://a/", "http://c/"))
+    # not checked yet
+    assert not prober.is_dead(preset("http://a/", "http://d/"))
+
+
+def test_best_url(prober):
+    prober.results = {"http://slow/": result("http://slow/", True, 0.5), "http://fast/": result("http://fast/", True, 0.1),
+                      "http://dead/": result("http://dead/", False), "http://dead2/": result("http://dead2/", False)}
+    assert prober.best_url(preset("http://dead/", "http://slow/", "http://fast/")) == "http://fast/"
+    assert prober.best_url(preset("http://dead/", "http://new/")) == "http://new/"
+    assert prober.best_url(preset("http://dead/")) == "http://dead/"
+    assert prober.best_url(preset("http://dead/", "http://dead2/")) == "http://dead/"
+
+
+def test_watch_checks_new_urls(prober, station_server):
+    live = station_server.add("/live", b"\xff\xfb", content_type="audio/mpeg")
+    checked = threading.Event()
+    prober.on_update = checked.set
+    prober.start()
+    try:
+        prober.watch([live, live])
+        assert prober.urls == [live]
+        assert checked.wait(5)
+        assert prober.results[live].ok is True
+    finally:
+        prober.stop()
+        prober.join(5)
@@ -0,0 +1,132 @@
+"""
+Minimalist Internet Radio - tests of the stream URL resolver
+"""
+
+import json
+import time
+
+import pytest
+
+from mira_config import MiraConfig
+from resolver import StreamResolver, parse_playlist
+
+
+@pytest.fixture
+def resolver(tmp_path, monkeypatch) -> StreamResolver:
+    monkeypatch.setattr(MiraConfig.Resolver, "CACHE_FILE", str(tmp_path / "stream_cache.json"))
+    monkeypatch.setattr(MiraConfig.Resolver, "TIMEOUT", 2.0)
+    return StreamResolver(MiraConfig)
+
+
+def test_parse_pls():
+    text = "[playlist]\nNumberOfEntries=2\nFile1=http://a.example/live\nTitle1=A\nfile2=/backup\n"
+    assert parse_playlist(text, "http://b.example/radio.pls") == ["http://a.example/live", "http://b.example/backup"]
+
+
+def test_parse_m3u_skips_comments_and_blank_lines():
+    text = "#EXTM3U\n#EXTINF:-1,Station\n\nhttp://a.example/live\nstream.mp3\n"
+    assert parse_playlist(text, "http://b.example/dir/radio.m3u") == ["http://a.example/live",
+                                                                      "http://b.example/dir/stream.mp3"]
+
+
+def test_parse_hls_is_a_stream():
+    text = "#EXTM3U\n#EXT-X-VERSION:3\n#EXT-X-STREAM-INF:BANDWIDTH=128000\nchunklist.m3u8\n"
+    assert parse_playlist(text, "http://b.example/live.m3u8") == ["http://b.example/live.m3u8"]
+
+
+def test_direct_stream(resolver, station_server):
+    url = station_server.add("/live", b"\xff\xfb", content_type="audio/mpeg")
+    assert resolver.resolve(url) == url
+
+
+def test_pls_playlist(resolver, station_server):
+    stream = station_server.add("/live", b"\xff\xfb", content_type="audio/mpeg")
+    url = station_server.add("/radio.pls", f"[playlist]\nFile1={stream}\n", content_type="audio/x-scpls")
+    assert resolver.resolve(url) == stream
+
+
+def test_nested_m3u_sniffed_from_content(resolver, station_server):
+    stream = station_server.add("/live", b"\xff\xfb", content_type="audio/mpeg")
+    inner = station_server.add("/inner", f"#EXTM3U\n{stream}\n")
+    outer = station_server.add("/outer", f"#EXTM3U\n{inner}\n")
+    assert resolver.resolve(outer) == stream
+
+
+def test_redirect(resolver, station_server):
+    stream = station_server.add("/live", b"\xff\xfb", content_type="audio/mpeg")
+    url = station_server.add("/go", status=302, headers={"Location": "/live"})
+    assert resolver.resolve(url) == stream
+
+
+def test_max_depth(resolver, station_server):
+    resolver.max_depth = 1
+    stream = station_server.add("/live", b"\xff\xfb", content_type="audio/mpeg")
+    inner = station_server.add("/inner.m3u", f"{stream}\n")
+    outer = station_server.add("/outer.m3u", f"{inner}\n")
+    assert resolver.resolve(outer) == inner
+
+
+def test_cached_and_saved(resolver, station_server, tmp_path):
+    stream = station_server.add("/live", b"\xff\xfb", content_type="audio/mpeg")
+    url = station_server.add("/radio.m3u", f"{stream}\n")
+    assert resolver.resolve(url) == stream
+    assert resolver.resolve(url) == stream
+    assert station_server.requests == ["/radio.m3u", "/live"]
+
+    with open(tmp_path / "stream_cache.json") as infile:
+        assert json.load(infile)[url]["stream"] == stream
+    assert StreamResolver(MiraConfig).resolve(url) == stream
+
+
+def test_failure_is_not_retried(resolver, station_server):
+    url = station_server.add("/radio.pls", "[playlist]\nNumberOfEntries=0\n", content_type="audio/x-scpls")
+    assert resolver.resolve(url) == url
+    assert url in resolver.failures
+    assert resolver.resolve(url) == url
+    assert station_server.requests == ["/radio.pls"]
+
+
+def test_failure_retried_after_retry_after(resolver, station_server):
+    url = station_server.add("/radio.pls", "[playlist]\nNumberOfEntries=0\n", content_type="audio/x-scpls")
+    assert resolver.resolve(url) == url
+    resolver.failures[url] -= resolver.retry_after
+    assert resolver.resolve(url) == url
+    assert station_server.requests == ["/radio.pls", "/radio.pls"]
+
+
+def test_invalidate(resolver, station_server):
+    first = station_server.add("/first", b"\xff\xfb", content_type="audio/mpeg")
+    url = station_server.add("/radio.m3u", f"{first}\n")
+    assert resolver.resolve(url) == first
+
+    second = station_server.add("/second", b"\xff\xfb", content_type="audio/mpeg")
+    station_server.add("/radio.m3u", f"{second}\n")
+    assert resolver.resolve(url) == first
+    resolver.invalidate(url)
+    assert resolver.resolve(url) == second
+
+
+def test_invalidate_forgets_failure(resolver, station_server):
+    url = station_server.add("/radio.pls", "[playlist]\nNumberOfEntries=0\n", content_type="audio/x-scpls")
+    resolver.resolve(url)
+    stream = station_server.add("/live", b"\xff\xfb", content_type="audio/mpeg")
+    station_server.add("/radio.pls", f"[playlist]\nFile1={stream}\n", content_type="audio/x-scpls")
+    assert resolver.resolve(url) == url
+    resolver.invalidate(url)
+    assert resolver.resolve(url) == stream
+
+
+def test_refresh_in_background(resolver, station_server):
+    first = station_server.add("/first", b"\xff\xfb", content_type="audio/mpeg")
+    url = station_server.add("/radio.m3u", f"{first}\n")
+    assert resolver.resolve(url) == first
+
+    second = station_server.add("/second", b"\xff\xfb", content_type="audio/mpeg")
+    station_server.add("/radio.m3u", f"{second}\n")
+    resolver.entries[url]["resolved"] -= resolver.refresh_after
+    # still fresh enough to be used, refreshed for the next time
+    assert resolver.resolve(url) == first
+    deadline = time.monotonic() + 5
+    while resolver.entries[url]["stream"] != second and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert resolver.resolve(url) == second
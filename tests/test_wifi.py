@@ -0,0 +1,86 @@
+"""
+Minimalist Internet Radio - tests of the Wi-Fi signal quality
+"""
+
+import pytest
+
+from wifi import WifiQualityProvider, parse_wireless_stats
+
+
+HEADER = ("Inter-| sta-|   Quality        |   Discarded packets               | Missed | WE\n"
+          " face | tus | link level noise |  nwid  crypt   frag  retry   misc | beacon | 22\n")
+
+
+def wireless_stats(**links: float) -> str:
+    return HEADER + "".join(f" {name}: 0000   {link}.  -56.  -256        0      0      0      0     13        0\n"
+                            for name, link in links.items())
+
+
+@pytest.fixture
+def stats_file(tmp_path):
+    return tmp_path / "wireless"
+
+
+def test_parse():
+    assert parse_wireless_stats(wireless_stats(wlan0=54, wlan1=70)) == {"wlan0": 54.0, "wlan1": 70.0}
+
+
+def test_parse_no_interfaces():
+    assert parse_wireless_stats(HEADER) == {}
+    assert parse_wireless_stats("") == {}
+
+
+def test_parse_skips_broken_lines():
+    text = wireless_stats(wlan0=54) + " wlan1: 0000\n wlan2: 0000   n/a  -56.\ngarbage\n"
+    assert parse_wireless_stats(text) == {"wlan0": 54.0}
+
+
+def test_quality_of_interface(stats_file):
+    stats_file.write_text(wireless_stats(wlan0=35, wlan1=70))
+    provider = WifiQualityProvider("wlan1", str(stats_file), 70, 1)
+    assert provider.quality() == 100
+    provider.close()
+
+
+def test_quality_of_first_interface(stats_file):
+    stats_file.write_text(wireless_stats(wlan0=35, wlan1=70))
+    provider = WifiQualityProvider(None, str(stats_file), 70, 1)
+    assert provider.quality() == 50
+    provider.close()
+
+
+def test_quality_is_clamped(stats_file):
+    stats_file.write_text(wireless_stats(wlan0=94))
+    provider = WifiQualityProvider("wlan0", str(stats_file), 70, 1)
+    assert provider.quality() == 100
+    provider.close()
+
+
+def test_quality_is_smoothed(stats_file):
+    provider = WifiQualityProvider("wlan0", str(stats_file), 100, 3)
+    qualities = []
+    for link in (30, 60, 90, 90):
+        stats_file.write_text(wireless_stats(wlan0=link))
+        qualities.append(provider.quality())
+    assert qualities == [30, 45, 60, 80]
+    provider.close()
+
+
+def test_missing_interface_resets_smoothing(stats_file):
+    provider = WifiQualityProvider("wlan0", str(stats_file), 100, 3)
+    stats_file.write_text(wireless_stats(wlan0=30))
+    assert provider.quality() == 30
+    stats_file.write_text(wireless_stats(wlan1=30))
+    assert provider.quality() == -1
+    stats_file.write_text(wireless_stats(wlan0=90))
+    assert provider.quality() == 90
+    provider.close()
+
+
+def test_missing_stats_file(stats_file):
+    provider = WifiQualityProvider(None, str(stats_file), 70, 3)
+    assert provider.read_link_qualities() == {}
+    assert provider.quality() == -1
+    stats_file.write_text(wireless_stats(wlan0=70))
+    assert provider.quality() == 100
+    provider.close()
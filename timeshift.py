@@ -0,0 +1,315 @@
+"""
+Minimalist Internet Radio - time-shifted live radio
+
+The current station is recorded into a ring buffer, a memory-mapped file of
+fixed size (TimeShift.BUFFER_SIZE), and MPD plays it from a local relay
+instead of from the station:
+
+    station --Recorder--> RingBuffer --relay (HTTP)--> MPD
+
+Pausing MPD keeps its connection to the relay open and stops reading, the
+recording goes on, so playback resumes where it was paused. Rewinding and
+going back to live reconnect MPD at another offset of the recording. Data
+is sent from the mapped file without copies. A pause longer than the
+buffer resumes at the oldest byte still kept.
+
+    http://<HOST>:<PORT>/stream?from=<offset>    the recording from a stream offset on
+"""
+
+import http.client
+import http.server
+import logging
+import mmap
+import os
+import pathlib
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+from mira_config import MiraConfig
+
+
+# bytes read from the station and sent to MPD at once
+CHUNK_SIZE = 16 * 1024
+# reads this close to the oldest byte are copied, the recorder overwrites them next
+COPY_MARGIN = 4 * CHUNK_SIZE
+# seconds until a failed recording is started again
+RETRY_DELAY = 2.0
+# bytes per second assumed until the rate of the station is known (128 kbit/s)
+DEFAULT_BYTE_RATE = 16000
+
+
+class RingBuffer:
+    """ The last size bytes of a stream in a memory-mapped file
+
+        Bytes are addressed by their offset in the stream, counted across
+        stations. One writer, any number of readers. """
+
+    def __init__(self, path: pathlib.Path, size: int) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            # the disk use stays at size bytes
+            os.ftruncate(fd, size)
+            self.map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self.size = size
+        # offset of the first byte of the current recording
+        self.start = 0
+        # offset after the last byte written
+        self.end = 0
+        # incremented when a new recording starts
+        self.generation = 0
+        self.closed = False
+        self._cond = threading.Condition()
+
+
+    @property
+    def oldest(self) -> int:
+        """ offset of the oldest byte kept """
+        return max(self.start, self.end - self.size)
+
+
+    def restart(self) -> None:
+        """ Start a new recording, the bytes of the previous one are no longer read. """
+        with self._cond:
+            self.start = self.end
+            self.generation += 1
+            self._cond.notify_all()
+
+
+    def write(self, data: bytes, generation: int) -> None:
+        """ Append data to the recording of the given generation, ignored if a newer one started. """
+        # only the last size bytes survive anyway
+        view = memoryview(data)[-self.size:]
+        with self._cond:
+            if generation != self.generation or self.closed:
+                return
+            pos = (self.end + len(data) - len(view)) % self.size
+            first = min(len(view), self.size - pos)
+            self.map[pos:pos + first] = view[:first]
+            self.map[:len(view) - first] = view[first:]
+            self.end += len(data)
+            self._cond.notify_all()
+
+
+    def read(self, offset: int, max_size: int, timeout: float) -> tuple[int, memoryview|None]:
+        """ Wait up to timeout seconds for data at offset. Returns the offset read from,
+            later than the given one if that was overwritten meanwhile, and a view of the
+            mapped file (None if there is no data), which the caller has to release().
+            Data about to be overwritten is returned as a copy instead. """
+        with self._cond:
+            self._cond.wait_for(lambda: self.closed or self.end > max(offset, self.oldest), timeout)
+            offset = max(offset, self.oldest)
+            if self.closed or self.end <= offset:
+                return offset, None
+            # up to the end of the file, the rest comes with the next read
+            pos = offset % self.size
+            length = min(max_size, self.end - offset, self.size - pos)
+            if offset - self.oldest < COPY_MARGIN and self.end - self.oldest >= self.size:
+                return offset, memoryview(self.map[pos:pos + length])
+        return offset, memoryview(self.map)[pos:pos + length]
+
+
+    def close(self) -> None:
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        try:
+            self.map.close()
+        except BufferError:
+            # a reader still sends from the map, it is closed when the last view is released
+            pass
+
+
+
+class Recorder(threading.Thread):
+    """ Copies a station's stream into the ring buffer, reconnecting until stopped """
+
+    def __init__(self, url: str, ring: RingBuffer, timeout: float) -> None:
+        super().__init__(name="mira-timeshift", daemon=True)
+        self.url = url
+        self.ring = ring
+        # the recording this one writes to
+        self.generation = ring.generation
+        self.timeout = timeout
+        # set once the station answered, or failed to
+        self.connected = threading.Event()
+        # None while the station didn't answer
+        self.content_type = None
+        self._icy_rate = None
+        self._recording_since = None
+        self._recorded = 0
+        self._stop_event = threading.Event()
+
+
+    @property
+    def byte_rate(self) -> int:
+        """ bytes per second of the stream, from the icy-br header or measured """
+        if self._icy_rate:
+            return self._icy_rate
+        elapsed = time.monotonic() - self._recording_since if self._recording_since is not None else 0
+        if elapsed >= 2.0 and self._recorded:
+            return int(self._recorded / elapsed)
+        return DEFAULT_BYTE_RATE
+
+
+    def stop(self) -> None:
+        # ends within timeout seconds, when the next read returns
+        self._stop_event.set()
+
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            request = urllib.request.Request(self.url, headers={"User-Agent": "mira", "Icy-MetaData": "0"})
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    self.content_type = response.headers.get("Content-Type", "audio/mpeg")
+                    bitrate = response.headers.get("icy-br", "").split(",")[0].strip()
+                    if bitrate.isdigit():
+                        self._icy_rate = int(bitrate) * 125
+                    self.connected.set()
+                    if self._recording_since is None:
+                        self._recording_since = time.monotonic()
+
+                    while not self._stop_event.is_set():
+                        data = response.read1(CHUNK_SIZE)
+                        if not data:
+                            break
+                        self.ring.write(data, self.generation)
+                        self._recorded += len(data)
+                if not self._stop_event.is_set():
+                    logging.warning("Time-shift recording of '%s' ended", self.url)
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                logging.warning("Time-shift recording of '%s' failed: %s", self.url, e)
+            # the relay doesn't wait for a station that doesn't answer
+            self.connected.set()
+            self._stop_event.wait(RETRY_DELAY)
+
+
+
+class _RelayHandler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self) -> None:
+        relay = self.server.relay
+        url = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        recorder = relay.recorder
+        if url.path != "/stream" or recorder is None:
+            self.send_error(404)
+            return
+        recorder.connected.wait(relay.timeout)
+        if recorder.content_type is None:
+            self.send_error(502, "station not reachable")
+            return
+        try:
+            offset = int(query.get("from", ["0"])[-1])
+        except ValueError:
+            self.send_error(400)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", recorder.content_type)
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        # ends when MPD disconnects or another station is recorded
+        ring = relay.ring
+        generation = ring.generation
+        try:
+            while ring.generation == generation and not ring.closed:
+                offset, view = ring.read(offset, CHUNK_SIZE, 1.0)
+                if view is None:
+                    continue
+                sent = len(view)
+                try:
+                    # blocks while MPD is paused and doesn't read
+                    self.wfile.write(view)
+                finally:
+                    view.release()
+                if offset < ring.oldest:
+                    # overwritten while it was sent, a pause longer than the buffer
+                    logging.info("Time-shift pause exceeded the buffer, going on with the oldest recorded byte")
+                    offset = ring.oldest
+                else:
+                    offset += sent
+                relay.position = offset
+        except OSError:
+            pass
+
+
+    def log_message(self, format: str, *args: object) -> None:
+        logging.debug("Time-shift relay: " + format, *args)
+
+
+
+class _RelayServer(http.server.ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], relay: "TimeShiftRelay") -> None:
+        super().__init__(address, _RelayHandler)
+        self.relay = relay
+
+
+
+class TimeShiftRelay:
+    """ Records the current station into a RingBuffer and serves the recording to MPD """
+
+    def __init__(self, config: MiraConfig) -> None:
+        self.host = config.TimeShift.HOST
+        self.port = config.TimeShift.PORT
+        self.timeout = config.TimeShift.TIMEOUT
+        self.ring = RingBuffer(pathlib.Path(config.TimeShift.BUFFER_FILE).expanduser(), config.TimeShift.BUFFER_SIZE)
+        self.recorder = None
+        # offset after the last byte sent to MPD
+        self.position = 0
+        self._server = None
+        self._lock = threading.Lock()
+
+
+    def start(self) -> None:
+        self._server = _RelayServer((self.host, self.port), self)
+        # port 0 picks a free one
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="mira-relay", daemon=True).start()
+        logging.info("Time-shift relay on %s:%s, buffer of %s MiB", self.host, self.port, self.ring.size // (1024 * 1024))
+
+
+    def stop(self) -> None:
+        if self.recorder is not None:
+            self.recorder.stop()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        self.ring.close()
+
+
+    def tune(self, url: str) -> str:
+        """ Record the stream at url from now on. Returns the URL MPD plays it from. """
+        with self._lock:
+            if self.recorder is not None:
+                self.recorder.stop()
+            self.ring.restart()
+            self.position = self.ring.start
+            self.recorder = Recorder(url, self.ring, self.timeout)
+            self.recorder.start()
+            return self.url(self.ring.start)
+
+
+    def url(self, offset: int) -> str:
+        return f"http://{self.host}:{self.port}/stream?from={offset}"
+
+
+    def offset_behind_live(self, seconds: float) -> int:
+        """ offset of the recording the given number of seconds behind live, at most the oldest one kept """
+        rate = self.recorder.byte_rate if self.recorder is not None else DEFAULT_BYTE_RATE
+        return max(self.ring.oldest, self.ring.end - int(seconds * rate))
+
+
+    def delay(self) -> float:
+        """ seconds MPD is behind live, not counting what it has buffered """
+        rate = self.recorder.byte_rate if self.recorder is not None else DEFAULT_BYTE_RATE
+        return max(0, self.ring.end - self.position) / rate
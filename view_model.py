@@ -0,0 +1,77 @@
+"""
+Minimalist Internet Radio - change-detecting view model
+
+Widget properties are not assigned directly by the application. New values
+are collected and applied once per frame, and only if they differ from what
+is already shown. Every assignment of a guizero property costs a Tk
+configure call and a redraw.
+"""
+
+from typing import Any, Callable
+
+import weakref
+
+
+class ViewModel:
+    """ Remembers the rendered properties of widgets and applies changed ones in one batch per frame """
+
+    def __init__(self, schedule: Callable, frame_interval: int) -> None:
+        # schedule(time_ms, function) runs the function on the GUI thread, e.g. App.after
+        self.schedule = schedule
+        self.frame_interval = frame_interval
+        # widget -> {property: value}, entries go away with the widgets
+        self.rendered = weakref.WeakKeyDictionary()
+        # (widget, property) -> value
+        self.pending = {}
+        self.frame_scheduled = False
+        # while suspended (e.g. the screen is blanked) changes are only collected
+        self.suspended = False
+        # number of property assignments actually made
+        self.applied = 0
+
+
+    def set(self, widget: Any, prop: str, value: Any) -> None:
+        """ Show the value at the next frame, unless it is shown already. """
+        key = (widget, prop)
+        shown = self.rendered.get(widget)
+        if shown is not None and prop in shown and shown[prop] == value:
+            # a change back to the shown value within the frame
+            self.pending.pop(key, None)
+            return
+
+        self.pending[key] = value
+        if not self.frame_scheduled and not self.suspended:
+            self.frame_scheduled = True
+            self.schedule(self.frame_interval, self._on_frame)
+
+
+    def forget(self, widget: Any) -> None:
+        """ The widget was changed outside the view model, its next values are applied unconditionally. """
+        self.rendered.pop(widget, None)
+
+
+    def suspend(self) -> None:
+        self.suspended = True
+
+
+    def resume(self) -> None:
+        """ Apply everything collected while suspended in one batch. """
+        self.suspended = False
+        self.apply()
+
+
+    def _on_frame(self) -> None:
+        # a frame scheduled before suspend() isn't rendered, resume() applies its changes
+        self.frame_scheduled = False
+        if not self.suspended:
+            self.apply()
+
+
+    def apply(self) -> None:
+        """ Assign all pending values to their widgets, also called directly before widgets are destroyed. """
+        self.frame_scheduled = False
+        pending, self.pending = self.pending, {}
+        for (widget, prop), value in pending.items():
+            setattr(widget, prop, value)
+            self.rendered.setdefault(widget, {})[prop] = value
+            self.applied += 1
@@ -0,0 +1,98 @@
+"""
+Minimalist Internet Radio - buttons of the touchscreen view
+"""
+
+from typing import Any
+
+import guizero
+import logging
+import math
+
+from mira_config import MiraConfig
+from helpers import Preset
+
+
+class PresetButton:
+
+    def __init__(self, containing_box: guizero.Box, position: tuple, preset: Preset, callback: Any, config: MiraConfig) -> None:
+
+        self.preset = preset
+
+        bt_width = math.floor(config.Display.WIDTH / config.Buttons.NUM_BUTTON_COLUMNS)
+        # - 4: workaround for last button row spilling its clickable area below and onto the page selectors containg box
+        bt_height = config.Buttons.BUTTON_HEIGHT - 4
+
+        # To be able to size a button in terms of pixels (instead characters),
+        # we put every button in a surrounding box.
+        self.box = guizero.Box(
+                        master=containing_box,
+                        grid=[position[0], position[1]],
+                        width=bt_width,
+                        height=bt_height,
+                        )
+        self.button = guizero.PushButton(
+                        master=self.box,
+                        width="fill",
+                        height="fill",
+                        text=preset.name,
+                        command=callback,
+                        args=[preset]
+                        )
+        self.callback = callback
+        self.logo = None
+        self.button.font = config.Buttons.FONT[0]
+        self.button.text_size = config.Buttons.FONT[1]
+        self.button.bg = preset.background_color
+        self.button.text_color = preset.text_color
+
+        logging.info("PresetButton: '%s', width=%s, height=%s", self.button.text, self.button.width, self.button.height)
+
+
+    def bind(self, preset: Preset) -> None:
+        """ Reuse the button for another preset. """
+        self.preset = preset
+        self.button.text = preset.name
+        self.button.bg = preset.background_color
+        self.button.text_color = preset.text_color
+        self.button.update_command(self.callback, [preset])
+
+
+    def show_logo(self, image: Any|None) -> None:
+        """ Show a logo (tkinter image) above the station name, None removes it. """
+        if image is self.logo:
+            return
+        # the button keeps a reference, tk doesn't
+        self.logo = image
+        self.button.tk.config(image=image or "", compound="top" if image else "none")
+
+
+
+class PageButton:
+
+    def __init__(self, containing_box: guizero.Box, position: tuple, page_idx: int, callback: Any, config: MiraConfig) -> None:
+
+        self.idx = page_idx
+
+        bt_width = config.PageSelector.BUTTON_WIDTH
+        bt_height = config.PageSelector.BUTTON_HEIGHT
+
+        # To be able to size a button in terms of pixels (instead characters),
+        # we put every button in a surrounding box.
+        box = guizero.Box(
+                        master=containing_box,
+                        grid=[position[0], position[1]],
+                        width=bt_width,
+                        height=bt_height
+                        )
+        self.button = guizero.PushButton(
+                        master=box,
+                        width="fill",
+                        height="fill",
+                        text=f"{self.idx+1}",
+                        command=callback,
+                        args=[self.idx]
+                        )
+        self.button.font = config.PageSelector.FONT[0]
+        self.button.text_size = config.PageSelector.FONT[1]
+        self.button.bg = config.PageSelector.BACKGROUND_COLOR
+        self.button.text_color = config.PageSelector.TEXT_COLOR
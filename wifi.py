@@ -0,0 +1,82 @@
+"""
+Minimalist Internet Radio - Wi-Fi signal quality
+"""
+
+import collections
+import logging
+import os
+
+
+class WifiQualityProvider:
+    """ Reads the link quality of a wireless interface from /proc/net/wireless
+
+        The file is kept open and re-read with a single pread per query.
+        Values are smoothed over the last few readings. """
+
+    READ_SIZE = 4096
+
+    def __init__(self, interface: str|None, stats_file: str, max_quality: int, window: int) -> None:
+        # interface None: use the first wireless interface listed
+        self.interface = interface
+        self.stats_file = stats_file
+        self.max_quality = max_quality
+        self._samples = collections.deque(maxlen=max(1, window))
+        self._fd = None
+
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+    def read_link_qualities(self) -> dict[str, float]:
+        """ Return the raw link quality of every listed interface. """
+        if self._fd is None:
+            try:
+                self._fd = os.open(self.stats_file, os.O_RDONLY)
+            except OSError as e:
+                logging.debug("Cannot open %s: %s", self.stats_file, e)
+                return {}
+        try:
+            data = os.pread(self._fd, self.READ_SIZE, 0)
+        except OSError as e:
+            logging.error("Failed to read %s: %s", self.stats_file, e)
+            self.close()
+            return {}
+        return parse_wireless_stats(data.decode("ascii", errors="replace"))
+
+
+    def quality(self) -> int:
+        """ Return the smoothed link quality in percent, -1 if the interface is missing. """
+        qualities = self.read_link_qualities()
+        if self.interface is not None:
+            link = qualities.get(self.interface)
+        else:
+            link = next(iter(qualities.values()), None)
+
+        if link is None:
+            self._samples.clear()
+            return -1
+
+        self._samples.append(min(100.0, max(0.0, link * 100 / self.max_quality)))
+        return int(round(sum(self._samples) / len(self._samples), 0))
+
+
+
+def parse_wireless_stats(text: str) -> dict[str, float]:
+    """ Parse the contents of /proc/net/wireless into a dict interface -> link quality. """
+    # Inter-| sta-|   Quality        |   Discarded packets               | Missed | WE
+    #  face | tus | link level noise |  nwid  crypt   frag  retry   misc | beacon | 22
+    #  wlan0: 0000   54.  -56.  -256        0      0      0      0     13        0
+    qualities = {}
+    for line in text.splitlines()[2:]:
+        name, sep, values = line.partition(":")
+        fields = values.split()
+        if not sep or len(fields) < 2:
+            continue
+        try:
+            qualities[name.strip()] = float(fields[1].rstrip("."))
+        except ValueError:
+            continue
+    return qualities
@@ -0,0 +1,157 @@
+"""
+Minimalist Internet Radio - background execution of blocking operations
+"""
+
+from typing import Any, Callable
+
+import concurrent.futures
+import logging
+import queue
+import threading
+import time
+
+
+class Task:
+    """ Handle of an operation submitted to the BackgroundExecutor """
+
+    def __init__(self, name: str, on_done: Callable|None, on_error: Callable|None) -> None:
+        self.name = name
+        self.on_done = on_done
+        self.on_error = on_error
+        self.future = None
+        # seconds the operation may run, time.monotonic() it has to be done by once started
+        self.timeout = None
+        self.deadline = None
+        self.cancelled = False
+        self.timed_out = False
+        self.finished = False
+
+
+    def cancel(self) -> None:
+        """ Drop the operation if it hasn't started yet and suppress its callbacks. """
+        self.cancelled = True
+        if self.future is not None:
+            self.future.cancel()
+
+
+    def pending(self) -> bool:
+        return not (self.finished or self.cancelled or self.timed_out)
+
+
+
+class BackgroundExecutor:
+    """ Runs blocking operations on worker threads and hands their results to the GUI thread.
+
+        Operations are grouped in lanes. Each lane has a single worker thread,
+        so operations of one lane run in order (e.g. MPD commands) while a
+        stalled lane doesn't delay the others. Results and callbacks posted
+        by other threads are queued, the GUI thread runs them with drain(),
+        e.g. from a timer. No worker thread touches the GUI toolkit. """
+
+    def __init__(self, on_submit: Callable|None = None) -> None:
+        # called by submit(), e.g. to drain soon
+        self.on_submit = on_submit
+        # (function, args) to run on the GUI thread
+        self._callbacks = queue.SimpleQueue()
+        # tasks whose result wasn't handled yet
+        self._tasks = set()
+        self._lanes = {}
+        self._lock = threading.Lock()
+
+
+    def submit(self, lane: str, function: Callable, args: list|None = None,
+               on_done: Callable|None = None, on_error: Callable|None = None,
+               timeout: float|None = None) -> Task:
+        """ Run function(*args) on the worker of the given lane.
+            on_done(result) or on_error(exception) are called on the GUI thread.
+            After running for timeout seconds on_error gets a TimeoutError and a late result is discarded. """
+        task = Task(f"{lane}:{getattr(function, '__name__', function)}", on_done, on_error)
+        task.timeout = timeout
+        self._tasks.add(task)
+        task.future = self._get_lane(lane).submit(self._run, task, function, args or [])
+        task.future.add_done_callback(lambda future: self.post(self._finish, [task]))
+        if self.on_submit is not None:
+            self.on_submit()
+        return task
+
+
+    def post(self, function: Callable, args: list|None = None) -> None:
+        """ Run function(*args) on the GUI thread at the next drain(), callable from any thread. """
+        self._callbacks.put((function, args or []))
+
+
+    def drain(self) -> int:
+        """ Run the callbacks posted so far and time out overdue tasks, on the GUI thread.
+            Returns the number of callbacks run. """
+        count = 0
+        while True:
+            try:
+                function, args = self._callbacks.get_nowait()
+            except queue.Empty:
+                break
+            count += 1
+            try:
+                function(*args)
+            except Exception:
+                logging.exception("Callback '%s' failed", getattr(function, "__name__", function))
+
+        now = time.monotonic()
+        for task in [task for task in self._tasks if task.deadline is not None and task.deadline <= now]:
+            self._expire(task)
+        return count
+
+
+    def busy(self) -> bool:
+        """ True while tasks are running or their results wait for drain(). """
+        return bool(self._tasks) or not self._callbacks.empty()
+
+
+    def shutdown(self, drain: tuple = ()) -> None:
+        """ Drop queued operations, except for the lanes listed in drain. """
+        with self._lock:
+            lanes = self._lanes
+            self._lanes = {}
+        for name, executor in lanes.items():
+            executor.shutdown(wait=False, cancel_futures=(name not in drain))
+
+
+    def _get_lane(self, lane: str) -> concurrent.futures.ThreadPoolExecutor:
+        with self._lock:
+            executor = self._lanes.get(lane)
+            if executor is None:
+                executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"mira-{lane}")
+                self._lanes[lane] = executor
+            return executor
+
+
+    def _run(self, task: Task, function: Callable, args: list) -> Any:
+        # runs on the worker, time spent queued behind other operations doesn't count
+        if task.timeout is not None:
+            task.deadline = time.monotonic() + task.timeout
+        return function(*args)
+
+
+    def _finish(self, task: Task) -> None:
+        self._tasks.discard(task)
+        if not task.pending() or task.future.cancelled():
+            return
+        task.finished = True
+
+        error = task.future.exception()
+        if error is not None:
+            logging.error("Background task '%s' failed: %s", task.name, error)
+            if task.on_error is not None:
+                task.on_error(error)
+        elif task.on_done is not None:
+            task.on_done(task.future.result())
+
+
+    def _expire(self, task: Task) -> None:
+        self._tasks.discard(task)
+        if not task.pending():
+            return
+        task.timed_out = True
+        task.future.cancel()
+        logging.warning("Background task '%s' timed out", task.name)
+        if task.on_error is not None:
+            task.on_error(TimeoutError(task.name))